@@ -2,48 +2,37 @@
 
 import cv2
 import numpy as np
-from scipy.spatial.transform import Rotation
-from pupil_apriltags import Detector
+import tagdet
 
 #============================================================================
 
 frame_size = [960,720]
 april_cm = 1000.0   #convert tag transpose to cm 
 april_focal = [550,550]
+april_size = 0.02
 
-#============================================================================
-
-at_detector = Detector(
-    families="tag36h11",
-    nthreads=1,
-    quad_decimate=1.0,
-    quad_sigma=0.0,
-    refine_edges=1,
-    decode_sharpening=0.25,
-    debug=0,
-)
+camera = tagdet.Camera(april_focal[0], april_focal[1], int(frame_size[0]/2), int(frame_size[1]/2))
 
 #============================================================================
 
-def get_tags(img):
-    tags = at_detector.detect(
-        cv2.cvtColor(img, cv2.COLOR_BGR2GRAY),
-        estimate_tag_pose=True,
-        camera_params=(april_focal[0], april_focal[1], int(frame_size[0]/2),int(frame_size[1]/2)),
-        tag_size=0.02
-    )
-
-    res = []
-    if len(tags) > 0:
-        for tag in tags:
-            r =  Rotation.from_matrix(tag.pose_R)
-            angles = r.as_euler("zyx",degrees=True)
-            T = tag.pose_t.reshape((3)).tolist()
-            for i in range(3):
-                T[i] = int(T[i] * april_cm)
-            res.append([tag.tag_id, T[0], T[1], T[2], int(angles[1]), int(tag.center[0]), int(tag.center[1])])
-
-    return res
+def engine():
+    # shared tagdet engine, built on first use (not at import)
+    return tagdet.shared_engine(camera, april_size, decimate=1.0)
+
+def to_rows(dets, to_cm=april_cm):
+    # tagdet results -> [id, x, y, z, pitch, center_x, center_y] rows (cm, deg, px)
+    T = (dets["t"] * to_cm).astype(int).tolist()
+    pitch = tagdet.poses_to_rpy(dets["R"])[:, 1].astype(int).tolist()
+    C = dets["center"].astype(int).tolist()
+    return [[int(i), *T[k], pitch[k], *C[k]] for k, i in enumerate(dets["id"])]
+
+def get_tags(img, roi=None, gray=None, det=None, to_cm=april_cm):
+    # roi = (x0, y0, x1, y1): detect only inside this box; the principal point is
+    # shifted by the crop offset so poses and centers stay in full-frame coords
+    # gray: precomputed gray plane of img (frames.Frame.gray), skips the conversion
+    # det: tagdet.TagEngine with the caller's camera / tag size (default: engine())
+    if gray is None:
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    return to_rows((det or engine()).detect(gray, roi), to_cm)
 
 #============================================================================
-
@@ -1,3 +1,4 @@
+import os
 import tkinter as tk
 from tkinter import messagebox
 from djitellopy import tello
@@ -5,8 +6,15 @@ import cv2
 import numpy as np
 import time
 import logging
-from simple_pid import PID
+from pid import MultiPID
 import math
+from telemetry import Telemetry, tello_poller
+from frames import FrameRing
+import at
+import tagdet
+from tuner import read_tuning, write_tuning
+import search
+from gatemap import CourseMap, DeadReckoner
 
 # Tag and search configuration
 tag_list = []
@@ -18,17 +26,22 @@ FRAME_SIZE = [960, 720]
 PATH = []
 FOCAL_LENGTH = 500
 SEARCH_ALTITUDE = 70  
-
-# PID setup with dynamic tuning
-pid_x = PID(0.4, 0.0, 0.2, setpoint=0)
-pid_y = PID(0.4, 0.0, 0.2, setpoint=0)
-pid_distance = PID(0.5, 0.0, 0.3, setpoint=50)
-pid_yaw = PID(0.5, 0.0, 0.2, setpoint=0)
-
-pid_x.output_limits = (-25, 25)
-pid_y.output_limits = (-25, 25)
-pid_distance.output_limits = (-20, 20)
-pid_yaw.output_limits = (-20, 20)
+TUNING_FILE = "fira_tuning.json"   # PID gains saved from the sliders, loaded at startup
+COURSE_MAP = "course_map.json"     # gatemap.py tag poses; SEARCH first turns towards the next tag
+MAP_TIMEOUT = 4.0                  # s of map-guided SEARCH before the search pattern
+
+def tag_engine():
+    # built on the first frame, not at import
+    return tagdet.shared_engine(tagdet.Camera.centered(FRAME_SIZE[0], FRAME_SIZE[1], FOCAL_LENGTH), TAG_SIZE_CM / 100.0)
+
+# PID setup with dynamic tuning: x, y, distance, yaw in one controller
+pid = MultiPID([0.4, 0.4, 0.5, 0.5], ki=0.0, kd=[0.2, 0.2, 0.3, 0.2],
+               limit=[25, 25, 20, 20], setpoint=[0, 0, 50, 0], d_on_meas=True,
+               names=("x", "y", "distance", "yaw"))
+saved_pid = read_tuning(TUNING_FILE, "backup_fira").get("pid")
+if saved_pid:
+    pid = MultiPID.from_config(saved_pid)
+pid_t = time.monotonic()
 
 # Initialize Tello
 robot = tello.Tello()
@@ -36,10 +49,25 @@ robot.LOGGER.setLevel(logging.ERROR)
 robot.connect()
 robot.streamon()
 robot_frame = robot.get_frame_read(with_queue=False)
+ring = FrameRing(FRAME_SIZE[0], FRAME_SIZE[1])
 robot.takeoff()
 
+# battery/height are polled in the background; main_loop only reads the snapshot
+telem = Telemetry(tello_poller(robot), rate_hz=5.0, stale_after=2.0).start()
+telem.wait_ready()
+
+# Course map: pose dead-reckoned from the rc sent, corrected by mapped tags in view
+course = CourseMap.load(COURSE_MAP) if os.path.exists(COURSE_MAP) else None
+dr = DeadReckoner(course) if course else None
+if dr:
+    dr.reset(time.time())
+
+# SPIRAL search: 24 velocity headings around a circle while turning, one rc per tick from a table
+spiral_plan = search.circle(SPIRAL_RADIUS, 20, steps=24, leg=0.25).compile(loop=search.circle(SPIRAL_RADIUS, 20, steps=24, leg=0.25))
+
 # Variables for state and search control
 state = 'SEARCH'
+search_t0 = time.time()
 tag_now = 0
 time_to_see = time.time()
 search_mode = 'GRID'
@@ -60,12 +88,18 @@ def calculate_tan(angle):
 def calculate_distance(tag_size_px, known_tag_size_cm=TAG_SIZE_CM):
     return (known_tag_size_cm * FOCAL_LENGTH) / tag_size_px
 
-# Function to calculate the angle to the second tag
-def calculate_angle_to_tag(current_x, current_y, target_x, target_y):
-    delta_x = target_x - current_x
-    delta_y = target_y - current_y
-    angle = math.degrees(math.atan2(delta_y, delta_x))  # Angle in degrees
-    return angle
+def send_rc(lr, fb, ud, yaw):
+    robot.send_rc_control(lr, fb, ud, yaw)
+    if dr:
+        dr.command((lr, fb, ud, yaw), time.time())
+
+# rc towards a mapped tag's dead-reckoned bearing, or None without a map
+def map_rc(tag_id):
+    rel = dr.relative(tag_id) if dr else None
+    if rel is None:
+        return None
+    bearing = math.degrees(math.atan2(rel[0], rel[2]))
+    return (0, 20 if abs(bearing) < 15 else 0, 0, int(np.clip(1.5 * bearing, -40, 40)))
 
 # Tkinter GUI setup
 root = tk.Tk()
@@ -83,16 +117,20 @@ height_label.grid(row=2, column=0, columnspan=2)
 
 # PID Adjustment sliders
 def update_pid_constants():
-    pid_x.tunings = (x_kp.get(), x_ki.get(), x_kd.get())
-    pid_y.tunings = (y_kp.get(), y_ki.get(), y_kd.get())
-    pid_distance.tunings = (distance_kp.get(), distance_ki.get(), distance_kd.get())
-    pid_yaw.tunings = (yaw_kp.get(), yaw_ki.get(), yaw_kd.get())
+    pid.tune("x", x_kp.get(), x_ki.get(), x_kd.get())
+    pid.tune("y", y_kp.get(), y_ki.get(), y_kd.get())
+    pid.tune("distance", distance_kp.get(), distance_ki.get(), distance_kd.get())
+    pid.tune("yaw", yaw_kp.get(), yaw_ki.get(), yaw_kd.get())
+
+def save_pid_constants():
+    write_tuning(TUNING_FILE, "backup_fira", {"pid": pid.config()})
+    status_label.config(text=f"Status: PID saved to {TUNING_FILE}")
 
 tk.Label(root, text="PID Tuning").grid(row=3, column=0, columnspan=2)
-x_kp, x_ki, x_kd = tk.DoubleVar(value=0.4), tk.DoubleVar(value=0.0), tk.DoubleVar(value=0.2)
-y_kp, y_ki, y_kd = tk.DoubleVar(value=0.4), tk.DoubleVar(value=0.0), tk.DoubleVar(value=0.2)
-distance_kp, distance_ki, distance_kd = tk.DoubleVar(value=0.5), tk.DoubleVar(value=0.0), tk.DoubleVar(value=0.3)
-yaw_kp, yaw_ki, yaw_kd = tk.DoubleVar(value=0.5), tk.DoubleVar(value=0.0), tk.DoubleVar(value=0.2)
+x_kp, x_ki, x_kd = (tk.DoubleVar(value=g[0]) for g in (pid.kp, pid.ki, pid.kd))
+y_kp, y_ki, y_kd = (tk.DoubleVar(value=g[1]) for g in (pid.kp, pid.ki, pid.kd))
+distance_kp, distance_ki, distance_kd = (tk.DoubleVar(value=g[2]) for g in (pid.kp, pid.ki, pid.kd))
+yaw_kp, yaw_ki, yaw_kd = (tk.DoubleVar(value=g[3]) for g in (pid.kp, pid.ki, pid.kd))
 
 for i, (var, label) in enumerate([(x_kp, "X KP"), (x_ki, "X KI"), (x_kd, "X KD"),
                                   (y_kp, "Y KP"), (y_ki, "Y KI"), (y_kd, "Y KD"),
@@ -114,31 +152,38 @@ def start_grid_search():
     status_label.config(text="Status: Grid Searching")
 
 def start_spiral_search():
-    global state, search_mode
+    global state, search_mode, search_t0
     search_mode = 'SPIRAL'
     state = 'SEARCH'
+    search_t0 = time.time()
     status_label.config(text="Status: Spiral Searching")
 
 tk.Button(root, text="Start TAG Search", command=start_tag_search).grid(row=16, column=0)
 tk.Button(root, text="Start GRID Search", command=start_grid_search).grid(row=16, column=1)
 tk.Button(root, text="Start SPIRAL Search", command=start_spiral_search).grid(row=17, column=0, columnspan=2)
+tk.Button(root, text="Save PID", command=save_pid_constants).grid(row=18, column=0, columnspan=2)
 
 # Main loop for real-time control
 def main_loop():
-    global state, tag_now, time_to_see, current_position_x, current_position_y
+    global state, tag_now, time_to_see, current_position_x, current_position_y, pid_t, search_t0
 
-    frame = cv2.resize(cv2.cvtColor(robot_frame.frame, cv2.COLOR_RGB2BGR), FRAME_SIZE)
-    tags = []  # This should be updated with the detected tags in the frame
-    height = robot.get_height()
-    battery = robot.get_battery()
+    fr = ring.fill(robot_frame.frame, cv2.COLOR_RGB2BGR)
+    frame = fr.bgr
+    tags = at.get_tags(frame, gray=fr.gray, det=tag_engine(), to_cm=100.0)
+    if dr:
+        for tag in tags:
+            dr.observe(tag[0], np.array(tag[1:4]) / 100.0, math.radians(tag[4]), time.time())
+    height = telem.get("h", 0)
+    battery = telem.get("bat", 0)
 
     # Update status labels
     battery_label.config(text=f"Battery: {battery}%")
     height_label.config(text=f"Height: {height} cm")
 
-    if battery < 35:
-        messagebox.showwarning("Battery Warning", "Battery is low! Landing drone.")
+    if battery < 35 or telem.stale():
+        messagebox.showwarning("Battery Warning", "Battery is low or telemetry lost! Landing drone.")
         print("BATTERY WARNING")
+        telem.stop()
         robot.land()
         robot.streamoff()
         robot.end()
@@ -150,13 +195,13 @@ def main_loop():
         for tag in tags:
             if tag[0] == tag_ID[tag_now]:  # Track the current tag
                 # PID control for tag tracking
-                velocity_x = pid_x(tag[1])
-                velocity_y = pid_y(-tag[2])
-                velocity_distance = pid_distance(tag[3])
-                velocity_yaw = pid_yaw(tag[4])
+                now = time.monotonic()
+                velocity_x, velocity_y, velocity_distance, velocity_yaw = pid.update(
+                    (tag[1], -tag[2], tag[3], tag[4]), now - pid_t)
+                pid_t = now
 
                 # Send control commands to the Tello
-                robot.send_rc_control(int(velocity_x), int(velocity_distance), int(velocity_y), int(velocity_yaw))
+                send_rc(int(velocity_x), int(velocity_distance), int(velocity_y), int(velocity_yaw))
                 time_to_see = time.time()
                 seen = True
                 break
@@ -166,6 +211,7 @@ def main_loop():
                 # Once the first tag is lost, switch to the next tag
                 tag_now = (tag_now + 1) % len(tag_ID)
                 state = 'SEARCH'
+                search_t0 = time.time()
 
     elif state == 'SEARCH':
         # Searching for a tag (either GRID or SPIRAL mode)
@@ -174,29 +220,16 @@ def main_loop():
             state = 'TAG'
             time_to_see = time.time()
         else:
-            if search_mode == 'GRID':
+            rc = map_rc(tag_ID[tag_now]) if time.time() - search_t0 < MAP_TIMEOUT else None
+            if rc:
+                send_rc(*rc)
+            elif search_mode == 'GRID':
                 current_position_x += GRID_SIZE * search_direction
                 if current_position_x >= 960 or current_position_x < 0:
                     current_position_x = 0
                     current_position_y += GRID_SIZE
             elif search_mode == 'SPIRAL':
-                for angle in range(0, 360, 15):
-                    robot.send_rc_control(
-                        int(SPIRAL_RADIUS * calculate_cos(angle)),
-                        int(SPIRAL_RADIUS * calculate_sin(angle)),
-                        0, 20
-                    )
-
-    # If the first tag was tracked and lost, calculate the angle to the second tag
-    if state == 'TAG' and tag_now == 0:  # If tracking the first tag (tag_ID[0])
-        if time.time() - time_to_see > 4.0:
-            # Switch to second tag and position the drone to approach it
-            next_tag_position_x = 100  # Example values for the second tag's position (you need real data)
-            next_tag_position_y = 200
-            angle_to_second_tag = calculate_angle_to_tag(current_position_x, current_position_y, next_tag_position_x, next_tag_position_y)
-            
-            # Send commands to position the drone at the angle to the second tag
-            robot.send_rc_control(0, 20, 0, int(angle_to_second_tag))
+                send_rc(*spiral_plan.rc(time.time() - search_t0))
 
     cv2.imshow("FRAME", frame)
     if cv2.waitKey(1) == ord('q'):
@@ -0,0 +1,159 @@
+import os
+import time
+import argparse
+import multiprocessing as mp
+
+import cv2
+import numpy as np
+
+import tagdet
+import technical_fira as fira
+from columns import ColumnWriter, read_columns
+from frames import list_images
+
+# One row per detection; frame is the index in the source sequence.
+BATCH_DTYPE = np.dtype([("frame", np.int32)] + [(n, tagdet.DET_DTYPE.fields[n][0])
+                                               for n in ("id", "dm", "ham", "center", "t", "R")])
+
+# technical_fira's camera and detection config, so offline numbers describe the detector that flies
+DEFAULTS = {"width": fira.FRAME_W, "height": fira.FRAME_H, "f": fira.FX, "tag_size": fira.TAG_SIZE_M,
+            "decimate": 1.0, "min_margin": fira.MIN_DECISION_MARGIN, "preproc": fira.PREPROC_VARIANT}
+
+# ---------------------- Worker side -------------------------
+
+_ENGINE = None
+_CFG = None
+
+def _init_worker(cfg):
+    # one TagEngine per process, single-threaded: the pool supplies the parallelism
+    # Frames go through technical_fira's preprocess() and quality_mask(), with
+    # the variant and margin of this run.
+    global _ENGINE, _CFG
+    _CFG = cfg
+    cam = tagdet.Camera.centered(cfg["width"], cfg["height"], cfg["f"])
+    _ENGINE = tagdet.TagEngine(cam, cfg["tag_size"], decimate=cfg["decimate"], nthreads=1)
+    fira.PREPROC_VARIANT = cfg["preproc"]
+    fira.MIN_DECISION_MARGIN = cfg["min_margin"]
+
+def _frames(cfg, start, stop):
+    # (index, gray) for frames [start, stop) of the source, resized to the camera size
+    size = (cfg["width"], cfg["height"])
+    if cfg["files"] is not None:
+        imgs = ((i, cv2.imread(cfg["files"][i])) for i in range(start, min(stop, len(cfg["files"]))))
+    else:
+        cap = cv2.VideoCapture(cfg["src"])
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+        def video():
+            for i in range(start, stop):
+                ok, img = cap.read()
+                if not ok: break
+                yield i, img
+            cap.release()
+        imgs = video()
+    for i, img in imgs:
+        if img is None: continue
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        if gray.shape[1::-1] != size:
+            gray = cv2.resize(gray, size)
+        yield i, gray
+
+def _run_chunk(task):
+    start, stop = task
+    out, n = [], 0
+    for i, gray in _frames(_CFG, start, stop):
+        d = _ENGINE.detect(fira.preprocess(gray))
+        d = d[fira.quality_mask(d)]
+        rows = np.zeros(len(d), BATCH_DTYPE)
+        rows["frame"] = i
+        for name in BATCH_DTYPE.names[1:]:
+            rows[name] = d[name]
+        out.append(rows)
+        n += 1
+    return start, n, np.concatenate(out) if out else np.zeros(0, BATCH_DTYPE)
+
+# ---------------------- Driver side -------------------------
+
+def _config(src, **opts):
+    cfg = dict(DEFAULTS, src=src, files=None)
+    cfg.update({k: v for k, v in opts.items() if v is not None})
+    if os.path.isdir(src):
+        cfg["files"] = list_images(src)
+        cfg["frames"] = len(cfg["files"])
+    else:
+        cap = cv2.VideoCapture(src)
+        cfg["frames"] = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        cap.release()
+    return cfg
+
+def iter_detections(src, workers=None, chunk=64, limit=None, **opts):
+    # Yields (start, n_frames, rows) per chunk of `chunk` frames, in frame order,
+    # while a pool of `workers` processes detects ahead. Video workers seek to
+    # their chunk, so no process decodes frames it does not use.
+    cfg = _config(src, **opts)
+    total = cfg["frames"] if limit is None else min(cfg["frames"], limit)
+    tasks = [(s, min(s + chunk, total)) for s in range(0, total, chunk)]
+    workers = workers or tagdet.default_threads()
+    if workers == 1:
+        _init_worker(cfg)
+        yield from map(_run_chunk, tasks)
+        return
+    with mp.Pool(workers, initializer=_init_worker, initargs=(cfg,)) as pool:
+        yield from pool.imap(_run_chunk, tasks)
+
+def detect_sequence(src, out, workers=None, chunk=64, limit=None, **opts):
+    # Detect over a whole video / frame directory into a columnar table at out.
+    # -> (frames, detections, seconds)
+    t0 = time.perf_counter()
+    frames = 0
+    attrs = dict(DEFAULTS, **{k: v for k, v in opts.items() if v is not None})
+    attrs["source"] = src
+    with ColumnWriter(out, BATCH_DTYPE, attrs) as w:
+        for _, n, rows in iter_detections(src, workers, chunk, limit, **opts):
+            w.append(rows)
+            frames += n
+        rows = w.rows
+    return frames, rows, time.perf_counter() - t0
+
+def scaling(src, limit=600, chunk=32, **opts):
+    # frames/s with 1, 2, 4, ... workers up to the available cores
+    cores = tagdet.default_threads()
+    counts = sorted({1, cores} | {2 ** k for k in range(1, 8) if 2 ** k < cores})
+    base = None
+    for n in counts:
+        t0 = time.perf_counter()
+        frames = sum(k for _, k, _ in iter_detections(src, n, chunk, limit, **opts))
+        fps = frames / (time.perf_counter() - t0)
+        base = base or fps
+        print(f"[Batch] workers={n:<3} {fps:7.1f} frames/s  speedup={fps / base:.2f}x  "
+              f"efficiency={fps / base / n:.0%}")
+
+# --------------------------- CLI ----------------------------
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Multi-process AprilTag detection over a recording")
+    ap.add_argument("src", help="video file or frame directory")
+    ap.add_argument("out", nargs="?", help="output table directory (columns + meta.json)")
+    ap.add_argument("--workers", type=int, default=None, help="processes (default: all cores)")
+    ap.add_argument("--chunk", type=int, default=64, help="frames per task")
+    ap.add_argument("--limit", type=int, default=None, help="only the first N frames")
+    ap.add_argument("--width", type=int, default=None)
+    ap.add_argument("--height", type=int, default=None)
+    ap.add_argument("--f", type=float, default=None, help="focal length (px)")
+    ap.add_argument("--tag-size", type=float, default=None, help="tag size (m)")
+    ap.add_argument("--decimate", type=float, default=None)
+    ap.add_argument("--min-margin", type=float, default=None)
+    ap.add_argument("--preproc", choices=["full", "auto", "roi", "raw"], default=None)
+    ap.add_argument("--scaling", action="store_true", help="measure throughput vs worker count and exit")
+    args = ap.parse_args()
+
+    opts = dict(width=args.width, height=args.height, f=args.f, tag_size=args.tag_size,
+                decimate=args.decimate, min_margin=args.min_margin, preproc=args.preproc)
+    if args.scaling:
+        scaling(args.src, args.limit or 600, **opts)
+    elif args.out is None:
+        ap.error("out is required unless --scaling")
+    else:
+        frames, rows, sec = detect_sequence(args.src, args.out, args.workers, args.chunk, args.limit, **opts)
+        cols, _ = read_columns(args.out, ["id"])
+        print(f"[Batch] {frames} frames, {rows} detections ({len(np.unique(cols['id']))} ids) "
+              f"in {sec:.1f}s = {frames / max(sec, 1e-9):.1f} frames/s -> {args.out}")
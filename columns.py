@@ -0,0 +1,71 @@
+import os
+import json
+
+import numpy as np
+
+META = "meta.json"
+
+class ColumnWriter:
+    """Append-only columnar table on disk.
+
+    Every field of the structured `dtype` is stored as its own raw file
+    (<field>.bin, rows back to back) next to meta.json, which records the
+    row count, column dtypes/shapes and free-form attrs. meta.json is
+    rewritten on flush()/close(), so a table being written can be read up
+    to its last flush.
+    """
+
+    def __init__(self, path, dtype, attrs=None):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.attrs = dict(attrs or {})
+        self.rows = 0
+        self._files = {n: open(os.path.join(path, n + ".bin"), "wb") for n in self.dtype.names}
+        self._write_meta()
+
+    def append(self, rows):
+        # rows: array of self.dtype (or anything with the same field names)
+        if not len(rows):
+            return
+        for n, f in self._files.items():
+            np.ascontiguousarray(rows[n], dtype=self.dtype.fields[n][0].base).tofile(f)
+        self.rows += len(rows)
+
+    def flush(self):
+        for f in self._files.values():
+            f.flush()
+        self._write_meta()
+
+    def close(self):
+        for f in self._files.values():
+            f.close()
+        self._write_meta()
+
+    def _write_meta(self):
+        cols = {n: [self.dtype.fields[n][0].base.str, list(self.dtype.fields[n][0].shape)]
+                for n in self.dtype.names}
+        tmp = os.path.join(self.path, META + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump({"rows": self.rows, "columns": cols, "attrs": self.attrs}, f, indent=1)
+        os.replace(tmp, os.path.join(self.path, META))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def read_columns(path, names=None):
+    # -> ({name: read-only np.memmap (rows, *shape)}, meta); only `names` if given
+    with open(os.path.join(path, META)) as f:
+        meta = json.load(f)
+    rows, out = meta["rows"], {}
+    for n, (dt, shape) in meta["columns"].items():
+        if names is not None and n not in names:
+            continue
+        if rows == 0:
+            out[n] = np.zeros((0, *shape), dtype=dt)
+        else:
+            out[n] = np.memmap(os.path.join(path, n + ".bin"), dtype=dt, mode="r", shape=(rows, *shape))
+    return out, meta
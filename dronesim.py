@@ -0,0 +1,358 @@
+import math
+import time
+import json
+import argparse
+import multiprocessing as mp
+from collections import deque
+
+import numpy as np
+
+import tagdet
+from synth import yaw_matrix, square, SceneRenderer
+
+# Scene frame as in synth: x right, y down, z forward (m); yaw about +y, + turns right.
+
+TAG_SIZE = 0.20     # m, printed tag size in the simulated world
+# Support tag k's offset from its gate tag in tag sizes (tag-frame x, y) on simulated courses
+SUPPORT_LAYOUT = [(-2.0, 0.0), (2.0, 0.0), (-2.0, -2.0), (2.0, -2.0)]
+
+# technical_fira settings for flying the simulated world, under any params given per
+# mission. TAG_SIZE_M is calibrated to TAG_SIZE (technical_fira keeps the real camera's
+# 0.20 / 10 convention); the gains and thresholds are tuner.py's on these missions.
+# They stay here: real flights take tuned settings only through --tuning.
+SIM_SETTINGS = {
+    "TAG_SIZE_M": TAG_SIZE,
+    "P_YAW": 0.14293, "D_YAW": 0.02736, "P_LAT": 0.0546, "D_LAT": 0.00563,
+    "P_UP": 0.07627, "D_UP": 0.03208, "P_FWD": 1.0, "D_FWD": 0.04689,
+    "PX_TOL": 80, "APPROACH_DIST": 216, "PASS_CUTOFF": 74,
+}
+
+# ----------------------- Course -----------------------------
+
+def random_course(gates, supports=None, rng=None, tag_size=TAG_SIZE, gap=(2.5, 4.0),
+                  lateral=1.0, height=0.3, turn=20.0, above=0.3, bend=0.0):
+    # A randomized course: gate k's opening sits gap m beyond gate k-1 along
+    # the course line, up to `lateral` m left/right and `height` m up/down off
+    # it, turned up to `turn` deg from it. The line itself turns up to `bend`
+    # deg at every gate. Its tag hangs `above` m over the opening; support
+    # tags sit beside / above it in the gate's plane.
+    # -> (tags [(id, pos (3,), yaw)], gates [(center (3,), yaw)])
+    rng = np.random.default_rng(rng)
+    supports = supports or {}
+    u = tag_size
+    tags, openings = [], []
+    base, head = np.zeros(3), 0.0
+    for gid in gates:
+        if bend:
+            head += math.radians(rng.uniform(-bend, bend))
+        H = yaw_matrix(head)
+        base = base + H @ (0.0, 0.0, rng.uniform(*gap))
+        c = base + H @ (rng.uniform(-lateral, lateral), rng.uniform(-height, height), 0.0)
+        yaw = head + math.radians(rng.uniform(-turn, turn))
+        R = yaw_matrix(yaw)
+        p = c + R @ (0.0, -above, 0.0)
+        tags.append((gid, p, yaw))
+        for (dx, dy), sid in zip(SUPPORT_LAYOUT, supports.get(gid, [])):
+            tags.append((sid, p + R @ (dx * u, dy * u, 0.0), yaw))
+        openings.append((c, yaw))
+    return tags, openings
+
+class GateCheck:
+    """Physical gate passes: the drone crossing gate k's plane front to back.
+
+    update(t, pos) per step; a crossing inside `radius` of the opening is a
+    pass, anywhere else a miss, and either way the next gate becomes current.
+    crossings holds (gate index, t, distance from the opening center).
+    progress(pos) is gates crossed plus the covered fraction of the current leg.
+    """
+
+    def __init__(self, gates, radius=0.5):
+        self.centers = [np.asarray(c, dtype=float) for c, _ in gates]
+        self.rots = [yaw_matrix(yaw) for _, yaw in gates]
+        self.radius = radius
+        self.k = 0
+        self.crossings = []
+        self._prev = None
+        self._leg = np.zeros(3)         # where the current leg started
+
+    @property
+    def passed(self):
+        return sum(r <= self.radius for _, _, r in self.crossings)
+
+    @property
+    def done(self):
+        return self.k >= len(self.centers)
+
+    def progress(self, pos):
+        if self.done:
+            return float(self.k)
+        c = self.centers[self.k]
+        return self.k + max(0.0, 1.0 - np.linalg.norm(pos - c) / np.linalg.norm(c - self._leg))
+
+    def update(self, t, pos):
+        if self.done:
+            return
+        d = self.rots[self.k].T @ (pos - self.centers[self.k])
+        p = self._prev
+        self._prev = d
+        if p is None or not (p[2] < 0.0 <= d[2]):
+            return
+        a = -p[2] / (d[2] - p[2])                   # where the step crossed the plane
+        x, y = p[:2] + a * (d[:2] - p[:2])
+        self.crossings.append((self.k, t, math.hypot(x, y)))
+        self._leg = self.centers[self.k]
+        self.k += 1
+        self._prev = None
+
+# ----------------------- Vehicle ----------------------------
+
+class TelloSim:
+    """Kinematic Tello: rc commands in, pose out, on simulated time.
+
+    send_rc_control(lr, fb, ud, yaw) sets body-frame velocity and yaw-rate
+    targets (rc 100 = `speed` m/s, `yaw_rate` deg/s); step(dt) moves the
+    state towards them through first-order lags (tau, yaw_tau) and
+    integrates the pose. Offers the djitellopy calls technical_fira makes,
+    so it can stand in for the drone.
+    """
+
+    def __init__(self, pos=(0.0, 0.0, 0.0), yaw=0.0, speed=1.5, yaw_rate=100.0,
+                 tau=0.35, yaw_tau=0.15, battery=100.0, drain=0.1):
+        self.pos = np.array(pos, dtype=float)
+        self.yaw = float(yaw)
+        self.vel = np.zeros(3)          # scene frame, m/s
+        self.wz = 0.0                   # rad/s
+        self.rc = np.zeros(4)
+        self.speed = speed
+        self.yaw_rate = math.radians(yaw_rate)
+        self.tau, self.yaw_tau = tau, yaw_tau
+        self.battery = battery
+        self.drain = drain              # %/s
+        self.frame = None
+        self.t = 0.0
+
+    def send_rc_control(self, lr, fb, ud, yaw):
+        self.rc[:] = np.clip((lr, fb, ud, yaw), -100, 100)
+
+    def step(self, dt):
+        lr, fb, ud, yw = self.rc / 100.0
+        c, s = math.cos(self.yaw), math.sin(self.yaw)
+        vx, vy, vz = lr * self.speed, -ud * self.speed, fb * self.speed     # body frame, up = -y
+        target = (c * vx + s * vz, vy, -s * vx + c * vz)
+        self.vel += (1.0 - math.exp(-dt / self.tau)) * (np.asarray(target) - self.vel)
+        self.wz += (1.0 - math.exp(-dt / self.yaw_tau)) * (yw * self.yaw_rate - self.wz)
+        self.pos += self.vel * dt
+        self.yaw += self.wz * dt
+        self.battery = max(0.0, self.battery - self.drain * dt)
+        self.t += dt
+
+    def get_battery(self):
+        return int(self.battery)
+
+    def get_height(self):
+        return int(round(-self.pos[1] * 100.0))
+
+    def get_frame_read(self):
+        return self
+
+    def streamoff(self):
+        pass
+
+    def end(self):
+        pass
+
+# ----------------------- Sensors ----------------------------
+
+class TagSensor:
+    """Detections straight from the scene geometry, as tagdet.DET_DTYPE batches.
+
+    Projects every fully visible tag with Gaussian pixel noise on its corners
+    and range noise on its pose; tags under `min_side` px are missed and the
+    rest drop out with probability p_drop. Poses are scaled by declared /
+    tag_size, the way a detector configured with the declared size reports
+    them. observe() sees the pose from `delay` calls earlier (video latency).
+    """
+
+    def __init__(self, tags, camera, size, tag_size=TAG_SIZE, declared=None, px_noise=0.5,
+                 range_noise=0.02, p_drop=0.05, min_side=12.0, delay=0, seed=0):
+        # all tags at once: world-frame corners (N,4,3), centers (N,3), rotations (N,3,3)
+        self.ids = np.array([tid for tid, _, _ in tags], dtype=np.int16)
+        self.pos = np.array([p for _, p, _ in tags], dtype=float).reshape(-1, 3)
+        self.rot = np.array([yaw_matrix(yaw) for _, _, yaw in tags]).reshape(-1, 3, 3)
+        self.world = np.einsum("nij,kj->nki", self.rot, square(tag_size / 2.0)) + self.pos[:, None]
+        self.K = (camera.fx, camera.fy, camera.cx, camera.cy)
+        self.size = size
+        self.near = 0.05 * tag_size
+        self.scale = (declared or tag_size) / tag_size
+        self.px_noise, self.range_noise = px_noise, range_noise
+        self.p_drop, self.min_side = p_drop, min_side
+        self.rng = np.random.default_rng(seed)
+        self._hist = deque(maxlen=delay + 1)
+
+    def observe(self, pos, yaw):
+        self._hist.append((np.array(pos, dtype=float), yaw))
+        pos, yaw = self._hist[0]
+        fx, fy, cx, cy = self.K
+        w, h = self.size
+        Rwc = yaw_matrix(yaw)
+        pc = (self.world - pos) @ Rwc                       # camera-frame corners (N,4,3)
+        t = (self.pos - pos) @ Rwc
+        R = Rwc.T @ self.rot
+        z = np.maximum(pc[..., 2], self.near)
+        uv = np.stack([fx * pc[..., 0] / z + cx, fy * pc[..., 1] / z + cy], axis=-1)
+        side = np.linalg.norm(uv - uv[:, [1, 2, 3, 0]], axis=2).min(axis=1)
+        ok = ((pc[..., 2] >= self.near).all(axis=1) & (np.einsum("ni,ni->n", R[:, :, 2], t) > 0)
+              & (uv.min(axis=(1, 2)) >= 0) & (uv[..., 0].max(axis=1) < w) & (uv[..., 1].max(axis=1) < h)
+              & (side >= self.min_side) & (self.rng.random(len(t)) >= self.p_drop))
+        n = int(ok.sum())
+        out = np.zeros(n, tagdet.DET_DTYPE)
+        if n:
+            uv = uv[ok] + self.rng.normal(0.0, self.px_noise, (n, 4, 2))
+            out["id"] = self.ids[ok]
+            out["dm"] = np.minimum(100.0, 2.0 * side[ok])
+            out["corners"] = uv
+            out["center"] = uv.mean(axis=1)
+            out["R"] = R[ok]
+            out["t"] = t[ok] * (1.0 + self.rng.normal(0.0, self.range_noise, (n, 1))) * self.scale
+        return out
+
+class ImageSensor:
+    """Rendered frames of the scene (synth.SceneRenderer) for the full detection path."""
+
+    def __init__(self, tags, camera, size, tag_size=TAG_SIZE, noise=2.0, delay=0, seed=0):
+        self.renderer = SceneRenderer(tags, size[0], size[1], camera.fx, camera.fy, camera.cx, camera.cy,
+                                      tag_size, noise=noise, seed=seed)
+        self._hist = deque(maxlen=delay + 1)
+
+    def observe(self, pos, yaw):
+        self._hist.append((np.array(pos, dtype=float), yaw))
+        img, _ = self.renderer.render(*self._hist[0])
+        return img
+
+# ----------------------- Missions ---------------------------
+
+_TF = None
+_TOUCHED = {}
+
+def configure(tf, params):
+    # Apply technical_fira config overrides on top of its own defaults; keys
+    # set by an earlier call and absent now go back to their defaults.
+    for k, v in _TOUCHED.items():
+        setattr(tf, k, v)
+    for k, v in (params or {}).items():
+        if not hasattr(tf, k):
+            raise KeyError(f"technical_fira has no setting {k}")
+        _TOUCHED.setdefault(k, getattr(tf, k))
+        setattr(tf, k, v)
+
+def load_fira():
+    global _TF
+    if _TF is None:
+        import technical_fira
+        _TF = technical_fira
+    return _TF
+
+def run_mission(seed, params=None, fps=30.0, image=False, world=None):
+    # One randomized mission: course, vehicle and sensor noise all from seed.
+    # params: technical_fira settings over SIM_SETTINGS. world: overrides for
+    # random_course / TelloSim / sensor keyword arguments; map=True hands the
+    # FSM the course as a gatemap.CourseMap. The mission runs until the FSM
+    # ends it; it is complete when the FSM reached DONE with every gate flown.
+    tf = load_fira()
+    params = dict(SIM_SETTINGS, **(params or {}))
+    configure(tf, params)
+    world = world or {}
+    rng = np.random.default_rng(seed)
+    course = {k: world[k] for k in ("gap", "lateral", "height", "turn", "above", "bend") if k in world}
+    tag_size = world.get("tag_size", TAG_SIZE)
+    tags, gates = random_course(tf.GATE_SEQUENCE, tf.SUPPORT_TAGS, rng, tag_size, **course)
+    if world.get("map"):
+        from gatemap import CourseMap
+        tf.load_course_map(CourseMap.from_tags(tags, tf.GATE_SEQUENCE))
+    else:
+        tf.load_course_map(None)
+    vehicle = {k: world[k] for k in ("speed", "yaw_rate", "tau", "yaw_tau") if k in world}
+    sim = TelloSim(**vehicle)
+    delay = int(round(world.get("latency", 0.1) * fps))
+    size = (tf.FRAME_W, tf.FRAME_H)
+    if image:
+        sensor = ImageSensor(tags, tf.CAMERA, size, tag_size, delay=delay, seed=seed)
+    else:
+        noise = {k: world[k] for k in ("px_noise", "range_noise", "p_drop", "min_side") if k in world}
+        sensor = TagSensor(tags, tf.CAMERA, size, tag_size, tf.TAG_SIZE_M, delay=delay,
+                           seed=int(rng.integers(1 << 31)), **noise)
+    check = GateCheck(gates, world.get("radius", 0.5))
+
+    def on_step(t, s):
+        check.update(t, s.pos)
+
+    t0 = time.perf_counter()
+    res = tf.run_sim_mission(sim, sensor, fps, on_step)
+    res.update(seed=seed, wall=time.perf_counter() - t0, n_gates=len(gates), flown=check.passed,
+               crossings=check.crossings, progress=check.progress(sim.pos),
+               complete=res["state"] == "DONE" and check.passed == len(gates))
+    return res
+
+def _run_task(task):
+    return run_mission(*task)
+
+def run_missions(n, workers=None, seed=0, params=None, fps=30.0, image=False, world=None):
+    # n missions with seeds seed..seed+n-1 over a process pool; results in seed order.
+    tasks = [(seed + i, params, fps, image, world) for i in range(n)]
+    workers = workers or tagdet.default_threads()
+    if workers == 1:
+        return list(map(_run_task, tasks))
+    with mp.Pool(workers) as pool:
+        return pool.map(_run_task, tasks, chunksize=max(1, n // (4 * workers)))
+
+def summarize(results, wall=None):
+    n = len(results)
+    # mission time percentiles over complete missions; None when there are none
+    done = [r for r in results if r["complete"]]
+    t = np.array([r["t"] for r in done])
+    sim = sum(r["t"] for r in results)
+    out = {
+        "missions": n,
+        "complete": len(done) / max(n, 1),
+        "fsm_done": sum(r["state"] == "DONE" for r in results) / max(n, 1),
+        "gates_flown": float(np.mean([r["flown"] / r["n_gates"] for r in results])) if n else 0.0,
+        "t_p50": float(np.percentile(t, 50)) if len(t) else None,
+        "t_p95": float(np.percentile(t, 95)) if len(t) else None,
+        "sim_s": sim,
+    }
+    if wall:
+        out.update(wall_s=wall, missions_per_s=n / wall, speedup=sim / wall)
+    return out
+
+# --------------------------- CLI ----------------------------
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Randomized closed-loop gate missions against a simulated Tello")
+    ap.add_argument("--missions", type=int, default=200)
+    ap.add_argument("--workers", type=int, default=None, help="processes (default: all cores)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--fps", type=float, default=30.0)
+    ap.add_argument("--image", action="store_true", help="render frames and run the real detector (slow)")
+    ap.add_argument("--latency", type=float, default=0.1, help="video latency (s)")
+    ap.add_argument("--speed", type=float, default=None, help="m/s at rc 100")
+    ap.add_argument("--param", action="append", default=[], metavar="NAME=VALUE",
+                    help="technical_fira setting over SIM_SETTINGS, value as JSON (repeatable)")
+    args = ap.parse_args()
+
+    params = {}
+    for kv in args.param:
+        k, v = kv.split("=", 1)
+        params[k] = json.loads(v)
+
+    world = {"latency": args.latency}
+    if args.speed is not None:
+        world["speed"] = args.speed
+    t0 = time.perf_counter()
+    results = run_missions(args.missions, args.workers, args.seed, params, args.fps, args.image, world)
+    s = summarize(results, time.perf_counter() - t0)
+    t = (f"t p50={s['t_p50']:.1f}s p95={s['t_p95']:.1f}s (complete missions)" if s["t_p50"] is not None
+         else "no complete missions")
+    print(f"[Sim] {s['missions']} missions: complete {s['complete']:.0%}  fsm DONE {s['fsm_done']:.0%}  "
+          f"gates flown {s['gates_flown']:.0%}  {t}")
+    print(f"[Sim] {s['sim_s']:.0f}s simulated in {s['wall_s']:.1f}s wall = {s['speedup']:.0f}x real time, "
+          f"{s['missions_per_s']:.1f} missions/s")
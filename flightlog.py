@@ -0,0 +1,158 @@
+import os
+import json
+import time
+import argparse
+
+import numpy as np
+
+from columns import META, read_columns
+
+MAX_DETS = 8   # detections kept per frame record (the first ones, i.e. best first)
+
+def record_dtype(max_dets=MAX_DETS):
+    # One fixed-size record per control step.
+    return np.dtype([
+        ("t",       np.float64),              # mission clock [s]
+        ("wall",    np.float64),              # time.time()
+        ("fid",     np.int64),                # frame id
+        ("state",   np.uint8),                # index into meta attrs["states"]
+        ("target",  np.int16),
+        ("n_det",   np.uint8),                # detections in the frame (may exceed max_dets)
+        ("det_id",  np.int16, max_dets),      # -1 = empty slot
+        ("det_t",   np.float32, (max_dets, 3)),   # smoothed t [cm]
+        ("det_rpy", np.float32, (max_dets, 3)),   # smoothed roll, pitch, yaw [deg]
+        ("det_c",   np.float32, (max_dets, 2)),   # center [px]
+        ("det_dm",  np.float32, max_dets),
+        ("rc",      np.int8, 4),              # lr, fb, ud, yaw
+        ("det_ms",  np.float32),
+        ("loop_ms", np.float32),
+        ("bat",     np.int16),                # %, -1 = unknown
+    ])
+
+class FlightRecorder:
+    """Per-frame flight log written straight into memory-mapped column files.
+
+    Same on-disk layout as columns.ColumnWriter (<field>.bin + meta.json), so
+    read_log()/columns.read_columns() load it as NumPy arrays. record() only
+    stores into the maps -- the OS writes pages back in the background -- and
+    meta.json (the row count readers trust) is refreshed every meta_every
+    seconds and on close(). Column files grow by doubling `capacity`.
+    """
+
+    def __init__(self, path, states, max_dets=MAX_DETS, capacity=1 << 14, attrs=None, meta_every=2.0):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.dtype = record_dtype(max_dets)
+        self.max_dets = max_dets
+        self.states = {s: i for i, s in enumerate(states)}
+        self.attrs = dict(attrs or {}, states=list(states))
+        self.rows = 0
+        self.capacity = 0
+        self.meta_every = meta_every
+        self._meta_t = 0.0
+        self.maps = {}
+        self.cols = {}
+        self._grow(capacity)
+        self._write_meta()
+
+    def _grow(self, capacity):
+        for n in self.dtype.names:
+            dt, shape = self.dtype.fields[n][0].base, self.dtype.fields[n][0].shape
+            fn = os.path.join(self.path, n + ".bin")
+            with open(fn, "ab") as f:
+                f.truncate(capacity * dt.itemsize * int(np.prod(shape, dtype=int)))
+            self.maps[n] = np.memmap(fn, dtype=dt, mode="r+", shape=(capacity, *shape))
+            self.cols[n] = self.maps[n].view(np.ndarray)     # plain views: no memmap subclass per store
+        self.capacity = capacity
+
+    def record(self, t, fid, state, target, dets, rc, det_ms, bat, loop_ms=0.0):
+        # dets: technical_fira detection dicts (id, center, t_cm, rpy, dm)
+        if self.rows == self.capacity:
+            self._grow(self.capacity * 2)
+        i, c = self.rows, self.cols
+        c["t"][i] = t
+        c["wall"][i] = time.time()
+        c["fid"][i] = fid
+        c["state"][i] = self.states.get(state, 255)
+        c["target"][i] = target
+        c["n_det"][i] = min(len(dets), 255)
+        ids = c["det_id"][i]
+        ids[:] = -1
+        for k, d in enumerate(dets[:self.max_dets]):
+            ids[k] = d["id"]
+            c["det_t"][i, k] = d["t_cm"]
+            c["det_rpy"][i, k] = d["rpy"]
+            c["det_c"][i, k] = d["center"]
+            c["det_dm"][i, k] = d["dm"]
+        c["rc"][i] = rc
+        c["det_ms"][i] = det_ms
+        c["loop_ms"][i] = loop_ms
+        c["bat"][i] = -1 if bat is None else bat
+        self.rows += 1
+        if t - self._meta_t >= self.meta_every:
+            self._meta_t = t
+            self._write_meta()
+
+    def close(self):
+        for m in self.maps.values():
+            m.flush()
+        self.maps.clear()
+        self.cols.clear()
+        # trim the unused tail of every column file
+        for n in self.dtype.names:
+            dt, shape = self.dtype.fields[n][0].base, self.dtype.fields[n][0].shape
+            with open(os.path.join(self.path, n + ".bin"), "r+b") as f:
+                f.truncate(self.rows * dt.itemsize * int(np.prod(shape, dtype=int)))
+        self._write_meta()
+
+    def _write_meta(self):
+        cols = {n: [self.dtype.fields[n][0].base.str, list(self.dtype.fields[n][0].shape)]
+                for n in self.dtype.names}
+        tmp = os.path.join(self.path, META + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump({"rows": self.rows, "columns": cols, "attrs": self.attrs}, f, indent=1)
+        os.replace(tmp, os.path.join(self.path, META))
+
+def read_log(path):
+    # -> ({column: array}, meta); adds "state_name" (object array) decoded from "state"
+    cols, meta = read_columns(path)
+    names = np.array(meta["attrs"].get("states", []) + ["?"], dtype=object)
+    cols["state_name"] = names[np.minimum(cols["state"], len(names) - 1)]
+    return cols, meta
+
+# ------------------------ Benchmark -------------------------
+
+def bench(path, n=20000, n_dets=3, loop_ms=33.3):
+    # record() cost with n_dets detections per frame, as a share of a loop_ms frame
+    dets = [{"id": 1 + k, "center": (480 + k, 360), "t_cm": np.array([1.0, 2.0, 150.0]),
+             "rpy": np.array([0.0, 5.0, 1.0]), "dm": 50.0} for k in range(n_dets)]
+    rec = FlightRecorder(path, ("ACQUIRE", "ALIGN"), capacity=1024)
+    ms = np.empty(n)
+    for i in range(n):
+        t0 = time.perf_counter()
+        rec.record(i / 30.0, i, "ALIGN", 1, dets, (0, 20, 0, -5), 12.5, 80)
+        ms[i] = (time.perf_counter() - t0) * 1000.0
+    rec.close()
+    cols, meta = read_log(path)
+    assert meta["rows"] == n and cols["fid"][-1] == n - 1
+    p50, p99 = np.percentile(ms, [50, 99])
+    print(f"[FlightLog] record() p50={p50 * 1000:.1f}us p99={p99 * 1000:.1f}us  "
+          f"= {100.0 * ms.mean() / loop_ms:.3f}% of a {loop_ms:.1f}ms loop  ({n} rows -> {path})")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Flight log reader / recorder benchmark")
+    ap.add_argument("path")
+    ap.add_argument("--bench", action="store_true", help="benchmark record() into path")
+    args = ap.parse_args()
+    if args.bench:
+        bench(args.path)
+    else:
+        cols, meta = read_log(args.path)
+        n = meta["rows"]
+        print(f"[FlightLog] {n} records, {meta['attrs']}")
+        if n:
+            t = cols["t"]
+            states, counts = np.unique(cols["state_name"], return_counts=True)
+            print(f"  span {t[-1] - t[0]:.1f}s  det_ms p50={np.median(cols['det_ms']):.1f}  "
+                  f"frames with tags {np.mean(cols['n_det'] > 0):.0%}")
+            print("  " + "  ".join(f"{s}:{c}" for s, c in zip(states, counts)))
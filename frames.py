@@ -0,0 +1,186 @@
+import os
+import glob
+import time
+import argparse
+
+import cv2
+import numpy as np
+
+class Frame:
+    """One captured frame in a FrameRing slot: header + views of the slot's planes.
+
+    bgr/gray are shared by reference with every consumer (detection, control,
+    HUD) and stay valid until the ring wraps around to this slot again.
+    """
+    __slots__ = ("fid", "ts", "slot", "bgr", "gray")
+
+    def __init__(self, fid, ts, slot, bgr, gray):
+        self.fid = fid      # monotonically increasing frame id
+        self.ts = ts        # capture time, time.perf_counter()
+        self.slot = slot
+        self.bgr = bgr
+        self.gray = gray
+
+class FrameRing:
+    """Preallocated BGR + gray ring buffers at a fixed output size.
+
+    Each incoming frame is resized straight into the next slot (dst=), color
+    fixed up in place, and its gray plane produced once. Nothing is allocated
+    per frame. `slots` must exceed the number of frames in flight across all
+    pipeline stages.
+    """
+
+    def __init__(self, width, height, slots=8):
+        self.size = (width, height)
+        self.slots = slots
+        self.bgr = np.empty((slots, height, width, 3), np.uint8)
+        self.gray = np.empty((slots, height, width), np.uint8)
+        self._raw = None
+        self._fid = 0
+
+    def fill(self, src, color=None, ts=None):
+        # src: image at any size; color: optional in-place cvtColor code (e.g. RGB2BGR)
+        slot = self._fid % self.slots
+        bgr, gray = self.bgr[slot], self.gray[slot]
+        if src.shape[1::-1] == self.size:
+            np.copyto(bgr, src)
+        else:
+            cv2.resize(src, self.size, dst=bgr)
+        if color is not None:
+            cv2.cvtColor(bgr, color, dst=bgr)
+        cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY, dst=gray)
+        fr = Frame(self._fid, time.perf_counter() if ts is None else ts, slot, bgr, gray)
+        self._fid += 1
+        return fr
+
+    def capture(self, cap):
+        # cv2.VideoCapture-like read() into a reused native-size buffer, then fill()
+        ok, raw = cap.read(self._raw) if self._raw is not None else cap.read()
+        if not ok or raw is None:
+            return None
+        self._raw = raw
+        return self.fill(raw)
+
+# ----------------------- Sources ----------------------------
+
+class FrameSource:
+    """Base for frame backends: read() -> Frame (from the source's ring) or None.
+
+    Backends produce frames at width x height; ring buffers are owned by the
+    source, so consumers must be done with a Frame before `slots` more reads.
+    `truth` is None except for synthetic sources, where it holds the ground
+    truth of the last frame read.
+    """
+
+    def __init__(self, width, height, slots=8):
+        self.ring = FrameRing(width, height, slots)
+        self.truth = None
+
+    def read(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+class CaptureSource(FrameSource):
+    """Webcam index or video file through cv2.VideoCapture."""
+
+    def __init__(self, src, width, height, slots=8):
+        super().__init__(width, height, slots)
+        self.cap = cv2.VideoCapture(src)
+        if isinstance(src, int):
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+
+    def read(self):
+        return self.ring.capture(self.cap)
+
+    def close(self):
+        self.cap.release()
+
+IMAGE_EXTS = (".png", ".jpg", ".jpeg", ".bmp")
+
+def list_images(path):
+    # frame files of a directory in sorted file-name order
+    return sorted(f for f in glob.glob(os.path.join(path, "*")) if f.lower().endswith(IMAGE_EXTS))
+
+class DirSource(FrameSource):
+    """Recorded frames in a directory, read in sorted file-name order."""
+
+    def __init__(self, path, width, height, slots=8):
+        super().__init__(width, height, slots)
+        self.files = list_images(path)
+        self.i = 0
+
+    def read(self):
+        while self.i < len(self.files):
+            img = cv2.imread(self.files[self.i])
+            self.i += 1
+            if img is not None:
+                return self.ring.fill(img)
+        return None
+
+class TelloSource(FrameSource):
+    """Latest frame of a connected djitellopy Tello (streamon() already called)."""
+
+    def __init__(self, tello, width, height, slots=8, color=None):
+        super().__init__(width, height, slots)
+        self.reader = tello.get_frame_read()
+        self.color = color
+
+    def read(self):
+        img = self.reader.frame
+        if img is None:
+            return None
+        return self.ring.fill(img, self.color)
+
+def open_path(path, width, height, slots=8):
+    # video file or frame directory
+    if os.path.isdir(path):
+        return DirSource(path, width, height, slots)
+    return CaptureSource(path, width, height, slots)
+
+# ------------------------ Benchmark -------------------------
+
+def _legacy(src, size):
+    # the per-frame path the drone scripts used: fresh arrays at every step
+    frame = cv2.resize(src, size)
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    show = frame.copy()
+    return frame, gray, show
+
+def bench(path, width=960, height=720, n=300):
+    import tracemalloc
+
+    cap = cv2.VideoCapture(path)
+    raws = []
+    while len(raws) < n:
+        ok, fr = cap.read()
+        if not ok: break
+        raws.append(fr)
+    cap.release()
+    if not raws:
+        print(f"[Bench] no frames in {path}")
+        return
+    ring = FrameRing(width, height)
+    runs = [("legacy", lambda r: _legacy(r, (width, height))), ("ring", ring.fill)]
+    for name, fn in runs:
+        fn(raws[0])
+        t0 = time.perf_counter()
+        for r in raws:
+            fn(r)
+        ms = (time.perf_counter() - t0) * 1000.0 / len(raws)
+        tracemalloc.start()
+        for r in raws:
+            fn(r)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"[Bench] frames {name:<6} {ms:.3f} ms/frame  peak_alloc={peak/1024:.0f}KiB")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Frame acquisition benchmark")
+    ap.add_argument("video")
+    ap.add_argument("--width", type=int, default=960)
+    ap.add_argument("--height", type=int, default=720)
+    args = ap.parse_args()
+    bench(args.video, args.width, args.height)
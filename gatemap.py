@@ -0,0 +1,142 @@
+import json
+import math
+import argparse
+
+import numpy as np
+
+# The simulator / renderer modules (dronesim, synth -> cv2.aruco) are imported
+# where they are used, so technical_fira does not load them without a map.
+
+# Map frame = the drone's start pose: x right, y down, z forward (m), yaw about +y (+ turns right).
+
+class CourseMap:
+    """Known poses of a course's tags, gate tags and support tags alike.
+
+    File format (JSON): {"gates": [gate tag ids in flight order],
+    "tags": {"<id>": {"pos": [x, y, z], "yaw": deg}}}; positions in the
+    units the detector reports (m at the configured tag size).
+    """
+
+    def __init__(self, tags, gates=()):
+        # tags: {id: (pos (3,), yaw rad)}
+        self.tags = {int(k): (np.asarray(p, dtype=float), float(yaw)) for k, (p, yaw) in tags.items()}
+        self.gates = [int(g) for g in gates]
+
+    @classmethod
+    def from_tags(cls, tags, gates=()):
+        # synth / dronesim course tags [(id, pos, yaw rad)]
+        return cls({tid: (p, yaw) for tid, p, yaw in tags}, gates)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            d = json.load(f)
+        return cls({int(k): (v["pos"], math.radians(v["yaw"])) for k, v in d["tags"].items()}, d.get("gates", ()))
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump({"gates": self.gates,
+                       "tags": {str(k): {"pos": p.tolist(), "yaw": math.degrees(yaw)} for k, (p, yaw) in self.tags.items()}},
+                      f, indent=1)
+
+    def __contains__(self, tag_id):
+        return tag_id in self.tags
+
+    def pose(self, tag_id):
+        return self.tags[tag_id]
+
+class DeadReckoner:
+    """Drone pose in a CourseMap's frame from the rc commands it was sent.
+
+    command(rc, t) flies the previous command up to time t on TelloSim's
+    kinematics and then holds rc. observe() pulls the pose towards the one
+    implied by a mapped tag in view (`blend` 1 = jump to it), which keeps the
+    drift of the open-loop integration bounded while tags are visible.
+    """
+
+    def __init__(self, cmap, speed=1.5, yaw_rate=100.0, tau=0.35, yaw_tau=0.15, blend=0.5):
+        from dronesim import TelloSim
+        self.map = cmap
+        self.model = TelloSim(speed=speed, yaw_rate=yaw_rate, tau=tau, yaw_tau=yaw_tau, drain=0.0)
+        self.blend = blend
+        self.t = None
+
+    @property
+    def pos(self):
+        return self.model.pos
+
+    @property
+    def yaw(self):
+        return self.model.yaw
+
+    def reset(self, t, pos=(0.0, 0.0, 0.0), yaw=0.0):
+        m = self.model
+        m.pos[:] = pos
+        m.yaw = yaw
+        m.vel[:] = 0.0
+        m.wz = 0.0
+        m.rc[:] = 0.0
+        self.t = t
+
+    def advance(self, t):
+        if self.t is not None and t > self.t:
+            self.model.step(t - self.t)
+        self.t = t
+
+    def command(self, rc, t):
+        self.advance(t)
+        self.model.send_rc_control(*rc)
+
+    def observe(self, tag_id, t_m, yaw_cam, t):
+        # tag_id seen at camera-frame position t_m (m), turned yaw_cam (rad) about the camera y axis
+        if tag_id not in self.map:
+            return False
+        from synth import yaw_matrix
+        self.advance(t)
+        p, tag_yaw = self.map.pose(tag_id)
+        yaw = tag_yaw - yaw_cam
+        pos = p - yaw_matrix(yaw) @ np.asarray(t_m, dtype=float)
+        m = self.model
+        m.yaw += self.blend * ((yaw - m.yaw + math.pi) % (2.0 * math.pi) - math.pi)
+        m.pos += self.blend * (pos - m.pos)
+        return True
+
+    def relative(self, tag_id):
+        # mapped tag position in the drone's body frame (m), or None
+        if tag_id not in self.map:
+            return None
+        from synth import yaw_matrix
+        return yaw_matrix(self.yaw).T @ (self.map.pose(tag_id)[0] - self.pos)
+
+# ------------------------ Benchmark -------------------------
+
+def bench(n=40, params=None, world=None, workers=None):
+    # Share of gates acquired (own tags seen) and time from gate start to
+    # acquisition, over the same randomized missions without / with the map.
+    import dronesim
+    print(f"[Map] {n} simulated missions each")
+    for use_map in (False, True):
+        w = dict(world or {}, map=use_map)
+        res = dronesim.run_missions(n, workers, 0, params, world=w)
+        # gates 2.. of every mission: the first one starts in view
+        later = [g["acquire"] for r in res for g in r["gates"][1:]] + [None] * sum(
+            max(0, r["n_gates"] - max(1, len(r["gates"]))) for r in res)
+        acq = np.array([a for a in later if a is not None] or [np.nan])
+        s = dronesim.summarize(res)
+        print(f"[Map] map={'on ' if use_map else 'off'}  acquired {np.isfinite(acq).sum() / len(later):4.0%}  "
+              f"t p50={np.percentile(acq, 50):.2f}s p90={np.percentile(acq, 90):.2f}s  "
+              f"gates flown {s['gates_flown']:.0%}  mission t p50={np.median([r['t'] for r in res]):.1f}s")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Acquisition time with vs without a course map, in the simulator")
+    ap.add_argument("--missions", type=int, default=40)
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--tuning", type=str, default="fira_tuning.json", help="technical_fira settings to fly with")
+    ap.add_argument("--lateral", type=float, default=1.0, help="max lateral gate offset (m)")
+    ap.add_argument("--turn", type=float, default=20.0, help="max gate yaw off the course line (deg)")
+    ap.add_argument("--bend", type=float, default=60.0, help="max turn of the course line per gate (deg)")
+    args = ap.parse_args()
+
+    from tuner import read_tuning
+    params = read_tuning(args.tuning, "technical_fira").get("params")
+    bench(args.missions, params, {"lateral": args.lateral, "turn": args.turn, "bend": args.bend}, args.workers)
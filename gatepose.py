@@ -0,0 +1,174 @@
+import math
+import argparse
+
+import numpy as np
+
+import tagdet
+
+# Camera frame: x right, y down, z forward (m). Tag frame (tagdet poses): x right, y down.
+# synth (-> cv2.aruco) is imported where it is used, as in gatemap.
+
+class GateLayout:
+    """Where each tag of a gate sits relative to the gate tag.
+
+    offsets: {tag id: (gate tag id, offset (3,) in the gate tag's frame)}; a
+    gate tag maps to itself with a zero offset. Lookups go through id-indexed
+    arrays so a whole batch resolves in one step.
+    """
+
+    def __init__(self, offsets):
+        n = max(offsets) + 1 if offsets else 1
+        self.gate = np.full(n, -1, dtype=np.int32)
+        self.offset = np.zeros((n, 3))
+        for tid, (gid, off) in offsets.items():
+            self.gate[tid] = gid
+            self.offset[tid] = off
+
+    @classmethod
+    def from_supports(cls, supports, tag_size, layout):
+        # supports: {gate id: [support ids]} (technical_fira.SUPPORT_TAGS); layout: measured
+        # offset of support tag k from its gate tag in tag sizes (tag-frame x, y)
+        offsets = {}
+        for gid, sids in supports.items():
+            offsets[gid] = (gid, np.zeros(3))
+            for (dx, dy), sid in zip(layout, sids):
+                offsets[sid] = (gid, (dx * tag_size, dy * tag_size, 0.0))
+        return cls(offsets)
+
+    @classmethod
+    def from_map(cls, cmap, supports):
+        # offsets measured from a gatemap.CourseMap; tags it lacks are left out
+        from synth import yaw_matrix
+        offsets = {}
+        for gid, sids in supports.items():
+            if gid not in cmap:
+                continue
+            p, yaw = cmap.pose(gid)
+            R = yaw_matrix(yaw)
+            offsets[gid] = (gid, np.zeros(3))
+            for sid in sids:
+                if sid in cmap:
+                    offsets[sid] = (gid, R.T @ (cmap.pose(sid)[0] - p))
+        return cls(offsets)
+
+    def lookup(self, ids):
+        # -> gate id per tag (-1: not part of a gate), offset (N,3)
+        ids = np.asarray(ids, dtype=np.int64)
+        ok = (ids >= 0) & (ids < len(self.gate))
+        k = np.where(ok, ids, 0)
+        return np.where(ok, self.gate[k], -1), self.offset[k]
+
+def fuse(batch, layout, camera, tag_size, px_sigma=1.0):
+    # All tags of each gate in a DET_DTYPE batch -> one least-squares pose of
+    # the gate tag. Each tag i gives t_i - R_g o_i as a sighting of the gate tag;
+    # its covariance is diagonal in the camera frame, z sigma_px / f across the
+    # ray and z^2 sigma_px / (f s) along it (corner noise on a tag of side s).
+    # R_g is the weighted chordal mean of the tags' rotations.
+    # -> (batch with gate tags replaced by the fused rows and support rows
+    #     kept, {gate id: (tags fused, covariance (3,3) of t)})
+    gate, off = layout.lookup(batch["id"])
+    m = gate >= 0
+    if not m.any():
+        return batch, {}
+    from synth import square
+    obs, off = batch[m], off[m]
+    gids, gi = np.unique(gate[m], return_inverse=True)
+    G = len(gids)
+
+    t = obs["t"]
+    z = np.maximum(t[:, 2], 1e-6)
+    lat = z * px_sigma / camera.fx
+    w = 1.0 / np.stack([lat, lat, lat * z / tag_size], axis=1) ** 2          # (N,3)
+
+    M = np.zeros((G, 3, 3))
+    np.add.at(M, gi, obs["R"] * w[:, 2, None, None])
+    U, _, Vt = np.linalg.svd(M)
+    U[:, :, 2] *= np.sign(np.linalg.det(U @ Vt))[:, None]
+    Rg = U @ Vt
+
+    r = t - np.einsum("nij,nj->ni", Rg[gi], off)
+    W = np.stack([np.bincount(gi, w[:, a], G) for a in range(3)], axis=1)
+    tg = np.stack([np.bincount(gi, w[:, a] * r[:, a], G) for a in range(3)], axis=1) / W
+    # inflate by the reduced chi-square when the tags disagree more than modelled
+    n = np.bincount(gi, minlength=G)
+    chi2 = np.bincount(gi, (w * (r - tg[gi]) ** 2).sum(axis=1), G)
+    dof = 3 * (n - 1)
+    scale = np.where(dof > 0, np.maximum(1.0, chi2 / np.maximum(dof, 1)), 1.0)
+    cov = (scale[:, None] / W)[:, :, None] * np.eye(3)
+
+    fused = np.zeros(G, dtype=tagdet.DET_DTYPE)
+    fused["id"] = gids
+    fused["R"], fused["t"] = Rg, tg
+    fused["dm"] = -np.inf
+    np.maximum.at(fused["dm"], gi, obs["dm"])
+    fused["ham"] = np.iinfo(np.int8).max
+    np.minimum.at(fused["ham"], gi, obs["ham"])
+    pc = np.einsum("gij,kj->gki", Rg, square(tag_size / 2.0)) + tg[:, None]
+    zc = np.maximum(pc[..., 2], 1e-6)
+    fused["corners"] = np.stack([camera.fx * pc[..., 0] / zc + camera.cx,
+                                 camera.fy * pc[..., 1] / zc + camera.cy], axis=-1)
+    fused["center"] = np.stack([camera.fx * tg[:, 0] / np.maximum(tg[:, 2], 1e-6) + camera.cx,
+                                camera.fy * tg[:, 1] / np.maximum(tg[:, 2], 1e-6) + camera.cy], axis=1)
+
+    keep = ~np.isin(batch["id"], gids)
+    info = {int(g): (int(n[k]), cov[k]) for k, g in enumerate(gids)}
+    return np.concatenate([batch[keep], fused]), info
+
+# ------------------------ Benchmark -------------------------
+
+def pose_error(n=2000, gate=12, seed=0):
+    # Gate tag position error (cm) per frame, its own detection alone vs fused
+    # with its support tags, from random views 1-4 m in front of the gate.
+    import dronesim
+    from synth import yaw_matrix
+    tf = dronesim.load_fira()
+    rng = np.random.default_rng(seed)
+    size = dronesim.TAG_SIZE
+    tags, _ = dronesim.random_course([gate], tf.SUPPORT_TAGS, rng, tag_size=size, lateral=0.0, height=0.0, turn=0.0)
+    gpos = tags[0][1]
+    layout = GateLayout.from_supports(tf.SUPPORT_TAGS, size, dronesim.SUPPORT_LAYOUT)
+    sensor = dronesim.TagSensor(tags, tf.CAMERA, (tf.FRAME_W, tf.FRAME_H), size, p_drop=0.0, seed=seed)
+    single, fused, ntags = [], [], []
+    for _ in range(n):
+        pos = gpos + (rng.uniform(-0.6, 0.6), rng.uniform(-0.3, 0.5), -rng.uniform(1.0, 4.0))
+        yaw = math.radians(rng.uniform(-15, 15))
+        truth = (gpos - pos) @ yaw_matrix(yaw)
+        b = sensor.observe(pos, yaw)
+        if gate not in b["id"]:
+            continue
+        single.append(np.linalg.norm(b["t"][b["id"] == gate][0] - truth))
+        out, info = fuse(b, layout, tf.CAMERA, size)
+        fused.append(np.linalg.norm(out["t"][out["id"] == gate][0] - truth))
+        ntags.append(info[gate][0])
+    single, fused = 100.0 * np.array(single), 100.0 * np.array(fused)
+    print(f"[Fuse] gate {gate}, {len(single)} views, {np.mean(ntags):.1f} tags fused on average")
+    for name, e in (("single", single), ("fused", fused)):
+        print(f"[Fuse] {name:<6} error p50={np.percentile(e, 50):5.2f}cm p90={np.percentile(e, 90):5.2f}cm")
+
+def bench(n=48, params=None, world=None, workers=None):
+    # Same randomized missions with technical_fira's gate fusion off / on (the
+    # simulated course's support layout standing in for a measured one)
+    import dronesim
+    print(f"[Fuse] {n} simulated missions each")
+    for on in (False, True):
+        res = dronesim.run_missions(n, workers, 0, dict(params or {}, GATE_FUSION=on,
+                                                        GATE_LAYOUT=dronesim.SUPPORT_LAYOUT), world=world)
+        s = dronesim.summarize(res)
+        passes = [t1 - t0 for r in res for t0, t1 in
+                  ((g["t_start"], g["t_pass"]) for g in r["gates"])]
+        off = [d for r in res for _, _, d in r["crossings"]]
+        print(f"[Fuse] fusion={'on ' if on else 'off'}  gate time p50={np.median(passes):.2f}s  "
+              f"crossing offset p50={100 * np.median(off):.0f}cm  gates flown {s['gates_flown']:.0%}  "
+              f"mission t p50={np.median([r['t'] for r in res]):.1f}s")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Gate tag pose from all of a gate's tags: accuracy and missions")
+    ap.add_argument("--views", type=int, default=2000)
+    ap.add_argument("--missions", type=int, default=48)
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--tuning", type=str, default="fira_tuning.json", help="technical_fira settings to fly with")
+    args = ap.parse_args()
+
+    pose_error(args.views)
+    from tuner import read_tuning
+    bench(args.missions, read_tuning(args.tuning, "technical_fira").get("params"), workers=args.workers)
@@ -1,9 +1,10 @@
-from djitellopy import tello
 import cv2
 import numpy as np
 import time
-import logging
 import at
+from telemetry import Telemetry, tello_poller
+from tellovideo import UdpVideoSource
+from tellocmd import TelloLink
 
 #---------------- ID OF TAGS ---------------- 
 
@@ -11,14 +12,19 @@ tag_ID = [0,1,2,3]
 
 #---------------- SETUP ---------------- 
 
-robot = tello.Tello()
-robot.LOGGER.setLevel(logging.ERROR)
+# rc is coalesced and sent at 20 Hz; commands return at once and are answered in the background
+robot = TelloLink(rc_hz=20.0)
 robot.connect()
 
 robot.streamon()
-robot_frame = robot.get_frame_read(with_queue=False)
+# own H.264 receiver: frames stamped with their receive time (fr.ts)
+video = UdpVideoSource(960, 720)
 
-robot.takeoff()
+robot.takeoff().result()
+
+# battery/height are polled in the background; the loop only reads the snapshot
+telem = Telemetry(tello_poller(robot), rate_hz=5.0, stale_after=2.0).start()
+telem.wait_ready()
 
 time.sleep(3)
 
@@ -31,10 +37,13 @@ search_height = 'Down'
 #---------------- MAIN WHILE ---------------- 
 
 while True:
-    frame = cv2.resize(cv2.cvtColor(robot_frame.frame , cv2.COLOR_RGB2BGR), (960,720))
-    tags = at.get_tags()
-    copy_frame = frame.copy()
-    height = robot.get_height()
+    fr = video.read()
+    if fr is None:
+        print("VIDEO LOST")
+        break
+    frame = fr.bgr
+    tags = at.get_tags(frame, gray=fr.gray)
+    height = telem.get("h", 0)
 
     #---------------- ---------------- ---------------- 
 #i am one of the greatest 
@@ -124,19 +133,10 @@ while True:
                 robot.send_rc_control(0,0,0,0)
                 print('GO TO TAG')
 
-                #Move Up
-                while True:
-                    time_to_UP = time.time()
-                    robot.move_up(45)
-                    if time.time() - time_to_UP > 1.0:
-                        break
-
-                #Move Forward
-                while True:
-                    time_Goto = time.time()
-                    robot.move_forward(120)
-                    if time.time() - time_Goto > 1.0:
-                        break
+                #Move Up, Move Forward: queued, the loop keeps reading video (state GO)
+                robot.move_up(45)
+                robot.move_forward(120)
+                state = 'GO'
 
                 
                 
@@ -158,10 +158,15 @@ while True:
                     #robot.move_forward(250)
                     #robot.move_left(110)
 
-                    robot.land()
                     break
             
         
+    #---------------- FLY THROUGH ---------------- 
+
+    elif state == 'GO':
+        if not robot.busy():
+            state = 'TAG'
+
     #---------------- SEARCH MODE ----------------
     
 
@@ -204,24 +209,26 @@ while True:
 
     #---------------- SHOW IMAGE ---------------- 
 
-    battery = robot.get_battery()
+    battery = telem.get("bat", 0)
     
-    if abs(battery) < 40:
-        robot.land()
-        robot.end()
+    if abs(battery) < 40 or telem.stale():
+        break
 
     print("Battery : ", battery)
     print()
     print("Battery : ", battery)
     print()
 
-    cv2.imshow('OUT', copy_frame)
+    cv2.imshow('OUT', frame)
     key = cv2.waitKey(1)
     if key == ord('q'):
         break
     
+telem.stop()
+video.close()
 robot.streamoff()
-robot.land()
+# the one landing, after any queued moves; end() only once it has completed
+robot.land().result()
 robot.end()
 
 
@@ -0,0 +1,72 @@
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from pipeline import LatestQueue
+
+class HudRenderer:
+    """Draws and shows HUD snapshots off the control loop.
+
+    submit(frame, state) hands over a frame and a small tuple of HUD state;
+    it never blocks and a newer snapshot replaces one not yet drawn. The
+    renderer draws at most max_fps times per second with draw(frame, *state)
+    and owns every cv2 window call. headless=True makes submit() a no-op.
+
+    Frames are copied into a buffer the renderer owns before draw() writes on
+    them, so callers can pass ring slots other stages are still reading.
+    run(stop) renders on the calling thread, which must be the main thread:
+    highgui is not thread-safe on all backends (macOS, Qt).
+    """
+
+    def __init__(self, draw, window="RACE", max_fps=30.0, headless=False, stats=None):
+        self.draw = draw
+        self.window = window
+        self.period = 1.0 / max_fps if max_fps > 0 else 0.0
+        self.headless = headless
+        self.stats = stats
+        self.queue = LatestQueue(1, "hud")
+        self.quit = threading.Event()          # set when 'q' is pressed
+        self._stop = threading.Event()
+        self._buf = None
+        self.shown = 0
+
+    def submit(self, frame, state):
+        if not self.headless:
+            self.queue.put((frame, state))
+
+    def stop(self):
+        self._stop.set()
+        self.queue.close()
+
+    def run(self, stop=None):
+        stop = stop or self._stop
+        t_last = 0.0
+        while not (stop.is_set() or self._stop.is_set() or self.quit.is_set()):
+            if self.headless:
+                stop.wait(0.1)
+                continue
+            item = self.queue.get(timeout=0.1)
+            if item is None:
+                continue
+            # cap the display rate; frames arriving faster are simply skipped
+            wait = self.period - (time.perf_counter() - t_last)
+            if wait > 0:
+                time.sleep(wait)
+                item = self.queue.get(timeout=0) or item
+            t0 = time.perf_counter()
+            frame, state = item
+            if self._buf is None or self._buf.shape != frame.shape:
+                self._buf = np.empty_like(frame)
+            np.copyto(self._buf, frame)
+            self.draw(self._buf, *state)
+            cv2.imshow(self.window, self._buf)
+            if (cv2.waitKey(1) & 0xFF) == ord('q'):
+                self.quit.set()
+            t_last = time.perf_counter()
+            self.shown += 1
+            if self.stats:
+                self.stats.add(t_last - t0)
+        if not self.headless:
+            cv2.destroyAllWindows()
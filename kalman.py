@@ -0,0 +1,82 @@
+import numpy as np
+
+from tagstore import TAG36H11_CAPACITY
+
+class CVKalman:
+    """Constant-velocity Kalman filter for many tags at once.
+
+    Each tag id owns a row; each of its 3 axes is an independent [pos, vel]
+    filter, so predict/update are closed-form 2x2 updates over (N, 3) arrays.
+    Positions are in the caller's units (cm in technical_fira), times in s.
+
+    q: white-acceleration spectral density, per axis (scalar or (3,))
+    r: measurement variance, per axis (scalar or (3,))
+    """
+
+    def __init__(self, capacity=TAG36H11_CAPACITY, q=2000.0, r=(4.0, 4.0, 25.0), ttl=1.0, v0=1e4):
+        self.q = np.broadcast_to(np.asarray(q, dtype=float), (3,)).copy()
+        self.r = np.broadcast_to(np.asarray(r, dtype=float), (3,)).copy()
+        self.ttl = ttl
+        self.v0 = v0
+        self.x = np.zeros((capacity, 3, 2))        # [pos, vel] per axis
+        self.P = np.zeros((capacity, 3, 2, 2))
+        self.ts = np.zeros(capacity)               # last update time, 0 = empty
+
+    def clear(self):
+        self.x[:] = 0.0
+        self.P[:] = 0.0
+        self.ts[:] = 0.0
+
+    def _live(self, ids, t):
+        ts = self.ts[ids]
+        return (ts > 0) & (t - ts <= self.ttl)
+
+    def _predict(self, ids, t):
+        # (x, P) of ids propagated to time t, without writing back
+        x, P = self.x[ids].copy(), self.P[ids].copy()
+        dt = np.maximum(t - self.ts[ids], 0.0)[:, None]
+        q = self.q[None, :]
+        p00, p01, p10, p11 = P[..., 0, 0], P[..., 0, 1], P[..., 1, 0], P[..., 1, 1]
+        x[..., 0] += x[..., 1] * dt
+        P[..., 0, 0] = p00 + dt * (p01 + p10) + dt * dt * p11 + q * dt**3 / 3.0
+        P[..., 0, 1] = p01 + dt * p11 + q * dt**2 / 2.0
+        P[..., 1, 0] = p10 + dt * p11 + q * dt**2 / 2.0
+        P[..., 1, 1] = p11 + q * dt
+        return x, P
+
+    def predict(self, ids, t):
+        # Predicted (pos (N,3), vel (N,3), valid (N,)) at time t; state is not modified.
+        ids = np.asarray(ids, dtype=int)
+        x, _ = self._predict(ids, t)
+        return x[..., 0], x[..., 1], self._live(ids, t)
+
+    def update(self, ids, z, t):
+        # Fuse measurements z (N,3) taken at time t; returns filtered (pos, vel).
+        ids = np.asarray(ids, dtype=int)
+        z = np.asarray(z, dtype=float)
+        live = self._live(ids, t)
+        x, P = self._predict(ids, t)
+
+        S = P[..., 0, 0] + self.r[None, :]
+        k0 = P[..., 0, 0] / S
+        k1 = P[..., 1, 0] / S
+        y = z - x[..., 0]
+        x[..., 0] += k0 * y
+        x[..., 1] += k1 * y
+        p00, p01, p10, p11 = P[..., 0, 0].copy(), P[..., 0, 1].copy(), P[..., 1, 0].copy(), P[..., 1, 1].copy()
+        P[..., 0, 0] = (1.0 - k0) * p00
+        P[..., 0, 1] = (1.0 - k0) * p01
+        P[..., 1, 0] = p10 - k1 * p00
+        P[..., 1, 1] = p11 - k1 * p01
+
+        # new or expired tracks restart at the measurement with zero velocity
+        new = ~live
+        if new.any():
+            x[new, :, 0] = z[new]
+            x[new, :, 1] = 0.0
+            P[new] = 0.0
+            P[new, :, 0, 0] = self.r
+            P[new, :, 1, 1] = self.v0
+
+        self.x[ids], self.P[ids], self.ts[ids] = x, P, t
+        return x[..., 0], x[..., 1]
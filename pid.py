@@ -0,0 +1,206 @@
+import json
+import time
+import argparse
+
+import numpy as np
+
+class MultiPID:
+    """N independent PID axes stepped together as NumPy arrays.
+
+    step(err, dt) -> (N,) outputs clipped to +-limit. Per-axis:
+      kp, ki, kd   gains
+      limit        output bound
+      i_limit      bound on the integral term (output units; default = limit)
+      d_tau        derivative low-pass time constant [s] (0 = unfiltered)
+    Anti-windup (anti_windup=True): besides the i_limit clamp, the integral is
+    frozen on axes whose output is saturated in the direction the error
+    would push it further.
+    The derivative acts on the error by default (d_on_meas=False), and the
+    first step after reset() differentiates against a zero previous error,
+    like the scalar pid_step it replaces. With d_on_meas=True, update(meas)
+    differentiates -measurement (no kick on setpoint changes) and the first
+    step has no derivative.
+    """
+
+    def __init__(self, kp, ki=0.0, kd=0.0, limit=np.inf, i_limit=None, d_tau=0.0,
+                 setpoint=0.0, d_on_meas=False, anti_windup=True, dt_min=1e-3, names=None):
+        self.kp = np.array(kp, dtype=float, ndmin=1)
+        n = len(self.kp)
+        as_axes = lambda v: np.broadcast_to(np.asarray(v, dtype=float), (n,)).copy()
+        self.ki, self.kd = as_axes(ki), as_axes(kd)
+        self.limit = as_axes(limit)
+        self.i_limit = as_axes(self.limit if i_limit is None else i_limit)
+        self.d_tau = as_axes(d_tau)
+        self.setpoint = as_axes(setpoint)
+        self.d_on_meas = d_on_meas
+        self.anti_windup = anti_windup
+        self.dt_min = dt_min
+        self.names = list(names) if names else [str(i) for i in range(n)]
+        self.reset()
+
+    def reset(self):
+        n = len(self.kp)
+        self.i_term = np.zeros(n)
+        self.d = np.zeros(n)            # filtered derivative (of error, or of -measurement)
+        self.prev = None                # previous error / measurement
+        self.u = np.zeros(n)
+        self._zero = np.zeros(n)
+
+    def tune(self, axis, kp=None, ki=None, kd=None):
+        i = self.names.index(axis) if isinstance(axis, str) else axis
+        if kp is not None: self.kp[i] = kp
+        if ki is not None: self.ki[i] = ki
+        if kd is not None: self.kd[i] = kd
+
+    def step(self, err, dt, meas=None):
+        # A handful of whole-array ops: for 4 axes the cost is NumPy call
+        # overhead, so temporaries are few and clips are minimum/maximum.
+        err = np.array(err, dtype=float)
+        dt = max(dt, self.dt_min)
+        if self.d_on_meas:
+            meas = np.array(meas, dtype=float)
+            raw = self._zero if self.prev is None else (self.prev - meas) / dt
+            self.prev = meas
+        else:
+            raw = (err - (self._zero if self.prev is None else self.prev)) / dt
+            self.prev = err
+        raw -= self.d
+        raw *= dt / (self.d_tau + dt)           # d_tau = 0 -> factor 1, unfiltered
+        self.d += raw
+
+        u = self.kp * err
+        u += self.kd * self.d
+        if self.ki.any():
+            i_new = self.ki * err
+            i_new *= dt
+            i_new += self.i_term
+            np.minimum(i_new, self.i_limit, out=i_new)
+            np.maximum(i_new, -self.i_limit, out=i_new)
+            if self.anti_windup:
+                # freeze the integral where it would push a saturated output further out
+                full = u + i_new
+                wind = (np.abs(full) > self.limit) & (full * err > 0)
+                np.copyto(i_new, self.i_term, where=wind)
+            self.i_term = i_new
+            u += i_new
+        np.minimum(u, self.limit, out=u)
+        np.maximum(u, -self.limit, out=u)
+        self.u = u
+        return u
+
+    def update(self, meas, dt):
+        # measurement form: err = setpoint - meas
+        meas = np.asarray(meas, dtype=float)
+        return self.step(self.setpoint - meas, dt, meas)
+
+    # ------------------ serialization ------------------
+
+    def config(self):
+        return {"names": self.names, "kp": self.kp.tolist(), "ki": self.ki.tolist(), "kd": self.kd.tolist(),
+                "limit": self.limit.tolist(), "i_limit": self.i_limit.tolist(), "d_tau": self.d_tau.tolist(),
+                "setpoint": self.setpoint.tolist(), "d_on_meas": self.d_on_meas,
+                "anti_windup": self.anti_windup, "dt_min": self.dt_min}
+
+    @classmethod
+    def from_config(cls, cfg):
+        cfg = dict(cfg)
+        return cls(cfg.pop("kp"), **cfg)
+
+    def state(self):
+        return {"i_term": self.i_term.tolist(), "d": self.d.tolist(), "u": self.u.tolist(),
+                "prev": None if self.prev is None else self.prev.tolist()}
+
+    def load_state(self, st):
+        self.i_term = np.array(st["i_term"], dtype=float)
+        self.d = np.array(st["d"], dtype=float)
+        self.u = np.array(st["u"], dtype=float)
+        self.prev = None if st["prev"] is None else np.array(st["prev"], dtype=float)
+
+    def to_json(self):
+        return json.dumps({"config": self.config(), "state": self.state()})
+
+    @classmethod
+    def from_json(cls, s):
+        d = json.loads(s)
+        pid = cls.from_config(d["config"])
+        pid.load_state(d["state"])
+        return pid
+
+# ------------------------ Benchmark -------------------------
+
+def simulate(pid, target=100.0, T=10.0, dt=1.0 / 30.0, gain=1.0, tau=0.25, noise=0.0, bias=0.0, seed=0):
+    # Step response of a rc -> velocity first-order lag (gain cm/s per rc unit,
+    # time constant tau, constant disturbance bias cm/s) integrating to
+    # position, on every axis at once.
+    # -> (t, position (steps, N), u (steps, N))
+    rng = np.random.default_rng(seed)
+    n = len(pid.kp)
+    pid.reset()
+    x, v = np.zeros(n), np.zeros(n)
+    steps = int(T / dt)
+    xs, us = np.empty((steps, n)), np.empty((steps, n))
+    for k in range(steps):
+        meas = x + rng.normal(0.0, noise, n) if noise else x
+        u = np.round(pid.step(target - meas, dt))
+        v += (gain * u - bias - v) * dt / tau
+        x += v * dt
+        xs[k], us[k] = x, u
+    return np.arange(1, steps + 1) * dt, xs, us
+
+def step_metrics(t, x, target=100.0, band=0.05):
+    # per axis: rise time 10-90 %, overshoot %, 5 % settling time, final error
+    out = []
+    for j in range(x.shape[1]):
+        y = x[:, j] / target
+        r10 = t[np.argmax(y >= 0.1)] if (y >= 0.1).any() else np.nan
+        r90 = t[np.argmax(y >= 0.9)] if (y >= 0.9).any() else np.nan
+        outside = np.nonzero(np.abs(y - 1.0) > band)[0]
+        settle = t[outside[-1] + 1] if len(outside) and outside[-1] + 1 < len(t) else (t[0] if not len(outside) else np.nan)
+        out.append({"rise": r90 - r10, "overshoot": max(0.0, 100.0 * (y.max() - 1.0)),
+                    "settle": settle, "ss_err": target * (1.0 - y[-1])})
+    return out
+
+def bench():
+    # Step responses of a few controller variants on the same plant, then the
+    # per-tick cost of one 4-axis step() against four scalar PD updates.
+    lim = 60.0
+    variants = [
+        ("P",               MultiPID([1.5] * 4, limit=lim)),
+        ("PD",              MultiPID([1.5] * 4, kd=0.2, limit=lim)),
+        ("PD noisy",        MultiPID([1.5] * 4, kd=0.2, limit=lim)),
+        ("PD+filter noisy", MultiPID([1.5] * 4, kd=0.2, d_tau=0.1, limit=lim)),
+        ("PID no-aw",       MultiPID([1.5] * 4, ki=0.5, kd=0.2, limit=lim, i_limit=1e9, anti_windup=False)),
+        ("PID aw",          MultiPID([1.5] * 4, ki=0.5, kd=0.2, limit=lim)),
+    ]
+    for name, pid in variants:
+        noise = 2.0 if "noisy" in name else 0.0
+        # plant with a 5 cm/s drift on every axis: P/PD leave an offset, I removes it
+        t, x, u = simulate(pid, noise=noise, gain=0.8, bias=5.0)
+        m = step_metrics(t, x)[0]
+        chatter = np.abs(np.diff(u[:, 0])).mean()
+        print(f"[PID] {name:<16} rise={m['rise']:.2f}s  overshoot={m['overshoot']:5.1f}%  "
+              f"settle={m['settle']:5.2f}s  ss_err={m['ss_err']:6.2f}cm  |du|={chatter:5.2f}")
+
+    pid = MultiPID([0.018, 0.003, 0.003, 0.02], kd=[0.008, 0.0012, 0.0012, 0.006], limit=[70, 60, 60, 80])
+    err = np.array([40.0, 40.0, -12.0, 60.0])
+    n = 20000
+    t0 = time.perf_counter()
+    for _ in range(n):
+        pid.step(err, 0.033)
+    vec = (time.perf_counter() - t0) / n * 1e6
+
+    def scalar(e, pe, dt, kp, kd, limit):
+        de = (e - pe) / max(dt, 1e-3)
+        return max(-limit, min(limit, int(round(kp * e + kd * de)))), de
+    gains = list(zip(err, pid.kp, pid.kd, pid.limit))
+    t0 = time.perf_counter()
+    for _ in range(n):
+        for e, kp, kd, lim in gains:
+            scalar(e, 0.0, 0.033, kp, kd, lim)
+    sc = (time.perf_counter() - t0) / n * 1e6
+    print(f"[PID] 4-axis step(): {vec:.1f}us   4x scalar pid_step: {sc:.1f}us")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Multi-axis PID step-response benchmark")
+    ap.parse_args()
+    bench()
@@ -0,0 +1,243 @@
+import json
+import threading
+import time
+import functools
+from collections import deque
+
+import numpy as np
+
+# ----------------------- Queues -----------------------------
+
+class LatestQueue:
+    """Bounded queue where new items push out the oldest (latest-frame-wins).
+
+    With key(item) (e.g. a frame id), put() drops an item that does not come
+    after the newest one queued or the last one get() returned, for producers
+    that can finish out of order. Every dropped item is counted in `drops`,
+    under the queue's lock.
+    """
+
+    def __init__(self, maxsize=1, name="", key=None):
+        self.name = name
+        self._items = deque(maxlen=maxsize)
+        self._key = key
+        self._last = None
+        self._cv = threading.Condition()
+        self._closed = False
+        self.puts = 0
+        self.drops = 0
+
+    def put(self, item):
+        with self._cv:
+            self.puts += 1
+            if self._key is not None:
+                # keyed: queued items stay in key order, so the deque evicts the oldest
+                k = self._key(item)
+                newest = self._key(self._items[-1]) if self._items else self._last
+                if newest is not None and k <= newest:
+                    self.drops += 1
+                    return
+            if len(self._items) == self._items.maxlen:
+                self.drops += 1
+            self._items.append(item)
+            self._cv.notify()
+
+    def get(self, timeout=None):
+        # Returns the newest item and discards anything older; None on timeout/close.
+        with self._cv:
+            if not self._items and not self._closed:
+                self._cv.wait(timeout)
+            if not self._items:
+                return None
+            item = self._items[-1]
+            self.drops += len(self._items) - 1
+            self._items.clear()
+            if self._key is not None:
+                self._last = self._key(item)
+            return item
+
+    def close(self):
+        with self._cv:
+            self._closed = True
+            self._cv.notify_all()
+
+    @property
+    def closed(self):
+        return self._closed
+
+# --------------------- Scheduling ---------------------------
+
+class RateScheduler:
+    """Fixed-rate deadlines on an absolute time grid, so periods never drift.
+
+    wait(stop) sleeps until the next deadline and returns (deadline, late_s,
+    skipped); a tick that overruns whole periods skips those deadlines
+    instead of bursting to catch up, and counts them in `missed`.
+    due(until) is the simulated-time variant: it yields every deadline
+    before `until` without sleeping (deterministic replay).
+    """
+
+    def __init__(self, rate_hz, clock=time.perf_counter, stats=None):
+        self.period = 1.0 / rate_hz
+        self.clock = clock
+        self.stats = stats          # StageStats of lateness
+        self.next = None
+        self.ticks = 0
+        self.missed = 0
+
+    def start(self, t0=None):
+        self.next = self.clock() if t0 is None else t0
+        return self
+
+    def wait(self, stop=None):
+        if self.next is None:
+            self.start()
+        delay = self.next - self.clock()
+        if delay > 0:
+            if stop is not None:
+                stop.wait(delay)
+            else:
+                time.sleep(delay)
+        deadline = self.next
+        late = max(0.0, self.clock() - deadline)
+        skipped = int(late // self.period)
+        self.missed += skipped
+        self.next = deadline + (skipped + 1) * self.period
+        self.ticks += 1
+        if self.stats:
+            self.stats.add(late)
+        return deadline, late, skipped
+
+    def due(self, until):
+        if self.next is None:
+            self.start()
+        while self.next < until:
+            deadline = self.next
+            self.next += self.period
+            self.ticks += 1
+            yield deadline
+
+# ----------------------- Stats ------------------------------
+
+class StageStats:
+    """Rolling latency window for one pipeline stage (seconds in, ms out)."""
+
+    def __init__(self, name, window=300):
+        self.name = name
+        self._lat = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def add(self, dt):
+        with self._lock:
+            self._lat.append(dt)
+            self.count += 1
+
+    def summary(self):
+        with self._lock:
+            if not self._lat:
+                return {"n": self.count, "mean_ms": 0.0, "p50_ms": 0.0, "p95_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+            a = np.fromiter(self._lat, dtype=float) * 1000.0
+        return {
+            "n": self.count,
+            "mean_ms": float(a.mean()),
+            "p50_ms": float(np.percentile(a, 50)),
+            "p95_ms": float(np.percentile(a, 95)),
+            "p99_ms": float(np.percentile(a, 99)),
+            "max_ms": float(a.max()),
+        }
+
+class Timer:
+    """with Timer(stats): ... records the block's wall time into stats."""
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.stats.add(time.perf_counter() - self.t0)
+        return False
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+class Profiler:
+    """Named timing spans, each a rolling StageStats window created on first use.
+
+    Disabled (the default), span() hands back one shared no-op context and
+    timed() functions call straight through, so instrumentation can stay in
+    the hot path. Thread-safe: spans may be recorded from any thread.
+    """
+
+    def __init__(self, enabled=False, window=1000):
+        self.enabled = enabled
+        self.window = window
+        self.stats = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        s = self.stats.get(name)
+        if s is None:
+            with self._lock:
+                s = self.stats.setdefault(name, StageStats(name, self.window))
+        return s
+
+    def span(self, name):
+        # with prof.span("stage"): ...
+        if not self.enabled:
+            return _NULL_SPAN
+        return Timer(self.get(name))
+
+    def timed(self, name=None):
+        # decorator: every call of the function is a span (default: its name)
+        def wrap(fn):
+            label = name or fn.__name__
+            @functools.wraps(fn)
+            def inner(*a, **kw):
+                if not self.enabled:
+                    return fn(*a, **kw)
+                t0 = time.perf_counter()
+                try:
+                    return fn(*a, **kw)
+                finally:
+                    self.get(label).add(time.perf_counter() - t0)
+            return inner
+        return wrap
+
+    def summary(self):
+        return {name: s.summary() for name, s in list(self.stats.items())}
+
+    def format(self):
+        return format_stats(dict(self.stats))
+
+    def dump(self, path):
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=1)
+
+    def reset(self):
+        with self._lock:
+            self.stats = {}
+
+# Process-wide profiler; enable with PROFILER.enabled = True
+PROFILER = Profiler()
+
+def format_stats(stats, queues=()):
+    lines = []
+    for s in stats.values():
+        m = s.summary()
+        lines.append(f"  {s.name:<12} n={m['n']:<6} mean={m['mean_ms']:6.1f}ms  p50={m['p50_ms']:6.1f}ms  "
+                     f"p95={m['p95_ms']:6.1f}ms  p99={m['p99_ms']:6.1f}ms  max={m['max_ms']:6.1f}ms")
+    for q in queues:
+        lines.append(f"  queue {q.name:<8} puts={q.puts:<6} drops={q.drops}")
+    return "\n".join(lines)
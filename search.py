@@ -0,0 +1,177 @@
+import math
+import argparse
+
+import numpy as np
+
+HOVER = (0, 0, 0, 0)
+
+# ----------------------- Patterns ---------------------------
+
+class Pattern:
+    """A search maneuver as timed rc legs [(seconds, (lr, fb, ud, yaw))].
+
+    Patterns compose with + (one after the other) and repeat(n); compile()
+    turns one into a Plan, a lookup table indexed by elapsed time.
+    """
+
+    def __init__(self, legs, name=""):
+        self.legs = [(float(d), tuple(int(v) for v in rc)) for d, rc in legs]
+        self.name = name
+
+    @property
+    def duration(self):
+        return sum(d for d, _ in self.legs)
+
+    def __add__(self, other):
+        return Pattern(self.legs + other.legs, f"{self.name}+{other.name}")
+
+    def repeat(self, n):
+        return Pattern(self.legs * n, f"{self.name}x{n}")
+
+    def compile(self, rate=100.0, loop=None, budget=None):
+        # loop: a Pattern flown over and over once this one ends (default: hover)
+        legs = self.legs + (loop.legs if loop is not None else [])
+        edges = np.cumsum([0.0] + [d for d, _ in legs])
+        n = max(1, int(math.ceil(edges[-1] * rate - 1e-9)))
+        # leg of each row start; the small epsilon keeps rows on leg boundaries in the later leg
+        k = np.searchsorted(edges, np.arange(n) / rate + 1e-9, side="right") - 1
+        table = np.array([rc for _, rc in legs], dtype=np.int16).reshape(-1, 4)[np.minimum(k, len(legs) - 1)]
+        loop_from = int(round(self.duration * rate)) if loop is not None else None
+        return Plan(table, rate, loop_from, budget)
+
+class Plan:
+    """Time-indexed rc table: rc(t) for t seconds into the search is one index.
+
+    Rows are `rate` per second. Past the end the table either wraps back to
+    row loop_from or hovers; from `budget` seconds on it always hovers.
+    """
+
+    def __init__(self, table, rate, loop_from=None, budget=None):
+        self.table = table
+        self.rate = rate
+        self.loop_from = loop_from
+        self.budget = math.inf if budget is None else budget
+        self._rows = [tuple(r) for r in table.tolist()]
+        self._n = len(self._rows)
+
+    @property
+    def duration(self):
+        return self._n / self.rate
+
+    def bounded(self, seconds):
+        # same table, ending after `seconds` (e.g. what the battery allows)
+        return Plan(self.table, self.rate, self.loop_from, min(self.budget, seconds))
+
+    def rc(self, t):
+        if t >= self.budget or t < 0.0:
+            return HOVER
+        i = int(t * self.rate)
+        if i >= self._n:
+            if self.loop_from is None:
+                return HOVER
+            i = self.loop_from + (i - self.loop_from) % (self._n - self.loop_from)
+        return self._rows[i]
+
+def battery_budget(seconds, battery=None, reserve=15, drain=0.1):
+    # search time the battery allows above `reserve` % at `drain` %/s, capped at seconds
+    if battery is None:
+        return seconds
+    return max(0.0, min(seconds, (battery - reserve) / drain))
+
+# --------------------- Pattern library ----------------------
+
+def yaw_sweep(rate=35, segment=2.0, segments=4):
+    # turn in place, alternating direction (left first) every segment
+    return Pattern([(segment, (0, 0, 0, rate if k % 2 else -rate)) for k in range(segments)], "sweep")
+
+def turn(rate=35, degrees=360.0, deg_per_rc=1.0):
+    # one turn in place; deg_per_rc: yaw rate (deg/s) per rc unit
+    return Pattern([(degrees / (rate * deg_per_rc), (0, 0, 0, rate))], "turn")
+
+def spiral(fwd=30, yaw=25, segment=1.2, segments=5):
+    # creep forward while weaving the heading right / left
+    return Pattern([(segment, (0, fwd, 0, yaw if k % 2 == 0 else -yaw)) for k in range(segments)], "spiral")
+
+def box(fwd=35, lat=35, segment=0.9):
+    # forward, right, back, left
+    return Pattern([(segment, (0, fwd, 0, 0)), (segment, (lat, 0, 0, 0)),
+                    (segment, (0, -fwd, 0, 0)), (segment, (-lat, 0, 0, 0))], "box")
+
+def circle(speed=50, yaw=20, steps=24, leg=0.25):
+    # velocity direction stepped around a circle while turning
+    return Pattern([(leg, (speed * math.cos(a), speed * math.sin(a), 0, yaw))
+                    for a in np.radians(np.arange(steps) * 360.0 / steps)], "circle")
+
+def lawnmower(fwd=35, lat=35, leg=2.0, shift=0.8, lanes=4):
+    # forward / back lanes, shifting right between them
+    legs = []
+    for k in range(lanes):
+        legs.append((leg, (0, fwd if k % 2 == 0 else -fwd, 0, 0)))
+        legs.append((shift, (lat, 0, 0, 0)))
+    return Pattern(legs, "lawnmower")
+
+def expanding_square(speed=35, leg=0.6, rings=3):
+    # forward, right, back, left with legs growing 1, 1, 2, 2, 3, 3, ... x leg
+    dirs = [(0, speed), (speed, 0), (0, -speed), (-speed, 0)]
+    legs = []
+    for k in range(4 * rings):
+        lr, fb = dirs[k % 4]
+        legs.append(((k // 2 + 1) * leg, (lr, fb, 0, 0)))
+    return Pattern(legs, "square")
+
+PATTERNS = {
+    "sweep": lambda: yaw_sweep().compile(loop=yaw_sweep()),
+    "turn": lambda: turn().compile(loop=turn()),
+    "spiral": lambda: spiral().compile(loop=spiral(segments=2)),
+    "box": lambda: box().compile(loop=box()),
+    "circle": lambda: circle().compile(loop=circle()),
+    "lawnmower": lambda: lawnmower().compile(loop=lawnmower()),
+    "square": lambda: expanding_square().compile(),
+    "sweep+spiral+box": lambda: (yaw_sweep() + spiral()).compile(loop=box()),
+    "sweep+square": lambda: (yaw_sweep() + expanding_square()).compile(loop=box()),
+    "turn+square": lambda: (turn() + expanding_square()).compile(loop=turn()),
+}
+
+# ------------------------ Benchmark -------------------------
+
+def time_to_reacquire(plan, seed, budget=30.0, fps=30.0, world=None):
+    # Seconds until the first gate of a random course is seen again from a
+    # pose facing away from it (None if not within budget), flying plan open loop.
+    import dronesim
+    tf = dronesim.load_fira()
+    world = world or {}
+    rng = np.random.default_rng(seed)
+    tags, gates = dronesim.random_course(tf.GATE_SEQUENCE, tf.SUPPORT_TAGS, rng)
+    gid = tf.GATE_SEQUENCE[0]
+    want = np.array([gid] + list(tf.SUPPORT_TAGS.get(gid, [])))
+    sensor = dronesim.TagSensor(tags, tf.CAMERA, (tf.FRAME_W, tf.FRAME_H), declared=tf.TAG_SIZE_M,
+                                delay=int(round(world.get("latency", 0.1) * fps)), seed=seed)
+    # lost: off to the side and turned 60-180 deg away from the gate
+    c = gates[0][0]
+    yaw0 = math.atan2(c[0], c[2]) + math.radians(rng.choice([-1, 1]) * rng.uniform(60, 180))
+    sim = dronesim.TelloSim(pos=(rng.uniform(-1, 1), 0.0, rng.uniform(0, 1)), yaw=yaw0)
+    dt = 1.0 / fps
+    for k in range(int(budget * fps)):
+        t = k * dt
+        sim.send_rc_control(*plan.rc(t))
+        sim.step(dt)
+        if np.isin(sensor.observe(sim.pos, sim.yaw)["id"], want).any():
+            return t + dt
+    return None
+
+def bench(n=100, budget=30.0, names=None):
+    print(f"[Search] {n} lost-gate starts per pattern, {budget:.0f}s budget")
+    for name in names or PATTERNS:
+        plan = PATTERNS[name]().bounded(budget)
+        ts = [time_to_reacquire(plan, s, budget) for s in range(n)]
+        ok = np.array([t for t in ts if t is not None])
+        p = np.percentile(ok, [50, 90]) if len(ok) else (np.nan, np.nan)
+        print(f"[Search] {name:<17} found {len(ok) / n:4.0%}  t p50={p[0]:5.1f}s p90={p[1]:5.1f}s")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Time-to-reacquire of the search patterns in the simulator")
+    ap.add_argument("--n", type=int, default=100, help="starts per pattern")
+    ap.add_argument("--budget", type=float, default=30.0, help="search time budget (s)")
+    ap.add_argument("--patterns", type=str, default=None, help="comma-separated subset of " + ",".join(PATTERNS))
+    args = ap.parse_args()
+    bench(args.n, args.budget, args.patterns.split(",") if args.patterns else None)
@@ -0,0 +1,221 @@
+import os
+import json
+import math
+import argparse
+
+import cv2
+import numpy as np
+
+from frames import FrameSource
+
+# OpenCV's aruco module ships the tag36h11 codebook (its bitmaps are the
+# AprilTag ones turned 180 degrees, undone in tag_image()).
+try:
+    _DICT = cv2.aruco.getPredefinedDictionary(cv2.aruco.DICT_APRILTAG_36h11)
+    _HAS_ARUCO = True
+except AttributeError:
+    _HAS_ARUCO = False
+
+# Scene frame: x right, y down, z forward -- a camera at yaw 0 looks along +z
+# and sees tags at yaw 0 face on. Yaw is about +y (positive = turn right).
+
+def yaw_matrix(yaw):
+    c, s = math.cos(yaw), math.sin(yaw)
+    return np.array([[c, 0.0, s], [0.0, 1.0, 0.0], [-s, 0.0, c]])
+
+def tag_image(tag_id, px=160):
+    # tag36h11 bitmap (black square side = px) with a one-cell white quiet zone, as BGR
+    cell = max(px // 8, 1)
+    m = cv2.aruco.generateImageMarker(_DICT, tag_id, cell * 8, borderBits=1)
+    m = np.ascontiguousarray(m[::-1, ::-1])
+    m = cv2.copyMakeBorder(m, cell, cell, cell, cell, cv2.BORDER_CONSTANT, value=255)
+    return cv2.cvtColor(m, cv2.COLOR_GRAY2BGR)
+
+def square(half):
+    # tag-frame corners (x right, y down) of a square of side 2*half
+    return np.array([[-half, -half, 0.0], [half, -half, 0.0], [half, half, 0.0], [-half, half, 0.0]])
+
+def visible_tags(tags, pos, yaw, K, size, corners):
+    # Tags in front of a camera at (pos, yaw) whose corners (tag-frame (4,3))
+    # all lie in front of it and whose projection overlaps the image.
+    # tags: [(id, pos (3,), R_scene_tag)]; K = (fx, fy, cx, cy); size = (w, h)
+    # -> [(id, R, t, uv (4,2))] with R, t the tag pose in the camera frame
+    fx, fy, cx, cy = K
+    w, h = size
+    Rwc = yaw_matrix(yaw)
+    near = 0.05 * np.abs(corners).max()
+    out = []
+    for tid, p, Rwt in tags:
+        R = Rwc.T @ Rwt
+        t = Rwc.T @ (p - pos)
+        if t[2] <= 0 or R[:, 2] @ t <= 0:          # behind the camera or seen from the back
+            continue
+        pc = corners @ R.T + t
+        if (pc[:, 2] < near).any():
+            continue
+        uv = np.stack([fx * pc[:, 0] / pc[:, 2] + cx, fy * pc[:, 1] / pc[:, 2] + cy], axis=1)
+        if uv[:, 0].max() < 0 or uv[:, 1].max() < 0 or uv[:, 0].min() >= w or uv[:, 1].min() >= h:
+            continue
+        out.append((tid, R, t, uv))
+    return out
+
+class Trajectory:
+    """Piecewise-linear camera path through keys (t, x, y, z, yaw_rad)."""
+
+    def __init__(self, keys):
+        k = np.asarray(keys, dtype=float)
+        self.t, self.xyz, self.yaw = k[:, 0], k[:, 1:4], np.unwrap(k[:, 4])
+
+    @property
+    def duration(self):
+        return float(self.t[-1])
+
+    def at(self, t):
+        pos = np.array([np.interp(t, self.t, self.xyz[:, i]) for i in range(3)])
+        return pos, float(np.interp(t, self.t, self.yaw))
+
+def gate_course(gates, supports=None, tag_size=0.2, gap=15.0, offset=3.0, speed=5.0, dwell=0.6):
+    # A course of gates in flight order plus a path flying through them.
+    # Distances are in tag sizes (gap between gates, alternating lateral offset),
+    # speed in tag sizes per second. Gate tags hang 1.5 tag sizes above the flight
+    # line; support tags sit beside / above / below their gate tag.
+    # -> (tags [(id, pos (3,), yaw)], Trajectory)
+    u = tag_size
+    supports = supports or {}
+    tags, pts = [], [np.zeros(3)]
+    around = [(-2.0, 0.0), (2.0, 0.0), (-2.0, -2.0), (2.0, -2.0)]
+    for k, gid in enumerate(gates):
+        x = (offset if k % 2 else -offset) * u if k else 0.0
+        z = (k + 1) * gap * u
+        tags.append((gid, np.array([x, -1.5 * u, z]), 0.0))
+        for (dx, dy), sid in zip(around, supports.get(gid, [])):
+            tags.append((sid, np.array([x + dx * u, (dy - 1.5) * u, z]), 0.0))
+        pts.append(np.array([x, 0.0, z]))
+
+    keys, t = [], 1.0
+    head = math.atan2(pts[1][0] - pts[0][0], pts[1][2] - pts[0][2])
+    keys.append((0.0, *pts[0], head))
+    keys.append((t, *pts[0], head))                     # hover, then fly
+    for a, b, c in zip(pts, pts[1:], pts[2:] + [None]):
+        t += np.linalg.norm(b - a) / (speed * u)
+        keys.append((t, *b, head))
+        if c is not None:
+            head = math.atan2(c[0] - b[0], c[2] - b[2])
+            t += dwell
+            keys.append((t, *b, head))
+    p = pts[-1] + [0.0, 0.0, 3.0 * u]
+    keys.append((t + 3.0 / speed, *p, head))
+    return tags, Trajectory(keys)
+
+class SceneRenderer:
+    """Renders tags at known scene poses through a pinhole camera.
+
+    render(pos, yaw) -> (bgr, {tag_id: (R (3,3), t (3,))}) with R, t the tag
+    pose in the camera frame in pupil_apriltags' convention (pose_R, pose_t).
+    Each tag is warped into its own bounding box only, so cost scales with the
+    tags' image area, not with the number of tags times the frame size.
+    """
+
+    def __init__(self, tags, width, height, fx, fy, cx, cy, tag_size, px=160, noise=0.0, seed=0):
+        if not _HAS_ARUCO:
+            raise RuntimeError("cv2.aruco with DICT_APRILTAG_36h11 is required for synthetic frames")
+        self.size = (width, height)
+        self.K = (fx, fy, cx, cy)
+        self.half = tag_size / 2.0 * 10.0 / 8.0          # quiet zone included
+        self.tags = [(tid, np.asarray(p, dtype=float), yaw_matrix(yaw)) for tid, p, yaw in tags]
+        self.images = {tid: tag_image(tid, px) for tid, _, _ in tags}
+        s = self.images[tags[0][0]].shape[0] if tags else 1
+        self.src = np.float32([[0, 0], [s, 0], [s, s], [0, s]])
+        self.corners = square(self.half)
+        # background: soft vertical gradient, drawn once
+        ramp = np.linspace(150, 90, height, dtype=np.float32)[:, None, None]
+        self.background = np.broadcast_to(ramp, (height, width, 3)).astype(np.uint8)
+        self.buf = np.empty_like(self.background)
+        self.noise = noise
+        self._noise = np.empty((height, width, 3), np.int16) if noise > 0 else None
+        cv2.setRNGSeed(seed)
+
+    def render(self, pos, yaw):
+        w, h = self.size
+        np.copyto(self.buf, self.background)
+        truth, order = {}, []
+        for tid, R, t, uv in visible_tags(self.tags, pos, yaw, self.K, self.size, self.corners):
+            x0, y0 = np.floor(uv.min(axis=0)).astype(int)
+            x1, y1 = np.ceil(uv.max(axis=0)).astype(int) + 1
+            x0, y0, x1, y1 = max(x0, 0), max(y0, 0), min(x1, w), min(y1, h)
+            if x1 - x0 < 2 or y1 - y0 < 2:
+                continue
+            order.append((t[2], tid, uv - (x0, y0), (x0, y0, x1, y1)))
+            truth[tid] = (R, t)
+        for _, tid, uv, (x0, y0, x1, y1) in sorted(order, key=lambda o: -o[0]):   # far to near
+            H = cv2.getPerspectiveTransform(self.src, uv.astype(np.float32))
+            cv2.warpPerspective(self.images[tid], H, (x1 - x0, y1 - y0), dst=self.buf[y0:y1, x0:x1],
+                                flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_TRANSPARENT)
+        if self._noise is not None:
+            cv2.randn(self._noise, 0, self.noise)
+            cv2.add(self.buf, self._noise, dst=self.buf, dtype=cv2.CV_8U)
+        return self.buf, truth
+
+class SyntheticSource(FrameSource):
+    """Frames of a SceneRenderer flown along a Trajectory at a fixed frame rate.
+
+    Frame i shows the scene at t = i / fps; the source ends with the trajectory.
+    truth: {"t", "pos", "yaw", "tags": {id: (R, t)}} for the last frame read.
+    """
+
+    def __init__(self, renderer, trajectory, fps=30.0, slots=8):
+        super().__init__(*renderer.size, slots)
+        self.renderer = renderer
+        self.trajectory = trajectory
+        self.dt = 1.0 / fps
+        self.i = 0
+
+    def read(self):
+        t = self.i * self.dt
+        if t > self.trajectory.duration:
+            return None
+        self.i += 1
+        pos, yaw = self.trajectory.at(t)
+        img, tags = self.renderer.render(pos, yaw)
+        self.truth = {"t": t, "pos": pos, "yaw": yaw, "tags": tags}
+        return self.ring.fill(img)
+
+def course_source(gates, supports, width, height, fx, fy, cx, cy, tag_size,
+                  fps=30.0, speed=5.0, noise=0.0, slots=8):
+    tags, traj = gate_course(gates, supports, tag_size, speed=speed)
+    ren = SceneRenderer(tags, width, height, fx, fy, cx, cy, tag_size, noise=noise)
+    return SyntheticSource(ren, traj, fps, slots)
+
+# --------------------------- CLI ----------------------------
+
+if __name__ == "__main__":
+    # Writes a synthetic course as a frame directory (replayable with
+    # technical_fira.py --replay DIR) plus truth.json with per-frame poses.
+    ap = argparse.ArgumentParser(description="Render a synthetic AprilTag gate course")
+    ap.add_argument("out")
+    ap.add_argument("--gates", type=str, default="1,5,12,19,23")
+    ap.add_argument("--width", type=int, default=960)
+    ap.add_argument("--height", type=int, default=720)
+    ap.add_argument("--f", type=float, default=550.0, help="focal length (px)")
+    ap.add_argument("--tag-size", type=float, default=0.2)
+    ap.add_argument("--fps", type=float, default=30.0)
+    ap.add_argument("--speed", type=float, default=5.0, help="tag sizes per second")
+    ap.add_argument("--noise", type=float, default=0.0)
+    args = ap.parse_args()
+
+    gates = [int(g) for g in args.gates.split(",")]
+    src = course_source(gates, {}, args.width, args.height, args.f, args.f,
+                        args.width / 2.0, args.height / 2.0, args.tag_size,
+                        args.fps, args.speed, args.noise)
+    os.makedirs(args.out, exist_ok=True)
+    truth = []
+    while True:
+        fr = src.read()
+        if fr is None: break
+        cv2.imwrite(os.path.join(args.out, f"{fr.fid:06d}.png"), fr.bgr)
+        tr = src.truth
+        truth.append({"t": tr["t"], "pos": tr["pos"].tolist(), "yaw": tr["yaw"],
+                      "tags": {str(k): {"R": R.tolist(), "t": t.tolist()} for k, (R, t) in tr["tags"].items()}})
+    with open(os.path.join(args.out, "truth.json"), "w") as f:
+        json.dump(truth, f)
+    print(f"[Synth] {len(truth)} frames -> {args.out}")
@@ -0,0 +1,138 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from pupil_apriltags import Detector
+
+# One detection per row. Pose is in the camera frame (pupil_apriltags
+# pose_R / pose_t, metres); pixel coordinates are full-frame even when
+# detecting in a crop.
+DET_DTYPE = np.dtype([
+    ("id",      np.int16),
+    ("ham",     np.int8),
+    ("dm",      np.float32),          # decision margin
+    ("center",  np.float32, 2),
+    ("corners", np.float32, (4, 2)),
+    ("R",       np.float64, (3, 3)),
+    ("t",       np.float64, 3),
+])
+
+def empty():
+    return np.zeros(0, dtype=DET_DTYPE)
+
+def stack(tags, ox=0, oy=0):
+    # pupil_apriltags results (detected at offset ox, oy) -> DET_DTYPE array
+    out = np.zeros(len(tags), dtype=DET_DTYPE)
+    for k, tg in enumerate(tags):
+        out[k] = (tg.tag_id, tg.hamming, tg.decision_margin, tg.center, tg.corners,
+                  tg.pose_R if tg.pose_R is not None else np.eye(3),
+                  tg.pose_t.reshape(3) if tg.pose_t is not None else 0.0)
+    if len(tags) and (ox or oy):
+        out["center"] += (ox, oy)
+        out["corners"] += (ox, oy)
+    return out
+
+def poses_to_rpy(Rs):
+    # (N,3,3) -> (N,3) roll, pitch, yaw in degrees; same angles as
+    # scipy Rotation.from_matrix(R).as_euler("zyx") for rotation matrices
+    yaw   = np.arctan2(-Rs[:, 0, 1], Rs[:, 0, 0])
+    pitch = np.arcsin(np.clip(Rs[:, 0, 2], -1.0, 1.0))
+    roll  = np.arctan2(-Rs[:, 1, 2], Rs[:, 2, 2])
+    return np.degrees(np.stack([roll, pitch, yaw], axis=1))
+
+def default_threads(workers=1):
+    # detector threads per engine when `workers` engines run side by side
+    try:
+        cores = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cores = os.cpu_count() or 1
+    return max(1, cores // max(1, workers))
+
+class Camera:
+    """Pinhole intrinsics (px)."""
+
+    def __init__(self, fx, fy, cx, cy):
+        self.fx, self.fy, self.cx, self.cy = float(fx), float(fy), float(cx), float(cy)
+
+    @classmethod
+    def centered(cls, width, height, f):
+        return cls(f, f, width / 2.0, height / 2.0)
+
+    def params(self, x0=0, y0=0):
+        # camera_params for an image whose top-left sits at (x0, y0) in the full frame
+        return (self.fx, self.fy, self.cx - x0, self.cy - y0)
+
+    def project(self, t):
+        # (N,3) camera-frame points -> (N,2) px; points behind the camera give nan
+        t = np.atleast_2d(np.asarray(t, dtype=float))
+        z = np.where(t[:, 2] > 1e-6, t[:, 2], np.nan)
+        return np.stack([self.fx * t[:, 0] / z + self.cx, self.fy * t[:, 1] / z + self.cy], axis=1)
+
+class TagEngine:
+    """A configured AprilTag detector with its camera model.
+
+    detect() is serialized by a lock (the underlying Detector is not
+    thread-safe); threads that need parallel detection use one engine each,
+    with nthreads=default_threads(n_engines). Results are DET_DTYPE arrays.
+    """
+
+    def __init__(self, camera, tag_size, families="tag36h11", decimate=1.0, sigma=0.0,
+                 refine_edges=1, sharpening=0.25, nthreads=None, pose=True):
+        self.camera = camera
+        self.tag_size = tag_size
+        self.decimate = decimate
+        self.pose = pose
+        self.nthreads = nthreads or default_threads()
+        self.detector = Detector(families=families, nthreads=self.nthreads, quad_decimate=decimate,
+                                 quad_sigma=sigma, refine_edges=refine_edges,
+                                 decode_sharpening=sharpening, debug=0)
+        self._lock = threading.Lock()
+        self._exec = None
+
+    def detect(self, gray, roi=None, origin=(0, 0)):
+        # gray: uint8 image; roi = (x0, y0, x1, y1) detects only inside that box.
+        # origin: where gray itself sits in the full frame (for pre-cropped images).
+        x0, y0 = origin
+        if roi is not None:
+            gray = gray[roi[1]:roi[3], roi[0]:roi[2]]
+            x0, y0 = x0 + roi[0], y0 + roi[1]
+        with self._lock:
+            tags = self.detector.detect(gray, estimate_tag_pose=self.pose,
+                                        camera_params=self.camera.params(x0, y0), tag_size=self.tag_size)
+        return stack(tags, x0, y0)
+
+    def detect_rois(self, gray, rois):
+        # all tags found in the boxes of one frame
+        if not rois:
+            return empty()
+        return np.concatenate([self.detect(gray, roi) for roi in rois])
+
+    def detect_batch(self, frames, rois=None):
+        # list of frames (optionally one roi each) -> list of results
+        rois = rois if rois is not None else [None] * len(frames)
+        return [self.detect(g, r) for g, r in zip(frames, rois)]
+
+    def submit(self, gray, roi=None):
+        # async detect on the engine's own worker thread -> concurrent.futures.Future;
+        # gray must not be overwritten until the future is done
+        if self._exec is None:
+            self._exec = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tagdet")
+        return self._exec.submit(self.detect, gray, roi)
+
+    def close(self):
+        if self._exec is not None:
+            self._exec.shutdown(wait=True)
+            self._exec = None
+
+_SHARED = {}
+_SHARED_LOCK = threading.Lock()
+
+def shared_engine(camera, tag_size, **opts):
+    # Process-wide engine per configuration, built on first use rather than at import.
+    key = (camera.params(), tag_size, tuple(sorted(opts.items())))
+    with _SHARED_LOCK:
+        eng = _SHARED.get(key)
+        if eng is None:
+            eng = _SHARED[key] = TagEngine(camera, tag_size, **opts)
+    return eng
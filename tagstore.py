@@ -0,0 +1,78 @@
+import threading
+
+import numpy as np
+
+# tag36h11 has 587 codes, so a tag id is directly its slot index.
+TAG36H11_CAPACITY = 587
+
+TAG_DTYPE = np.dtype([
+    ("t",    np.float64, 3),   # smoothed translation [cm]
+    ("rpy",  np.float64, 3),   # smoothed roll, pitch, yaw [deg]
+    ("ts",   np.float64),      # last update time, 0 = empty slot
+    ("hits", np.int32),        # updates since the tag was (re)acquired
+    ("seq",  np.int64),        # newest frame sequence the tag was seen in
+    ("det",  np.int32),        # index of the tag in that frame's detection list
+])
+
+class TagStore:
+    """Fixed-capacity per-tag state table, one structured-array row per tag id.
+
+    All updates are in place. Rows not updated for `ttl` seconds are cleared
+    by expire(). Callers that touch the same store from several threads hold
+    `lock` around gather/put.
+    """
+
+    def __init__(self, capacity=TAG36H11_CAPACITY, ttl=1.0):
+        self.rows = np.zeros(capacity, dtype=TAG_DTYPE)
+        self.ttl = ttl
+        self.lock = threading.Lock()
+
+    def clear(self):
+        self.rows[:] = np.zeros(1, dtype=TAG_DTYPE)
+
+    def expire(self, now):
+        ts = self.rows["ts"]
+        old = (ts > 0) & (now - ts > self.ttl)
+        if old.any():
+            self.rows[old] = np.zeros(1, dtype=TAG_DTYPE)
+        return int(old.sum())
+
+    def live(self, ids):
+        return self.rows["ts"][ids] > 0
+
+    def gather(self, ids):
+        # (t, rpy, live) for ids; t/rpy rows of dead slots are zeros
+        r = self.rows[ids]
+        return r["t"], r["rpy"], r["ts"] > 0
+
+    def put(self, ids, t, rpy, now):
+        ids = np.asarray(ids, dtype=int)
+        live = self.rows["ts"][ids] > 0
+        self.rows["t"][ids] = t
+        self.rows["rpy"][ids] = rpy
+        self.rows["hits"][ids] = np.where(live, self.rows["hits"][ids] + 1, 1)
+        self.rows["ts"][ids] = now
+
+    def mark(self, ids, seq):
+        # Record where each id sits in frame `seq`'s detection list. An older
+        # frame finishing late (parallel detectors) never overwrites a newer one.
+        # Written back to front so a duplicated id keeps its first position.
+        ids = np.asarray(ids, dtype=int)[::-1]
+        idx = np.arange(len(ids))[::-1]
+        newer = self.rows["seq"][ids] <= seq
+        self.rows["seq"][ids[newer]] = seq
+        self.rows["det"][ids[newer]] = idx[newer]
+
+    def lookup(self, tag_id, seq):
+        # Index of tag_id in frame seq's detection list: -1 if it was not
+        # detected there, None if a newer frame has overwritten the slot.
+        if tag_id < 0 or tag_id >= len(self.rows):
+            return -1
+        s = self.rows["seq"][tag_id]
+        if s == seq:
+            return int(self.rows["det"][tag_id])
+        return -1 if s < seq else None
+
+    def get(self, tag_id):
+        r = self.rows[tag_id]
+        return r if r["ts"] > 0 else None
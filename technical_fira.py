@@ -1,11 +1,30 @@
 
 import cv2
 import numpy as np
+import os
 import time
 import math
 import argparse
-from scipy.spatial.transform import Rotation
-from pupil_apriltags import Detector
+import threading
+import itertools
+import json
+import signal
+from pipeline import LatestQueue, StageStats, Timer, RateScheduler, format_stats, PROFILER
+from tagstore import TagStore
+from kalman import CVKalman
+from telemetry import Telemetry, tello_poller
+from hud import HudRenderer
+from frames import CaptureSource, TelloSource, open_path
+import tellovideo
+from tellovideo import UdpVideoSource, TELLO_VIDEO_PORT
+from tellocmd import TelloLink
+import tagdet
+from tagdet import Camera, TagEngine, poses_to_rpy
+from flightlog import FlightRecorder
+from pid import MultiPID
+import search
+from gatemap import CourseMap, DeadReckoner
+from gatepose import GateLayout, fuse
 
 # Optional deps
 try:
@@ -27,7 +46,9 @@ FRAME_W, FRAME_H = 960, 720
 FX, FY = 550.0, 550.0
 CX, CY = FRAME_W / 2.0, FRAME_H / 2.0
 TAG_SIZE_M = 0.20 / 10.0  
+CAMERA = Camera(FX, FY, CX, CY)
 TO_CM = 100.0
+FRAME_SLOTS = 8   # ring buffer depth; must exceed the frames in flight across pipeline stages
 
 # Gate plan (IDs) –
 GATE_SEQUENCE = [1, 5, 12, 19, 23]
@@ -58,20 +79,61 @@ PITCH_OK = 999
 # Distances (cm)
 APPROACH_DIST = 180   
 PASS_CUTOFF   = 80     
+PROCEED_FWD   = 40     # rc, least forward command while PROCEEDing through a gate
+PASS_TIME     = 2.0    # s flown straight on after PASS_CUTOFF before the next gate
 
 # Time budgets
 PER_GATE_DEADLINE = 10.0     
 GLOBAL_DEADLINE   = 45.0
 SEARCH_TRIGGER    = 7.0      
 
+# Control scheduling: 0 = one command per processed frame, >0 = fixed-rate commands (Hz)
+# on the newest pose, aged to command time
+CONTROL_HZ      = 0.0
+CONTROL_MAX_AGE = 0.3    # s, an older measurement counts as "no tag"
+
+# Tello video: "udp" = tellovideo.UdpVideoSource (own H.264 receiver, frames stamped with
+# their receive time), "djitellopy" = get_frame_read() (newest frame, no timestamp)
+TELLO_VIDEO = "udp"
+
+# Tello commands: "async" = tellocmd.TelloLink (rc coalesced to TELLO_RC_HZ, never waits on
+# a reply; video must be "udp"), "djitellopy" = Tello() (one rc packet per send_rc_control)
+TELLO_CMD   = "async"
+TELLO_RC_HZ = 20.0
+
+# Telemetry (battery/height polled off the control thread)
+TELEM_RATE  = 5.0    # Hz
+TELEM_STALE = 2.0    # s without fresh telemetry -> hover until it returns
+BATTERY_MIN = 15     # % -> STOP
+
 # Detection & smoothing
-DECIMATES = [2.0, 1.5, 1.0]
+DECIMATES = [2.0, 1.5, 1.0]     # quad_decimate ladder, coarse -> fine (one TagEngine each)
+DECIMATE_ADAPTIVE = True        # False: always run the finest level only
+DECIMATE_MIN_SIDE = 20.0        # px, tag side needed in the decimated image
+DECIMATE_MEMORY   = 1.0         # s, how long the last seen tag size steers the start level
 MIN_DECISION_MARGIN = 30.0
 MAX_HAMMING = 0
 MIN_QUAD_PERIM = 40.0
 
+# Preprocessing variant: "full" (CLAHE + unsharp), "auto" (skip CLAHE on a
+# well-spread histogram), "roi" (unsharp only inside tracked ROIs), "raw"
+PREPROC_VARIANT = "full"
+PRE_SPREAD_OK   = 150   # p2..p98 gray span above which CLAHE is skipped in "auto"
+
 ALPHA_T = 0.35  # EMA translation
 ALPHA_R = 0.35  # EMA rotation
+TAG_TTL = 1.0   # s, smoothed tag state unseen this long is dropped
+
+# Translation filter: "ema" (ALPHA_T) or "kalman" (constant velocity, predicted to command time)
+TAG_FILTER = "ema"
+KF_Q     = 2000.0              # (cm/s^2)^2/Hz white-acceleration density
+KF_R     = (4.0, 4.0, 25.0)    # cm^2 measurement variance x, y, z
+KF_COAST = 0.8                 # s, PROCEED flies on the predicted pose this long after losing the tag
+
+# ROI tracking (detect_tags(track=True))
+TRACK_PAD       = 0.6    # ROI padding, fraction of the tag's bbox side
+TRACK_MIN_ROI   = 96     # px, smallest ROI side
+TRACK_REACQUIRE = 15     # full-frame detection at least every N frames
 
 # Search pattern params
 YAW_SWEEP_RATE = 35     
@@ -81,9 +143,37 @@ SPIRAL_SEGMENT = 1.2
 BOX_STEP_F     = 35
 BOX_STEP_LAT   = 35
 BOX_SEGMENT    = 0.9
+SEARCH_PATTERN = "sweep+spiral+box"   # search.py patterns joined by '+'; the last one repeats
+SEARCH_BUDGET  = 60.0    # s, longest single search in flight (also capped by the drone battery)
+BATTERY_DRAIN  = 0.15    # %/s in flight, for the battery cap
+
+# Course map (gatemap.py JSON, tag poses relative to the start pose): after a gate,
+# ACQUIRE turns towards the next gate's dead-reckoned bearing before searching
+COURSE_MAP     = None    # path, or None for no map
+RC_SPEED       = 1.5     # m/s at rc 100, for dead reckoning
+RC_YAW_RATE    = 100.0   # deg/s at rc 100
+DR_BLEND       = 0.5     # pull of a mapped tag sighting on the dead-reckoned pose
+MAP_YAW_GAIN   = 1.5     # rc per deg of bearing error
+MAP_FWD        = 30      # rc forward while facing the predicted gate
+MAP_FWD_CONE   = 15.0    # deg, bearing within which MAP_FWD is flown
+MAP_STANDOFF   = 1.0     # m, no MAP_FWD closer than this to the predicted tag
+MAP_TIMEOUT    = 4.0     # s of map-guided ACQUIRE before falling back to search
+
+# Gate fusion: all visible tags of a gate (placed as in the course map, or per GATE_LAYOUT)
+# merged into one least-squares pose of the gate tag. Needs one of the two: without
+# them the gate tag's own pose is used.
+GATE_FUSION    = False
+GATE_LAYOUT    = None    # measured [(dx, dy) in tag sizes] of SUPPORT_TAGS around their gate tag, in list order
+FUSE_PX_SIGMA  = 1.0     # px corner noise behind each tag's pose covariance
+FUSE_SIGMA_PX  = 0.75    # fused center sigma (px) below which ALIGN settles for FUSE_STREAK
+FUSE_STREAK    = 3       # detection streak ALIGN needs then (6 otherwise)
+
+# Tuned settings (tuner.py output): tuned against dronesim, so only applied on request (--tuning)
+TUNING_FILE = None
 
 # ------------------- Globals -------------------
 
+FSM_STATES = ("ACQUIRE", "ALIGN", "PROCEED", "DONE", "STOP")
 _STATE = "ACQUIRE"       
 _CUR_GATE_IDX = 0
 _LAST_SEEN_TIME = 0.0
@@ -91,24 +181,76 @@ _GATE_START_TIME = 0.0
 _MISSION_START = 0.0
 _TARGET_TAG_ID = GATE_SEQUENCE[0]
 
-# EMA memory: id -> {"t": np.array, "rpy": np.array, "ts": t}
-_SMOOTH = {}
+# EMA memory, one row per tag id (t, rpy, ts, hits) + where it sits in the latest dets list
+_STORE = TagStore(ttl=TAG_TTL)
+_KF = CVKalman(q=KF_Q, r=KF_R, ttl=TAG_TTL)
+_LAST_TAG_ID = None
+_FRAME_SEQ = itertools.count(1)
 
-# Derivative memory
-_prev_err = {"yaw": 0.0, "lat": 0.0, "up": 0.0, "fwd": 0.0}
-_prev_t   = time.time()
+# ROI tracks: id -> {"corners": (4,2) px, "center": (2,) px, "vel": (2,) px/frame}
+_TRACKS = {}
+_TRACK_FRAME = 0
+_TRACK_T = None     # clock() of the last track update: the frame interval for Kalman velocities
+_TRACK_LOCK = threading.Lock()
+
+# Smallest tag side (px) seen last frame, for the decimation policy: (side, ts)
+_LAST_SIZE = (0.0, 0.0)
+_DET_STREAK = 0
+
+# Axis controller (yaw, lat, up, fwd), rebuilt from the gains on reset_mission()
+_PID = None
+_prev_t = time.time()
 
 # Tello / Video
 _USE_TELLO = False
 _TELLO = None
-_CAP = None
+_TELEM = None
+_SRC = None      # frames.FrameSource
 
 # HUD / FPS
 _prev_fps_t = time.time()
 _fps = 0.0
+_HEADLESS = False
+
+# Mission clock: time.time live, a SimClock under --replay
+_CLOCK = time.time
+_REPLAY = False
+
+# Gate log: [{"id", "t_start", "t_pass", "acquire"}] (mission-relative seconds;
+# acquire = seconds from gate start to the first sighting of the gate's own tags)
+_GATE_LOG = []
+_ACQ_TIME = None
+_PASS_T0 = None     # when PROCEED came inside PASS_CUTOFF
+# RC commands sent while replaying: [(t, lr, fb, ud, yaw)]
+_RC_LOG = []
+# Flight recorder (--log DIR), one record per control step
+_FLOG = None
+# Last rc_send time (command period stats) and per-tag velocity for age compensation
+_RC_LAST_T = None
+_MOTION = {}
+# Course map and the dead-reckoned pose in its frame (COURSE_MAP / --course)
+_MAP = None
+_DR = None
+# Gate tag offsets for GATE_FUSION, rebuilt on first use after a reset / map change
+_LAYOUT = None
 
 # ---------------------- Utilities ---------------------------
 
+def clock():
+    return _CLOCK()
+
+class SimClock:
+    # Deterministic clock for replay: advances a fixed 1/fps per frame.
+    def __init__(self, fps, t0=0.0):
+        self.t = t0
+        self.dt = 1.0 / fps
+
+    def __call__(self):
+        return self.t
+
+    def tick(self):
+        self.t += self.dt
+
 def clamp(x, lo, hi):
     return max(lo, min(hi, x))
 
@@ -121,98 +263,380 @@ def ema(prev, cur, alpha):
     return alpha * cur + (1.0 - alpha) * prev
 
 def pose_to_rpy(R_3x3):
-    r = Rotation.from_matrix(R_3x3)
-    yaw, pitch, roll = r.as_euler("zyx", degrees=True)
+    roll, pitch, yaw = poses_to_rpy(np.asarray(R_3x3, dtype=float)[None])[0]
     return roll, pitch, yaw
 
 # ------------------ Detection / Preproc ---------------------
 
-def preprocess(gray):
-    # CLAHE + Unsharp
-    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-    g = clahe.apply(gray)
-    blur = cv2.GaussianBlur(g, (0,0), 1.0)
-    sharp = cv2.addWeighted(g, 1.5, blur, -0.5, 0)
-    return sharp
-
-_DET = Detector(
-    families="tag36h11",
-    nthreads=1,
-    quad_decimate=1.0,    
-    quad_sigma=0.0,
-    refine_edges=1,
-    decode_sharpening=0.25,
-    debug=0
-)
-
-def quality_ok(tag):
-    if getattr(tag, "decision_margin", 0.0) < MIN_DECISION_MARGIN: return False
-    if getattr(tag, "hamming", 99) > MAX_HAMMING: return False
-    per = 0.0
-    c = tag.corners
-    for i in range(4):
-        per += np.linalg.norm(c[i] - c[(i+1) % 4])
-    if per < MIN_QUAD_PERIM: return False
-    return True
+class Preprocessor:
+    # CLAHE + Unsharp with the CLAHE object and output buffers built once.
+    # The returned image is an internal buffer, valid until the next apply().
+    # Not thread-safe: use one instance per thread (see preprocess()).
+
+    def __init__(self, variant="full", clip=2.0, tile=(8,8), sigma=1.0, amount=0.5):
+        self.variant = variant
+        self.sigma = sigma
+        self.amount = amount
+        self._clahe = cv2.createCLAHE(clipLimit=clip, tileGridSize=tile)
+        self._cap = (0, 0)
+        self.skipped_clahe = 0
+
+    def _views(self, h, w):
+        # Buffers only grow, so ROI crops of any size reuse the same memory.
+        if h > self._cap[0] or w > self._cap[1]:
+            self._cap = (max(h, self._cap[0]), max(w, self._cap[1]))
+            self._eq   = np.empty(self._cap, np.uint8)
+            self._blur = np.empty(self._cap, np.uint8)
+            self._out  = np.empty(self._cap, np.uint8)
+        return self._eq[:h, :w], self._blur[:h, :w], self._out[:h, :w]
+
+    def well_spread(self, gray):
+        hist = cv2.calcHist([gray[::4, ::4]], [0], None, [64], [0, 256]).ravel()
+        cdf = np.cumsum(hist) / max(hist.sum(), 1.0)
+        lo, hi = np.searchsorted(cdf, 0.02), np.searchsorted(cdf, 0.98)
+        return (hi - lo) * 4 >= PRE_SPREAD_OK
+
+    def apply(self, gray, rois=None):
+        if self.variant == "raw":
+            return gray
+        h, w = gray.shape[:2]
+        eq, blur, out = self._views(h, w)
+
+        g = gray
+        if self.variant == "auto" and self.well_spread(gray):
+            self.skipped_clahe += 1
+        else:
+            g = self._clahe.apply(gray, dst=eq)
+
+        if self.variant == "roi" and rois:
+            np.copyto(out, g)
+            regions = [(slice(y0, y1), slice(x0, x1)) for (x0, y0, x1, y1) in rois]
+        else:
+            regions = [(slice(None), slice(None))]
+        for r in regions:
+            cv2.GaussianBlur(g[r], (0,0), self.sigma, dst=blur[r])
+            cv2.addWeighted(g[r], 1.0 + self.amount, blur[r], -self.amount, 0, dst=out[r])
+        return out
+
+_PRE = threading.local()
+
+@PROFILER.timed("preprocess")
+def preprocess(gray, rois=None):
+    pre = getattr(_PRE, "pre", None)
+    if pre is None or pre.variant != PREPROC_VARIANT:
+        pre = _PRE.pre = Preprocessor(PREPROC_VARIANT)
+    return pre.apply(gray, rois)
+
+def make_detector(decimate=1.0, workers=1):
+    # workers: detector threads running side by side (--det-workers), sharing the cores
+    return TagEngine(CAMERA, TAG_SIZE_M, decimate=decimate, nthreads=tagdet.default_threads(workers))
+
+def make_detector_pool(workers=1):
+    # quad_decimate -> TagEngine; a pool must not be shared across threads
+    return {dec: make_detector(dec, workers) for dec in DECIMATES}
+
+# Default pool, built on first use (not at import: batchdet, dronesim, search and
+# the tuner workers import this module) and again once TAG_SIZE_M / DECIMATES change
+_POOL = None
+_POOL_KEY = None
+
+def detector_pool():
+    global _POOL, _POOL_KEY
+    key = (TAG_SIZE_M, tuple(DECIMATES))
+    if _POOL is None or _POOL_KEY != key:
+        _POOL, _POOL_KEY = make_detector_pool(), key
+    return _POOL
+
+# A batch is one frame's detections, a tagdet.DET_DTYPE array:
+#   id | dm | ham | corners (4,2) | center (2,) | R (3,3) | t (3,) [m]
+
+def _empty_batch():
+    return tagdet.empty()
+
+def _take(batch, mask):
+    return batch[mask]
+
+def _concat(batches):
+    if not batches:
+        return _empty_batch()
+    return np.concatenate(batches)
+
+def quad_perimeters(corners):
+    # (N,4,2) -> (N,)
+    return np.linalg.norm(corners - np.roll(corners, -1, axis=1), axis=2).sum(axis=1)
+
+def quality_mask(batch):
+    return ((batch["dm"] >= MIN_DECISION_MARGIN) & (batch["ham"] <= MAX_HAMMING)
+            & (quad_perimeters(batch["corners"]) >= MIN_QUAD_PERIM))
+
+@PROFILER.timed("smooth")
+def smooth_states(ids, t_cm, rpy):
+    # Batched EMA over one frame's tags: (N,) ids, (N,3) t_cm, (N,3) rpy.
+    # Tags seen for the first time take prev = current, so the EMA returns them unchanged.
+    rpy = _wrap_deg(rpy)
+    now = clock()
+    with _STORE.lock:
+        _STORE.expire(now)
+        pt, pr, live = _STORE.gather(ids)
+        pt = np.where(live[:, None], pt, t_cm)
+        pr = np.where(live[:, None], pr, rpy)
+        if TAG_FILTER == "kalman":
+            sm_t, _ = _KF.update(ids, t_cm, now)
+        else:
+            sm_t = ema(pt, t_cm, ALPHA_T)
+        sm_r = _wrap_deg(pr + ALPHA_R * _wrap_deg(rpy - pr))
+        _STORE.put(ids, sm_t, sm_r, now)
+    return sm_t, sm_r
 
 def smooth_state(tag_id, t_cm, rpy):
-    prev = _SMOOTH.get(tag_id)
-    t_cm = np.array(t_cm, dtype=float)
-    rpy = np.array([_wrap_deg(x) for x in rpy], dtype=float)
-    if prev is None:
-        _SMOOTH[tag_id] = {"t": t_cm, "rpy": rpy, "ts": time.time()}
-        return t_cm, rpy
-    sm_t = ema(prev["t"], t_cm, ALPHA_T)
-    pr = np.array([_wrap_deg(x) for x in prev["rpy"]])
-    delta = np.array([_wrap_deg(a - b) for a, b in zip(rpy, pr)])
-    sm_r = pr + ALPHA_R * delta
-    sm_r = np.array([_wrap_deg(x) for x in sm_r])
-    _SMOOTH[tag_id] = {"t": sm_t, "rpy": sm_r, "ts": time.time()}
-    return sm_t, sm_r
+    sm_t, sm_r = smooth_states(np.array([tag_id]), np.array([t_cm], dtype=float), np.array([rpy], dtype=float))
+    return sm_t[0], sm_r[0]
+
+def _to_dets(batch, fused=None):
+    # fused: {gate id: (tags, covariance m^2)} from fuse_batch, kept on the gate's det as cov (cm^2)
+    fused = fused or {}
+    ids = batch["id"].tolist()
+    if not ids:
+        return []
+    t_raw = batch["t"] * TO_CM
+    t_cm_s, rpy_s = smooth_states(batch["id"], t_raw, poses_to_rpy(batch["R"]))
+    centers = batch["center"].astype(int).tolist()
+    corners = batch["corners"].astype(int).tolist()
+    dm, ham = batch["dm"].tolist(), batch["ham"].tolist()
+    return [{
+        "id": ids[k],
+        "center": tuple(centers[k]),
+        "corners": [tuple(c) for c in corners[k]],
+        "t_cm": t_cm_s[k],
+        "t_raw": t_raw[k],
+        "rpy": rpy_s[k],
+        "dm": dm[k],
+        "ham": ham[k],
+        "cov": fused[ids[k]][1] * TO_CM ** 2 if ids[k] in fused else None
+    } for k in range(len(ids))]
+
+def fuse_batch(batch):
+    # GATE_FUSION: each gate's tags -> one row for the gate tag (gatepose.fuse)
+    # -> (batch, {gate id: (tags fused, covariance m^2)})
+    global _LAYOUT
+    if not GATE_FUSION or not len(batch):
+        return batch, {}
+    if _LAYOUT is None:
+        if _MAP is not None:
+            _LAYOUT = GateLayout.from_map(_MAP, SUPPORT_TAGS)
+        elif GATE_LAYOUT is not None:
+            _LAYOUT = GateLayout.from_supports(SUPPORT_TAGS, TAG_SIZE_M, GATE_LAYOUT)
+        else:
+            print("[Fuse] GATE_FUSION needs a course map or GATE_LAYOUT; using single-tag poses.")
+            _LAYOUT = GateLayout({})
+    return fuse(batch, _LAYOUT, CAMERA, TAG_SIZE_M, FUSE_PX_SIGMA)
+
+def _detect_region(det, proc, x0=0, y0=0):
+    # Quality-filtered batch from proc; proc may be a crop starting at (x0, y0),
+    # the engine shifts the principal point so poses stay in full-frame camera coords.
+    with PROFILER.span("engine"):
+        batch = det.detect(proc, origin=(x0, y0))
+    return _take(batch, quality_mask(batch))
+
+# ------------------ Adaptive Decimation ---------------------
+
+def start_decimate_level():
+    # Index into DECIMATES to start from: the coarsest level at which the smallest
+    # recently seen tag still spans DECIMATE_MIN_SIDE px. With nothing seen recently
+    # start coarse and let _detect_full escalate.
+    if not DECIMATE_ADAPTIVE:
+        return len(DECIMATES) - 1
+    side, ts = _LAST_SIZE
+    if clock() - ts > DECIMATE_MEMORY:
+        return 0
+    for i, dec in enumerate(DECIMATES):
+        if side / dec >= DECIMATE_MIN_SIDE:
+            return i
+    return len(DECIMATES) - 1
+
+def _note_size(batch):
+    global _LAST_SIZE
+    if not len(batch["id"]): return
+    side = quad_perimeters(batch["corners"]) / 4.0
+    tz = batch["t"][:, 2]
+    # expected side from distance; trust the smaller (more conservative) one
+    side = np.minimum(side, np.where(tz > 1e-6, FX * TAG_SIZE_M / np.maximum(tz, 1e-6), np.inf))
+    _LAST_SIZE = (float(side.min()), clock())
+
+def _detect_full(pool, gray, rois=None):
+    proc = preprocess(gray, rois)
+    hits = _empty_batch()
+    for dec in DECIMATES[start_decimate_level():]:
+        hits = _detect_region(pool[dec], proc)
+        if len(hits["id"]): break
+    return hits
+
+# ----------------------- ROI Tracking -----------------------
+
+def _project(t_cm):
+    tx, ty, tz = t_cm
+    if tz <= 1e-6: return None
+    return np.array([FX * tx / tz + CX, FY * ty / tz + CY])
+
+def _update_tracks(dets, full, seen):
+    # A full-frame pass is authoritative: tracks it did not see are dropped.
+    # seen: ids actually detected (a fused gate tag may be out of view)
+    global _TRACK_T
+    if full:
+        _TRACKS.clear()
+    now = clock()
+    dt = 0.0 if _TRACK_T is None else min(now - _TRACK_T, TAG_TTL)
+    _TRACK_T = now
+    k = ALPHA_T / (1.0 - ALPHA_T)
+    seen = set(seen.tolist())
+    for d in dets:
+        if d["id"] not in seen:
+            continue
+        c = np.array(d["center"], dtype=float)
+        vel = np.zeros(2)
+        p = _project(d["t_cm"])   # filter state for this tag, as just written to _STORE
+        if p is not None and TAG_FILTER == "kalman":
+            # the filter carries the velocity (cm/s): one frame interval of it, in pixels
+            _, v, _ = _KF.predict([d["id"]], now)
+            q = _project(np.asarray(d["t_cm"], dtype=float) + v[0] * dt)
+            if q is not None:
+                vel = q - p
+        elif p is not None:
+            # an EMA trails a constant-velocity target by v*(1-a)/a, so the gap
+            # between raw center and projected EMA state gives the pixel velocity
+            vel = (c - p) * k
+        _TRACKS[d["id"]] = {"corners": np.array(d["corners"], dtype=float), "center": c, "vel": vel}
+
+def _track_rois():
+    rois = []
+    for tr in _TRACKS.values():
+        c = tr["corners"] + tr["vel"]
+        (x0, y0), (x1, y1) = c.min(axis=0), c.max(axis=0)
+        side = max(x1 - x0, y1 - y0)
+        pad = max(side * TRACK_PAD + np.abs(tr["vel"]).max(), (TRACK_MIN_ROI - side) / 2.0)
+        rois.append([int(max(0, x0 - pad)), int(max(0, y0 - pad)),
+                     int(min(FRAME_W, x1 + pad)), int(min(FRAME_H, y1 + pad))])
+    # merge overlapping boxes so a cluster of gate tags is detected in one crop
+    merged = True
+    while merged and len(rois) > 1:
+        merged = False
+        for i in range(len(rois)):
+            for j in range(i + 1, len(rois)):
+                a, b = rois[i], rois[j]
+                if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                    rois[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                    del rois[j]
+                    merged = True
+                    break
+            if merged: break
+    return rois
+
+def _detect_tracked(pool, gray):
+    global _TRACK_FRAME
+    with _TRACK_LOCK:
+        _TRACK_FRAME += 1
+        pred = _track_rois()
+        rois = pred if _TRACK_FRAME % TRACK_REACQUIRE else []
+        want = set(_TRACKS)
+
+    hits = None
+    if rois:
+        det = pool[DECIMATES[start_decimate_level()]]
+        hits = _concat([_detect_region(det, preprocess(gray[y0:y1, x0:x1]), x0, y0)
+                        for (x0, y0, x1, y1) in rois])
+        if not want.issubset(hits["id"].tolist()):
+            hits = None          # track lost -> re-acquire on the full frame
+    full = hits is None
+    if full:
+        # periodic re-acquire with live tracks: "roi" preproc sharpens just the predicted boxes
+        hits = _detect_full(pool, gray, pred if want else None)
+
+    found = _to_dets(*fuse_batch(hits))
+    with _TRACK_LOCK:
+        _update_tracks(found, full, hits["id"])
+    return found, hits
+
+@PROFILER.timed("detect_tags")
+def detect_tags(bgr, pool=None, track=False, gray=None):
+    # pool: per-thread detector pool from make_detector_pool()
+    # track: detect in padded ROIs around known tags, full frame only to re-acquire
+    # gray: precomputed gray plane of bgr (frames.Frame.gray), skips the conversion
+    pool = pool or detector_pool()
+    if gray is None:
+        gray = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
+
+    if track:
+        found, hits = _detect_tracked(pool, gray)
+    else:
+        hits = _detect_full(pool, gray)
+        found = _to_dets(*fuse_batch(hits))
+    return _finish_dets(found, hits)
 
-def detect_tags(bgr):
-    gray = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
-    proc = preprocess(gray)
-    found = []
-
-
-    for _ in DECIMATES:
-        tags = _DET.detect(proc, estimate_tag_pose=True,
-                           camera_params=(FX, FY, CX, CY), tag_size=TAG_SIZE_M)
-        for tg in tags:
-            if not quality_ok(tg): continue
-            t_m = tg.pose_t.reshape(3)
-            t_cm = (t_m[0]*TO_CM, t_m[1]*TO_CM, t_m[2]*TO_CM)
-            rpy = pose_to_rpy(tg.pose_R)
-            t_cm_s, rpy_s = smooth_state(tg.tag_id, t_cm, rpy)
-            cx, cy = int(tg.center[0]), int(tg.center[1])
-            corners = [(int(x), int(y)) for (x,y) in tg.corners]
-            found.append({
-                "id": int(tg.tag_id),
-                "center": (cx, cy),
-                "corners": corners,
-                "t_cm": t_cm_s,
-                "rpy": rpy_s,
-                "dm": float(getattr(tg, "decision_margin", 0.0)),
-                "ham": int(getattr(tg, "hamming", 0))
-            })
-        if found: break
+def dets_from_batch(batch):
+    # detect_tags' output for an already detected (or simulated) DET_DTYPE batch
+    return _finish_dets(_to_dets(*fuse_batch(batch)), batch)
 
+def _finish_dets(found, hits):
+    _note_size(hits)
     found.sort(key=lambda d: (d["dm"], -d["ham"]), reverse=True)
+    seq = next(_FRAME_SEQ)
+    for d in found:
+        d["seq"] = seq
+    with _STORE.lock:
+        _STORE.mark([d["id"] for d in found], seq)
     return found
 
+# ------------------ Kalman Prediction -----------------------
+
+def predicted_tag(tag_id, base=None, max_age=None):
+    # The tag as the Kalman filter expects it at clock() (command time): t_cm and
+    # the projected center are replaced by the prediction. Returns base unchanged
+    # when not filtering with "kalman", and None/base when the track is missing or
+    # older than max_age.
+    if TAG_FILTER != "kalman" or tag_id is None:
+        return base
+    now = clock()
+    with _STORE.lock:
+        p, _, ok = _KF.predict([tag_id], now)
+        age = now - _KF.ts[tag_id]
+        row = _STORE.get(tag_id)
+    if not ok[0] or row is None or (max_age is not None and age > max_age):
+        return base
+    c = _project(p[0])
+    if c is None:
+        return base
+    tag = dict(base) if base else {"id": tag_id, "corners": [], "t_raw": p[0], "rpy": row["rpy"].copy(),
+                                   "dm": 0.0, "ham": 0, "seq": -1}
+    tag["t_cm"] = p[0]
+    tag["center"] = (int(c[0]), int(c[1]))
+    return tag
+
 # ------------------ Gate Selection Logic --------------------
 
+def find_tag(dets, tag_id):
+    # O(1) via the slot index detect_tags left in _STORE for this frame
+    if not dets:
+        return None
+    i = _STORE.lookup(tag_id, dets[0]["seq"])
+    if i is None:
+        # a newer frame (parallel detector) already re-indexed the slot
+        i = next((k for k, d in enumerate(dets) if d["id"] == tag_id), -1)
+    return dets[i] if i >= 0 else None
+
+def is_target(tag):
+    # tag belongs to the current gate (its own tag or one of its support tags)
+    return tag["id"] == _TARGET_TAG_ID or tag["id"] in SUPPORT_TAGS.get(_TARGET_TAG_ID, ())
+
 def pick_gate(dets, target_id):
 
-    primary = [d for d in dets if d["id"] == target_id]
+    primary = find_tag(dets, target_id)
     if primary:
-        return primary[0], "PRIMARY"
+        return primary, "PRIMARY"
 
     for sid in SUPPORT_TAGS.get(target_id, []):
-        aux = [d for d in dets if d["id"] == sid]
+        aux = find_tag(dets, sid)
         if aux:
-            return aux[0], "SUPPORT"
+            return aux, "SUPPORT"
 
     
     if dets:
@@ -223,16 +647,16 @@ def pick_gate(dets, target_id):
 
 # ----------------------- Control (PID) ----------------------
 
-def pid_step(err, prev_err, dt, kp, kd, limit):
-    de = (err - prev_err) / max(dt, 1e-3)
-    u = kp*err + kd*de
-    return clamp(int(round(u)), -limit, limit), de
+def make_pid():
+    return MultiPID([P_YAW, P_LAT, P_UP, P_FWD], kd=[D_YAW, D_LAT, D_UP, D_FWD],
+                    limit=[MAX_YAW, MAX_LAT, MAX_UP, MAX_FWD], names=("yaw", "lat", "up", "fwd"))
 
+@PROFILER.timed("rc")
 def compute_rc_from_error(tag):
 
-    global _prev_err, _prev_t
+    global _prev_t
 
-    now = time.time()
+    now = clock()
     dt = now - _prev_t
     _prev_t = now
 
@@ -242,19 +666,8 @@ def compute_rc_from_error(tag):
     tx, ty, tz = tag["t_cm"]           # cm
     roll, pitch, yaw = tag["rpy"]
 
-    u_yaw, de_yaw = pid_step(err_x, _prev_err["yaw"], dt, P_YAW, D_YAW, MAX_YAW)
-    u_lat, de_lat = pid_step(err_x, _prev_err["lat"], dt, P_LAT, D_LAT, MAX_LAT)
-
-    u_up,  de_up  = pid_step(-err_y, _prev_err["up"],  dt, P_UP,  D_UP,  MAX_UP)
-
-
     dist_err = max(0.0, tz - APPROACH_DIST)  
-    u_fwd, de_fwd = pid_step(dist_err, _prev_err["fwd"], dt, P_FWD, D_FWD, MAX_FWD)
-
-    _prev_err["yaw"] = err_x
-    _prev_err["lat"] = err_x
-    _prev_err["up"]  = -err_y
-    _prev_err["fwd"] = dist_err
+    u_yaw, u_lat, u_up, u_fwd = np.round(_PID.step((err_x, err_x, -err_y, dist_err), dt)).tolist()
 
     
     lr  = clamp(int(round(u_lat * 0.6)), -MAX_LAT, MAX_LAT)
@@ -266,46 +679,58 @@ def compute_rc_from_error(tag):
 
 # ----------------------- Search Routines --------------------
 
-_search_phase = 0
+def make_search_plan(pattern=None):
+    # SEARCH_PATTERN compiled once into a time-indexed rc table
+    parts = {
+        "sweep": search.yaw_sweep(YAW_SWEEP_RATE, SWEEP_SEGMENT, int(round(8.0 / SWEEP_SEGMENT))),
+        "spiral": search.spiral(SPIRAL_STEP_F, 25, SPIRAL_SEGMENT, int(round(6.0 / SPIRAL_SEGMENT))),
+        "box": search.box(BOX_STEP_F, BOX_STEP_LAT, BOX_SEGMENT),
+        "lawnmower": search.lawnmower(BOX_STEP_F, BOX_STEP_LAT),
+        "square": search.expanding_square(BOX_STEP_F),
+        "circle": search.circle(),
+        "turn": search.turn(YAW_SWEEP_RATE),
+    }
+    names = (pattern or SEARCH_PATTERN).split("+")
+    head = search.Pattern([])
+    for name in names[:-1]:
+        head = head + parts[name]
+    return head.compile(loop=parts[names[-1]])
+
+_SEARCH_PLAN = None
+_SEARCH = None
 _search_t0 = 0.0
 def reset_search():
-    global _search_phase, _search_t0
-    _search_phase = 0
-    _search_t0 = time.time()
+    global _SEARCH, _search_t0
+    _search_t0 = clock()
+    if _USE_TELLO:
+        _SEARCH = _SEARCH_PLAN.bounded(search.battery_budget(SEARCH_BUDGET, get_battery(), BATTERY_MIN, BATTERY_DRAIN))
+    else:
+        # webcam / replay: get_battery() would be the host's battery, not a flight budget
+        _SEARCH = _SEARCH_PLAN
 
 def search_rc():
+    return _SEARCH.rc(clock() - _search_t0)
 
-    global _search_phase, _search_t0
-    t = time.time()
-    elapsed = t - _search_t0
-
-    if _search_phase == 0:
-        # Yaw sweep:
-        seg = int(elapsed / SWEEP_SEGMENT)
-        dirn = -1 if seg % 2 == 0 else 1
-        rc = (0, 0, 0, dirn * YAW_SWEEP_RATE)
-        if elapsed > 8.0:  # ~2*4seg
-            _search_phase = 1
-            _search_t0 = t
-        return rc
-
-    if _search_phase == 1:
-        # Spiral forward
-        seg = int(elapsed / SPIRAL_SEGMENT)
-        dirn = 1 if seg % 2 == 0 else -1
-        rc = (0, SPIRAL_STEP_F, 0, dirn * 25)
-        if elapsed > 6.0:
-            _search_phase = 2
-            _search_t0 = t
-        return rc
-
-    # phase 2: Box
-    leg = int(elapsed / BOX_SEGMENT) % 4
-    if leg == 0:   rc = (0, BOX_STEP_F, 0, 0)     # forward
-    elif leg == 1: rc = (BOX_STEP_LAT, 0, 0, 0)   # right
-    elif leg == 2: rc = (0, -BOX_STEP_F, 0, 0)    # back
-    else:          rc = (-BOX_STEP_LAT, 0, 0, 0)  # left
-    return rc
+def map_rc():
+    # ACQUIRE with a course map: turn towards the target's dead-reckoned
+    # bearing and close in; None (search instead) without a mapped target
+    # or after MAP_TIMEOUT
+    if _DR is None or clock() - _GATE_START_TIME > MAP_TIMEOUT:
+        return None
+    rel = _DR.relative(_TARGET_TAG_ID)
+    if rel is None:
+        return None
+    bearing = math.degrees(math.atan2(rel[0], rel[2]))
+    yaw = clamp(int(round(MAP_YAW_GAIN * bearing)), -MAX_YAW, MAX_YAW)
+    fb = MAP_FWD if abs(bearing) < MAP_FWD_CONE and rel[2] > MAP_STANDOFF else 0
+    return (0, fb, 0, yaw)
+
+def load_course_map(cmap):
+    # CourseMap, JSON path or None; takes effect at the next reset_mission()
+    global _MAP, _LAYOUT
+    _MAP = CourseMap.load(cmap) if isinstance(cmap, str) else cmap
+    _LAYOUT = None
+    return _MAP
 
 # ------------------ Pass Decision Heuristics ----------------
 
@@ -314,8 +739,12 @@ def should_pass(tag, det_streak):
     _, _, tz = tag["t_cm"]
     cx, cy = tag["center"]
     ex, ey = abs(cx - CX), abs(cy - CY)
+    # a fused gate pose this certain needs fewer frames to confirm the alignment
+    cov = tag.get("cov")
+    sharp = cov is not None and tz > 0 and math.sqrt(max(cov[0][0], cov[1][1])) * FX / tz < FUSE_SIGMA_PX
+    streak = FUSE_STREAK if sharp else 6
 
-    if tz < APPROACH_DIST and ex < PX_TOL and ey < PX_TOL and det_streak > 6:
+    if tz < APPROACH_DIST and ex < PX_TOL and ey < PX_TOL and det_streak > streak:
         return True, "ALIGNED_NEAR"
     if tz < PASS_CUTOFF:
         return True, "VERY_NEAR"
@@ -324,6 +753,19 @@ def should_pass(tag, det_streak):
 # ----------------------- Tello / Video ----------------------
 
 def connect_tello():
+    if TELLO_CMD == "async" and TELLO_VIDEO == "udp" and tellovideo._HAS_AV:
+        dr = TelloLink(rc_hz=TELLO_RC_HZ)
+        try:
+            dr.connect()
+        except Exception as e:
+            print(f"[Tello] no answer on the command port ({type(e).__name__}); falling back to webcam mode.")
+            dr.end(0.0)
+            return None
+        dr.streamoff()
+        dr.streamon()
+        dr.takeoff().result()
+        print(f"[Tello] Battery:", dr.get_battery())
+        return dr
     if not _HAS_TELLO:
         print("[Tello] djitellopy not installed; falling back to webcam mode.")
         return None
@@ -335,36 +777,63 @@ def connect_tello():
     dr.takeoff()
     return dr
 
+def synthetic_source(fps=30.0, speed=5.0, noise=0.0):
+    # Rendered gate course (GATE_SEQUENCE + SUPPORT_TAGS) with ground-truth poses
+    from synth import course_source
+    return course_source(GATE_SEQUENCE, SUPPORT_TAGS, FRAME_W, FRAME_H, FX, FY, CX, CY, TAG_SIZE_M,
+                         fps=fps, speed=speed, noise=noise, slots=FRAME_SLOTS)
+
+@PROFILER.timed("read_frame")
 def read_frame():
-    if _USE_TELLO and _TELLO:
-        frame = _TELLO.get_frame_read().frame
-        if frame is None: return False, None
-        return True, cv2.resize(frame, (FRAME_W, FRAME_H))
-    else:
-        ok, fr = _CAP.read()
-        if not ok: return False, None
-        return True, cv2.resize(fr, (FRAME_W, FRAME_H))
+    # -> (ok, frames.Frame): bgr/gray live in the source's ring and are shared, not copied
+    if _REPLAY:
+        _CLOCK.tick()
+    fr = _SRC.read()
+    return fr is not None, fr
 
 def rc_send(lr, fb, ud, yaw):
+    global _RC_LAST_T
+    now = clock()
+    if _RC_LAST_T is not None:
+        _STATS["rc_period"].add(now - _RC_LAST_T)
+    _RC_LAST_T = now
+    if _REPLAY:
+        _RC_LOG.append((round(clock() - _MISSION_START, 4), lr, fb, ud, yaw))
+    if _DR is not None:
+        _DR.command((lr, fb, ud, yaw), now)
     if _USE_TELLO and _TELLO:
         _TELLO.send_rc_control(lr, fb, ud, yaw)
 
-def get_battery():
+def _host_battery():
+    b = psutil.sensors_battery()
+    return {"bat": int(b.percent) if b else None}
+
+def start_telemetry():
+    global _TELEM
     if _USE_TELLO and _TELLO:
-        try:
-            return _TELLO.get_battery()
-        except:
-            return None
-    if _HAS_PSUTIL and hasattr(psutil, "sensors_battery"):
-        b = psutil.sensors_battery()
-        if b: return int(b.percent)
-    return None
+        _TELEM = Telemetry(tello_poller(_TELLO), TELEM_RATE, TELEM_STALE, clock=time.time).start()
+    elif _HAS_PSUTIL and hasattr(psutil, "sensors_battery"):
+        _TELEM = Telemetry(_host_battery, 1.0, TELEM_STALE, clock=time.time).start()
+
+def stop_telemetry():
+    global _TELEM
+    if _TELEM:
+        _TELEM.stop()
+        _TELEM = None
+
+def get_battery():
+    # latest polled value; never blocks on the drone
+    return _TELEM.get("bat") if _TELEM else None
+
+def telemetry_stale():
+    return bool(_USE_TELLO and _TELEM and _TELEM.stale("bat"))
 
 # --------------------------- HUD ----------------------------
 
-def draw_hud(img, state, target_id, tag, rc, det_mode, gate_idx, t_gate, t_total, det_streak):
+@PROFILER.timed("draw_hud")
+def draw_hud(img, state, target_id, tag, rc, det_mode, gate_idx, t_gate, t_total, det_streak, timings=None):
     global _fps, _prev_fps_t
-    now = time.time()
+    now = clock()
     dt = now - _prev_fps_t
     if dt > 0.25:
         _fps = 1.0 / max(dt, 1e-3)
@@ -379,9 +848,18 @@ def draw_hud(img, state, target_id, tag, rc, det_mode, gate_idx, t_gate, t_total
     txt1 = f"STATE:{state}  GATE:{gate_idx+1}/{len(GATE_SEQUENCE)}  TARGET:{target_id}  {btxt}  FPS:{_fps:.1f}"
     cv2.putText(img, txt1, (12, 22), cv2.FONT_HERSHEY_SIMPLEX, 0.55, (255,255,255), 2)
 
+    if state == "DONE":
+        cv2.putText(img, "MISSION COMPLETED", (int(FRAME_W*0.28), int(FRAME_H*0.55)),
+                    cv2.FONT_HERSHEY_DUPLEX, 1.0, (0,255,0), 2)
+
     txt2 = f"GateTime:{t_gate:4.1f}s  Total:{t_total:4.1f}s  Streak:{det_streak}  Mode:{det_mode}"
     cv2.putText(img, txt2, (12, 45), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (220,255,220), 1)
 
+    if timings:
+        det_ms, e2e_ms = timings
+        cv2.putText(img, f"det:{det_ms:5.1f}ms  e2e:{e2e_ms:5.1f}ms", (12, 66),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.45, (220,220,255), 1)
+
     if tag:
         cx, cy = tag["center"]
         tx, ty, tz = tag["t_cm"]
@@ -401,10 +879,20 @@ def draw_hud(img, state, target_id, tag, rc, det_mode, gate_idx, t_gate, t_total
 
 # ---------------------- Main State Logic --------------------
 
-def main_loop(args):
-    global _STATE, _CUR_GATE_IDX, _TARGET_TAG_ID
-    global _LAST_SEEN_TIME, _GATE_START_TIME, _MISSION_START
-    global _USE_TELLO, _TELLO, _CAP
+def open_source(args):
+    global _USE_TELLO, _TELLO, _SRC, _CLOCK, _REPLAY, _HEADLESS
+
+    _HEADLESS = args.headless or args.replay is not None
+    if args.replay is not None:
+        # offline replay: recorded or synthetic frames, simulated clock, no drone
+        _REPLAY = True
+        _CLOCK = SimClock(args.replay_fps)
+        _USE_TELLO = False
+        if args.replay == "synth":
+            _SRC = synthetic_source(args.replay_fps, args.synth_speed, args.synth_noise)
+        else:
+            _SRC = open_path(args.replay, FRAME_W, FRAME_H, FRAME_SLOTS)
+        return
 
     _USE_TELLO = (args.mode == "tello")
     if _USE_TELLO:
@@ -412,159 +900,752 @@ def main_loop(args):
         if _TELLO is None:
             _USE_TELLO = False
 
-    if not _USE_TELLO:
-        if args.video is not None:
-            _CAP = cv2.VideoCapture(args.video)
+    if _USE_TELLO:
+        if TELLO_VIDEO == "udp" and not tellovideo._HAS_AV:
+            print("[Video] PyAV not installed; using djitellopy's frame reader.")
+        if TELLO_VIDEO == "udp" and tellovideo._HAS_AV:
+            _SRC = UdpVideoSource(FRAME_W, FRAME_H, FRAME_SLOTS)
         else:
-            _CAP = cv2.VideoCapture(0)
-        _CAP.set(cv2.CAP_PROP_FRAME_WIDTH, FRAME_W)
-        _CAP.set(cv2.CAP_PROP_FRAME_HEIGHT, FRAME_H)
+            _SRC = TelloSource(_TELLO, FRAME_W, FRAME_H, FRAME_SLOTS)
+    elif args.video is not None and args.video.startswith("udp"):
+        # udp[:PORT]: a raw H.264 stream, e.g. `tellovideo.py replay` of a captured flight
+        port = int(args.video.split(":")[1]) if ":" in args.video else TELLO_VIDEO_PORT
+        _SRC = UdpVideoSource(FRAME_W, FRAME_H, FRAME_SLOTS, port=port)
+    else:
+        _SRC = CaptureSource(args.video if args.video is not None else 0, FRAME_W, FRAME_H, FRAME_SLOTS)
+    start_telemetry()
+
+def close_source():
+    stop_telemetry()
+    if _USE_TELLO and _TELLO:
+        try:
+            _TELLO.send_rc_control(0,0,0,0)
+            # _TELLO.land()
+            _TELLO.streamoff()
+            _TELLO.end()
+            if isinstance(_TELLO, TelloLink):
+                s = _TELLO.summary()
+                print(f"[Tello] rc {s['rc_sets']} set / {s['rc_sent']} sent, {s['timeouts']} timeouts, rtt p50 "
+                      + ", ".join(f"{k} {v['p50_ms']:.0f}ms" for k, v in s["rtt"].items()))
+        except:
+            pass
+    _SRC.close()
+
+def reset_mission():
+    global _STATE, _CUR_GATE_IDX, _TARGET_TAG_ID, _DET_STREAK
+    global _LAST_SEEN_TIME, _GATE_START_TIME, _MISSION_START, _prev_t, _PID
+    global _LAST_SIZE, _TRACK_FRAME, _TRACK_T, _LAST_TAG_ID, _RC_LAST_T, _SEARCH_PLAN, _DR, _ACQ_TIME, _LAYOUT, _PASS_T0
 
     _STATE = "ACQUIRE"
     _CUR_GATE_IDX = 0
     _TARGET_TAG_ID = GATE_SEQUENCE[_CUR_GATE_IDX]
-    _LAST_SEEN_TIME = time.time()
-    _GATE_START_TIME = time.time()
-    _MISSION_START = time.time()
-    det_streak = 0
+    _LAST_SEEN_TIME = clock()
+    _GATE_START_TIME = clock()
+    _MISSION_START = clock()
+    _DET_STREAK = 0
+    _prev_t = clock()
+    _PID = make_pid()
+    _STORE.clear()
+    _KF.clear()
+    _TRACKS.clear()
+    _TRACK_FRAME = 0
+    _TRACK_T = None
+    _LAST_SIZE = (0.0, 0.0)
+    _LAST_TAG_ID = None
+    _GATE_LOG.clear()
+    _RC_LOG.clear()
+    _RC_LAST_T = None
+    _MOTION.clear()
+    _ACQ_TIME = None
+    _PASS_T0 = None
+    _LAYOUT = None
+    _DR = None
+    if _MAP is not None:
+        _DR = DeadReckoner(_MAP, RC_SPEED, RC_YAW_RATE, blend=DR_BLEND)
+        _DR.reset(clock())
+    _SEARCH_PLAN = make_search_plan()
     reset_search()
 
-    while True:
-        ok, frame = read_frame()
-        if not ok:
-            print("Camera/Stream ended.")
-            break
-
-        t_total = time.time() - _MISSION_START
-        t_gate  = time.time() - _GATE_START_TIME
+def _next_gate():
+    global _STATE, _CUR_GATE_IDX, _TARGET_TAG_ID, _GATE_START_TIME, _DET_STREAK, _ACQ_TIME, _PASS_T0
+
+    _GATE_LOG.append({"id": GATE_SEQUENCE[_CUR_GATE_IDX],
+                      "t_start": _GATE_START_TIME - _MISSION_START,
+                      "t_pass": clock() - _MISSION_START,
+                      "acquire": _ACQ_TIME})
+    _ACQ_TIME = None
+    _PASS_T0 = None
+    _CUR_GATE_IDX += 1
+    if _CUR_GATE_IDX >= len(GATE_SEQUENCE):
+        _STATE = "DONE"
+    else:
+        _TARGET_TAG_ID = GATE_SEQUENCE[_CUR_GATE_IDX]
+        _STATE = "ACQUIRE"
+        _GATE_START_TIME = clock()
+        _DET_STREAK = 0
+        reset_search()
+
+@PROFILER.timed("fsm")
+def fsm_step(tag, new=True):
+    # One FSM tick on the chosen gate tag (or None). Returns rc, t_gate, t_total.
+    # new=False: tag comes from a frame an earlier tick already used (fixed-rate
+    # control), so it does not count towards the detection streak.
+    global _STATE, _LAST_SEEN_TIME, _GATE_START_TIME, _DET_STREAK, _LAST_TAG_ID, _ACQ_TIME, _PASS_T0
+
+    t_total = clock() - _MISSION_START
+    t_gate  = clock() - _GATE_START_TIME
 
-        dets = detect_tags(frame)
-        tag, det_mode = pick_gate(dets, _TARGET_TAG_ID)
+    if tag:
+        if new:
+            _DET_STREAK += 1
+            _LAST_SEEN_TIME = clock()
+        _LAST_TAG_ID = tag["id"]
+        if _ACQ_TIME is None and is_target(tag):
+            _ACQ_TIME = clock() - _GATE_START_TIME
+        if new and _DR is not None:
+            _DR.observe(tag["id"], np.asarray(tag["t_cm"]) / TO_CM, math.radians(tag["rpy"][1]), clock())
+        tag = predicted_tag(tag["id"], tag)
+    elif new:
+        _DET_STREAK = max(0, _DET_STREAK - 1)
+
+    rc = (0, 0, 0, 0)
+
+    # --- Mission time bound ---
+    if t_total > GLOBAL_DEADLINE:
+        _STATE = "STOP"
+        return rc, t_gate, t_total
+
+    # --- Telemetry safety: low battery stops, a stale link holds a hover ---
+    battery = get_battery()
+    if _USE_TELLO and battery is not None and battery < BATTERY_MIN:
+        _STATE = "STOP"
+        return rc, t_gate, t_total
+    if telemetry_stale():
+        return rc, t_gate, t_total
+
+    # --- Per-gate deadline fallback ---
+    if t_gate > PER_GATE_DEADLINE:
+        _STATE = "ACQUIRE"   # 
+        _GATE_START_TIME = clock()
+        reset_search()
+
+    # --- 7s no detection → search ---
+    if (clock() - _LAST_SEEN_TIME) > SEARCH_TRIGGER:
+        if _STATE != "PROCEED":   
+            _STATE = "ACQUIRE"
+
+    # ---------------- FSM ----------------
+    if _STATE == "ACQUIRE":
+    
+        # with a map, the predicted bearing beats aligning on some other gate's tag
+        if tag and (_DR is None or is_target(tag)):
+            _STATE = "ALIGN"
+        else:
+            rc = map_rc() or search_rc()
 
+    elif _STATE == "ALIGN":
         if tag:
-            det_streak += 1
-            _LAST_SEEN_TIME = time.time()
+            lr, fb, ud, yaw, (ex, ey, tz) = compute_rc_from_error(tag)
+
+            fb = int(0.6 * fb)
+            rc = (lr, fb, ud, yaw)
+
+            passed, why = should_pass(tag, _DET_STREAK)
+            if passed:
+                _STATE = "PROCEED"
         else:
-            det_streak = max(0, det_streak - 1)
+            rc = search_rc()
+
+    elif _STATE == "PROCEED" and _PASS_T0 is not None:
+        # inside PASS_CUTOFF the tag leaves view over the opening: straight through
+        rc = (0, PROCEED_FWD, 0, 0)
+        if clock() - _PASS_T0 > PASS_TIME:
+            _next_gate()
+
+    elif _STATE == "PROCEED":
+        if not tag:
+            # bridge the detection gap on the filter's prediction
+            tag = predicted_tag(_LAST_TAG_ID, max_age=KF_COAST)
+        if tag:
+            lr, fb, ud, yaw, (ex, ey, tz) = compute_rc_from_error(tag)
 
-        rc = (0, 0, 0, 0)
+            # the distance loop wants to hold APPROACH_DIST; PROCEED has to fly through
+            fb = clamp(max(int(fb * 1.2), PROCEED_FWD), -MAX_FWD, MAX_FWD)
+            rc = (lr, fb, ud, yaw)
+            if tz < PASS_CUTOFF:
+                _PASS_T0 = clock()
+        else:
+        
+            rc = (0, PROCEED_FWD, 0, 0)
 
-        # --- Mission time bound ---
-        if t_total > GLOBAL_DEADLINE:
-            _STATE = "STOP"
-            rc = (0, 0, 0, 0)
-            if _USE_TELLO:
-                _TELLO.send_rc_control(0,0,0,0)
-            draw_hud(frame, _STATE, _TARGET_TAG_ID, tag, rc, det_mode, _CUR_GATE_IDX, t_gate, t_total, det_streak)
-            cv2.imshow("RACE", frame)
-            key = cv2.waitKey(1) & 0xFF
-            if key == ord('q'): break
-            continue
+            if (clock() - _LAST_SEEN_TIME) > 0.8:
+                _next_gate()
 
-        # --- Per-gate deadline fallback ---
-        if t_gate > PER_GATE_DEADLINE:
-            _STATE = "ACQUIRE"   # 
-            _GATE_START_TIME = time.time()
-            reset_search()
+    elif _STATE in ("DONE", "STOP"):
+        rc = (0, 0, 0, 0)
 
-        # --- 7s no detection → search ---
-        if (time.time() - _LAST_SEEN_TIME) > SEARCH_TRIGGER:
-            if _STATE != "PROCEED":   
-                _STATE = "ACQUIRE"
+    return rc, t_gate, t_total
+
+# -------------------------- Tuning --------------------------
+
+def load_tuning(path):
+    # Apply the technical_fira section of a tuner.py file to the config above.
+    from tuner import read_tuning
+    params = read_tuning(path, "technical_fira").get("params", {})
+    unknown = [k for k in params if not (k.isupper() and k in globals())]
+    if unknown:
+        raise KeyError(f"unknown settings in {path}: {unknown}")
+    globals().update(params)
+    return params
+
+# ------------------------ Simulation ------------------------
+
+def run_sim_mission(sim, sensor, fps=30.0, on_step=None):
+    # One mission closed-loop against a simulated drone (dronesim.TelloSim) on
+    # simulated time: each step the FSM's rc drives sim and sensor.observe()
+    # sees the result, either a DET_DTYPE batch (geometry) or a BGR frame that
+    # goes through detect_tags. on_step(t, sim) returning True ends it early.
+    global _CLOCK, _USE_TELLO, _TELLO, _REPLAY
+    saved = _CLOCK, _USE_TELLO, _TELLO, _REPLAY
+    _CLOCK, _USE_TELLO, _TELLO, _REPLAY = SimClock(fps), True, sim, False
+    try:
+        reset_mission()
+        steps = 0
+        while _STATE not in ("DONE", "STOP"):
+            _CLOCK.tick()
+            sim.step(_CLOCK.dt)
+            obs = sensor.observe(sim.pos, sim.yaw)
+            dets = dets_from_batch(obs) if obs.dtype == tagdet.DET_DTYPE else detect_tags(obs)
+            tag, _ = pick_gate(dets, _TARGET_TAG_ID)
+            rc, _, _ = fsm_step(tag)
+            rc_send(*rc)
+            steps += 1
+            if on_step is not None and on_step(clock() - _MISSION_START, sim):
+                break
+        return {"state": _STATE, "t": clock() - _MISSION_START, "steps": steps, "gates": list(_GATE_LOG)}
+    finally:
+        _CLOCK, _USE_TELLO, _TELLO, _REPLAY = saved
+
+_STATS = {name: StageStats(name) for name in ("grab", "detect", "control", "hud", "e2e", "rc_period", "late")}
+_QUEUES = []
+
+def pipeline_stats():
+    # Per-stage latency summaries (ms) and per-queue drop counters.
+    return {
+        "stages": {name: s.summary() for name, s in _STATS.items()},
+        "queues": {q.name: {"puts": q.puts, "drops": q.drops} for q in _QUEUES},
+    }
+
+# ------------------ Fixed-rate control ----------------------
+
+def age_compensated(tag, t_meas, new):
+    # tag as expected at command time clock(), t_meas being when its frame was
+    # captured. Kalman mode needs nothing here (fsm_step predicts to clock());
+    # EMA mode extrapolates with the velocity between the tag's last two fresh
+    # measurements.
+    if tag is None or TAG_FILTER == "kalman":
+        return tag
+    tid, t_cm = tag["id"], np.asarray(tag["t_cm"], dtype=float)
+    if new:
+        prev = _MOTION.get(tid)
+        vel = np.zeros(3)
+        if prev is not None and 0.0 < t_meas - prev[0] <= CONTROL_MAX_AGE:
+            vel = (t_cm - prev[1]) / (t_meas - prev[0])
+        _MOTION[tid] = (t_meas, t_cm, vel)
+    m = _MOTION.get(tid)
+    age = clock() - t_meas
+    if m is None or m[0] != t_meas or age <= 0.0:
+        return tag
+    t = t_cm + m[2] * age
+    c = _project(t)
+    if c is None:
+        return tag
+    return dict(tag, t_cm=t, center=(int(c[0]), int(c[1])))
+
+def frame_age(fr):
+    # seconds since fr was captured (received, for UdpVideoSource); 0 on replays,
+    # whose frames are stamped when read
+    return 0.0 if _REPLAY else time.perf_counter() - fr.ts
+
+def control_tick(item, new):
+    # One control step on the newest detection result item = (fr, dets, t_det, t_meas);
+    # new=False re-uses a result an earlier tick has seen.
+    fr, dets, t_det, t_meas = item
+    tag, det_mode = pick_gate(dets, _TARGET_TAG_ID)
+    if tag is not None and clock() - t_meas > CONTROL_MAX_AGE:
+        tag, det_mode = None, "STALE"
+    tag = age_compensated(tag, t_meas, new)
+    rc, t_gate, t_total = fsm_step(tag, new)
+    rc_send(*rc)
+    return tag, det_mode, rc, t_gate, t_total
+
+def log_step(fr, dets, rc, det_s, loop_s):
+    if _FLOG is not None:
+        with PROFILER.span("log"):
+            _FLOG.record(clock() - _MISSION_START, fr.fid, _STATE, _TARGET_TAG_ID, dets, rc,
+                         det_s * 1000.0, get_battery(), loop_s * 1000.0)
+
+def _dump_profile(*_):
+    print("[Profile]\n" + PROFILER.format(), flush=True)
 
-        # ---------------- FSM ----------------
-        if _STATE == "ACQUIRE":
-        
-            if tag:
-                _STATE = "ALIGN"
-            else:
-                rc = search_rc()
-
-        elif _STATE == "ALIGN":
-            if tag:
-                lr, fb, ud, yaw, (ex, ey, tz) = compute_rc_from_error(tag)
-
-                fb = int(0.6 * fb)
-                rc = (lr, fb, ud, yaw)
-
-                passed, why = should_pass(tag, det_streak)
-                if passed:
-                    _STATE = "PROCEED"
-            else:
-                rc = search_rc()
-
-        elif _STATE == "PROCEED":
-            if tag:
-                lr, fb, ud, yaw, (ex, ey, tz) = compute_rc_from_error(tag)
-
-                fb = clamp(int(fb * 1.2), -MAX_FWD, MAX_FWD)
-                rc = (lr, fb, ud, yaw)
-                if tz < PASS_CUTOFF:
-
-                    _CUR_GATE_IDX += 1
-                    if _CUR_GATE_IDX >= len(GATE_SEQUENCE):
-                        _STATE = "DONE"
-                    else:
-                        _TARGET_TAG_ID = GATE_SEQUENCE[_CUR_GATE_IDX]
-                        _STATE = "ACQUIRE"
-                        _GATE_START_TIME = time.time()
-                        det_streak = 0
-                        reset_search()
-            else:
-            
-                rc = (0, 40, 0, 0)
-    
-                if (time.time() - _LAST_SEEN_TIME) > 0.8:
-                    _CUR_GATE_IDX += 1
-                    if _CUR_GATE_IDX >= len(GATE_SEQUENCE):
-                        _STATE = "DONE"
-                    else:
-                        _TARGET_TAG_ID = GATE_SEQUENCE[_CUR_GATE_IDX]
-                        _STATE = "ACQUIRE"
-                        _GATE_START_TIME = time.time()
-                        det_streak = 0
-                        reset_search()
-
-        elif _STATE == "DONE":
-            rc = (0, 0, 0, 0)
-            if _USE_TELLO:
-                _TELLO.send_rc_control(0,0,0,0)
-            cv2.putText(frame, "MISSION COMPLETED", (int(FRAME_W*0.28), int(FRAME_H*0.55)),
-                        cv2.FONT_HERSHEY_DUPLEX, 1.0, (0,255,0), 2)
-
-        elif _STATE == "STOP":
-            rc = (0, 0, 0, 0)
+def main_loop(args):
+    global _FLOG
+    if args.profile:
+        PROFILER.enabled = True
+        if hasattr(signal, "SIGUSR1"):
+            signal.signal(signal.SIGUSR1, _dump_profile)    # kill -USR1 <pid>: dump now
+    open_source(args)
+    reset_mission()
+    if args.log:
+        _FLOG = FlightRecorder(args.log, FSM_STATES, attrs={"mode": args.mode, "replay": args.replay,
+                                                             "gates": GATE_SEQUENCE})
+
+    t0 = time.perf_counter()
+    if (args.pipeline or CONTROL_HZ > 0) and not _REPLAY:
+        run_pipeline(args)
+    else:
+        # replay stays on one thread so the run is deterministic
+        run_serial(args)
+    wall = time.perf_counter() - t0
+
+    print("[Stats]\n" + format_stats(_STATS, _QUEUES))
+    if PROFILER.enabled:
+        _dump_profile()
+    if _REPLAY:
+        write_replay_report(args, wall)
+    if _FLOG is not None:
+        if PROFILER.enabled:
+            _FLOG.attrs["profile"] = PROFILER.summary()
+        _FLOG.close()
+        print(f"[Log] {_FLOG.rows} records -> {args.log}")
+    close_source()
+
+_DET_MS = []
+
+def _hud_state(tag, rc, det_mode, t_gate, t_total, det_s, e2e_s):
+    # Small, immutable snapshot for the HUD thread: no live globals cross over.
+    return (_STATE, _TARGET_TAG_ID, tag, rc, det_mode, _CUR_GATE_IDX, t_gate, t_total, _DET_STREAK,
+            (det_s * 1000.0, e2e_s * 1000.0))
+
+def make_hud(args):
+    return HudRenderer(draw_hud, "RACE", args.hud_fps, _HEADLESS, _STATS["hud"])
+
+def run_serial(args):
+    # grab -> detect -> control one after the other on a worker thread; the HUD
+    # stays on the main thread (cv2.imshow is not thread-safe on all backends)
+    _DET_MS.clear()
+    stop = threading.Event()
+    hud = make_hud(args)
+    errors = []
+    th = threading.Thread(target=_serial_worker, args=(stop, hud, args, errors), daemon=True)
+    th.start()
+    try:
+        hud.run(stop)
+    finally:
+        stop.set()
+        th.join(timeout=2.0)
+        hud.stop()
+    if errors:
+        raise errors[0]
+
+def _serial_worker(stop, hud, args, errors):
+    try:
+        _serial_loop(stop, hud, args)
+    except BaseException as e:
+        errors.append(e)
+    finally:
+        stop.set()
+
+def _serial_loop(stop, hud, args):
+    # fixed-rate control under replay: ticks fall between frames on the simulated clock
+    sched = RateScheduler(CONTROL_HZ, clock=clock, stats=_STATS["late"]) if CONTROL_HZ > 0 and _REPLAY else None
+    while not (stop.is_set() or hud.quit.is_set()):
+        with Timer(_STATS["grab"]):
+            ok, fr = read_frame()
+        if not ok:
+            print("Camera/Stream ended.")
+            break
+        frame, t_cap = fr.bgr, fr.ts
+
+        t_det = time.perf_counter()
+        dets = detect_tags(frame, track=args.track, gray=fr.gray)
+        t_det = time.perf_counter() - t_det
+        _STATS["detect"].add(t_det)
+        _DET_MS.append(t_det * 1000.0)
+        if sched is None:
+            with Timer(_STATS["control"]):
+                tag, det_mode = pick_gate(dets, _TARGET_TAG_ID)
+                if tag is not None and frame_age(fr) > CONTROL_MAX_AGE:
+                    tag, det_mode = None, "STALE"
+                rc, t_gate, t_total = fsm_step(tag)
+                rc_send(*rc)
+            e2e = time.perf_counter() - t_cap
+            _STATS["e2e"].add(e2e)
+            log_step(fr, dets, rc, t_det, e2e)
+        else:
+            t_frame, new = clock(), True
+            tag, det_mode, rc, t_gate, t_total = None, "NONE", (0, 0, 0, 0), 0.0, 0.0
+            for deadline in sched.due(t_frame + _CLOCK.dt):
+                _CLOCK.t = deadline
+                with Timer(_STATS["control"]):
+                    tag, det_mode, rc, t_gate, t_total = control_tick((fr, dets, t_det, t_frame), new)
+                new = False
+                log_step(fr, dets, rc, t_det, time.perf_counter() - t_cap)
+            _CLOCK.t = t_frame
+            e2e = time.perf_counter() - t_cap
+
+        if _REPLAY and _STATE in ("DONE", "STOP"):
+            break
 
-    
-        rc_send(*rc)
+        # HUD: drawn and shown on the main thread
+        hud.submit(frame, _hud_state(tag, rc, det_mode, t_gate, t_total, t_det, e2e))
 
-        # HUD
-        draw_hud(frame, _STATE, _TARGET_TAG_ID, tag, rc, det_mode, _CUR_GATE_IDX, t_gate, t_total, det_streak)
+# ------------------- Pipelined main loop --------------------
+#
+# grabber -> q_frames -> detector worker(s) -> q_dets -> control -> HUD queue -> display
+# Every queue is latest-frame-wins: a slow stage drops stale frames instead of
+# building a backlog, so control always acts on the newest pose.
 
-        cv2.imshow("RACE", frame)
-        key = cv2.waitKey(1) & 0xFF
-        if key == ord('q'):
+def _grab_worker(stop, q_frames):
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        ok, fr = read_frame()
+        if not ok:
+            print("Camera/Stream ended.")
             break
-
-    if _USE_TELLO and _TELLO:
-        try:
-            _TELLO.send_rc_control(0,0,0,0)
-            # _TELLO.land()
-            _TELLO.streamoff()
-            _TELLO.end()
-        except:
-            pass
-    else:
-        _CAP.release()
-    cv2.destroyAllWindows()
+        _STATS["grab"].add(time.perf_counter() - t0)
+        q_frames.put(fr)
+    stop.set()
+
+def _detect_worker(stop, q_frames, q_dets, track, workers):
+    pool = make_detector_pool(workers)
+    while not stop.is_set():
+        item = q_frames.get(timeout=0.1)
+        if item is None:
+            continue
+        t0 = time.perf_counter()
+        dets = detect_tags(item.bgr, pool, track, item.gray)
+        t_det = time.perf_counter() - t0
+        _STATS["detect"].add(t_det)
+        # capture time on the mission clock, for age compensation
+        t_meas = clock() - (time.perf_counter() - item.ts)
+        q_dets.put((item, dets, t_det, t_meas))
+
+def _control_worker(stop, q_dets, hud):
+    while not stop.is_set():
+        item = q_dets.get(timeout=0.1)
+        if item is None:
+            continue
+        fr, dets, t_det, _ = item
+        with Timer(_STATS["control"]):
+            tag, det_mode = pick_gate(dets, _TARGET_TAG_ID)
+            if tag is not None and frame_age(fr) > CONTROL_MAX_AGE:
+                tag, det_mode = None, "STALE"
+            rc, t_gate, t_total = fsm_step(tag)
+            rc_send(*rc)
+        e2e = time.perf_counter() - fr.ts
+        _STATS["e2e"].add(e2e)
+        log_step(fr, dets, rc, t_det, e2e)
+        hud.submit(fr.bgr, _hud_state(tag, rc, det_mode, t_gate, t_total, t_det, e2e))
+
+def _scheduled_control_worker(stop, q_dets, hud):
+    # Commands at a fixed CONTROL_HZ on the newest detection result, whatever the
+    # frame / detection rate; a tick without a new result re-uses the last one.
+    sched = RateScheduler(CONTROL_HZ, stats=_STATS["late"])
+    last, last_fid, t_warn = None, -1, 0.0
+    while not stop.is_set():
+        _, late, skipped = sched.wait(stop)
+        if skipped and time.perf_counter() - t_warn > 1.0:
+            t_warn = time.perf_counter()
+            print(f"[Control] missed {skipped} deadline(s), {late * 1000.0:.1f}ms late ({sched.missed} total)")
+        item = q_dets.get(timeout=0)
+        new = item is not None and item[0].fid > last_fid
+        if new:
+            last, last_fid = item, item[0].fid
+        if last is None:
+            continue
+        with Timer(_STATS["control"]):
+            tag, det_mode, rc, t_gate, t_total = control_tick(last, new)
+        fr, dets, t_det, _ = last
+        e2e = time.perf_counter() - fr.ts
+        if new:
+            _STATS["e2e"].add(e2e)
+        log_step(fr, dets, rc, t_det, e2e)
+        hud.submit(fr.bgr, _hud_state(tag, rc, det_mode, t_gate, t_total, t_det, e2e))
+
+def run_pipeline(args):
+    global _QUEUES
+
+    stop = threading.Event()
+    q_frames = LatestQueue(1, "frames")
+    # keyed on frame id: with several detector workers results may arrive out of order
+    q_dets   = LatestQueue(1, "dets", key=lambda it: it[0].fid)
+    hud      = make_hud(args)
+    _QUEUES = [q_frames, q_dets, hud.queue]
+
+    threads = [threading.Thread(target=_grab_worker, args=(stop, q_frames), daemon=True)]
+    for _ in range(max(1, args.det_workers)):
+        threads.append(threading.Thread(target=_detect_worker, args=(stop, q_frames, q_dets, args.track, max(1, args.det_workers)), daemon=True))
+    control = _scheduled_control_worker if CONTROL_HZ > 0 else _control_worker
+    threads.append(threading.Thread(target=control, args=(stop, q_dets, hud), daemon=True))
+    for th in threads:
+        th.start()
+
+    # HUD / display stays on the main thread (cv2.imshow is not thread-safe on all backends)
+    hud.run(stop)
+
+    stop.set()
+    for q in _QUEUES:
+        q.close()
+    for th in threads:
+        th.join(timeout=1.0)
+
+# ------------------------ Benchmarks ------------------------
+
+def _load_frames(path, limit=None):
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while limit is None or len(frames) < limit:
+        ok, fr = cap.read()
+        if not ok: break
+        frames.append(cv2.resize(fr, (FRAME_W, FRAME_H)))
+    cap.release()
+    return frames
+
+def _percentiles(ms):
+    a = np.asarray(ms, dtype=float)
+    if a.size == 0:
+        return {"mean": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    return {"mean": float(a.mean()), "p50": float(np.percentile(a, 50)),
+            "p95": float(np.percentile(a, 95)), "p99": float(np.percentile(a, 99)),
+            "max": float(a.max())}
+
+def write_replay_report(args, wall):
+    frames = len(_DET_MS)
+    gates = [dict(g, duration=g["t_pass"] - g["t_start"]) for g in _GATE_LOG]
+    report = {
+        "source": args.replay,
+        "frames": frames,
+        "sim_fps": args.replay_fps,
+        "sim_time_s": clock() - _MISSION_START,
+        "wall_time_s": wall,
+        "fps": frames / wall if wall > 0 else 0.0,
+        "detect_ms": _percentiles(_DET_MS),
+        "gates_passed": len(gates),
+        "gates": gates,
+        "final_state": _STATE,
+        "rc": _RC_LOG,
+    }
+    out = args.report or "replay_report.json"
+    with open(out, "w") as f:
+        json.dump(report, f, indent=1)
+    print(f"[Replay] {frames} frames  {report['fps']:.1f} fps  gates {len(gates)}/{len(GATE_SEQUENCE)}"
+          f"  detect p50={report['detect_ms']['p50']:.1f}ms p99={report['detect_ms']['p99']:.1f}ms  -> {out}")
+
+def bench_detect(path, track=False):
+    # Headless detect_tags timing on a recorded video: fixed full-res vs adaptive decimation.
+    global DECIMATE_ADAPTIVE, _LAST_SIZE
+    frames = _load_frames(path)
+    if not frames:
+        print(f"[Bench] no frames in {path}")
+        return
+    for adaptive in (False, True):
+        DECIMATE_ADAPTIVE = adaptive
+        _LAST_SIZE = (0.0, 0.0)
+        _STORE.clear()
+        _TRACKS.clear()
+        ms, hit = [], 0
+        for fr in frames:
+            t0 = time.perf_counter()
+            dets = detect_tags(fr, track=track)
+            ms.append((time.perf_counter() - t0) * 1000.0)
+            hit += bool(dets)
+        p = _percentiles(ms)
+        print(f"[Bench] {'adaptive' if adaptive else 'full-res':<9} frames={len(frames)} hit={hit}  "
+              f"mean={p['mean']:.1f}ms  p50={p['p50']:.1f}ms  p99={p['p99']:.1f}ms  max={p['max']:.1f}ms")
+    DECIMATE_ADAPTIVE = True
+
+def bench_filter(path, fps=30.0, max_lag=15):
+    # EMA vs Kalman on a recording, replayed on a SimClock: for the most frequently
+    # seen tag, the lag (ms) at which the filtered err_x / tz best match the raw
+    # measurements -- i.e. how late a command reflects a change -- and frame-to-frame jitter.
+    global TAG_FILTER, _CLOCK
+    frames = _load_frames(path)
+    if not frames:
+        print(f"[Bench] no frames in {path}")
+        return
+    saved = TAG_FILTER, _CLOCK
+    for mode in ("ema", "kalman"):
+        TAG_FILTER = mode
+        _CLOCK = SimClock(fps)
+        reset_mission()
+        raw, flt = {}, {}
+        for i, fr in enumerate(frames):
+            _CLOCK.tick()
+            for d in detect_tags(fr):
+                pt = predicted_tag(d["id"], d)
+                raw.setdefault(d["id"], {})[i] = (d["t_raw"][0] / max(d["t_raw"][2], 1e-6), d["t_raw"][2])
+                flt.setdefault(d["id"], {})[i] = (pt["t_cm"][0] / max(pt["t_cm"][2], 1e-6), pt["t_cm"][2])
+        if not raw:
+            print(f"[Bench] filter {mode}: no detections")
+            continue
+        tid = max(raw, key=lambda k: len(raw[k]))
+        idx = sorted(raw[tid])
+        a = np.array([raw[tid][i] for i in idx]) * [FX, 1.0]      # err_x px, tz cm
+        b = np.array([flt[tid][i] for i in idx]) * [FX, 1.0]
+        scale = a.std(axis=0) + 1e-9
+        errs = [np.abs((b[k:] - a[:len(a) - k]) / scale).mean() for k in range(min(max_lag, len(a) - 1))]
+        lag = int(np.argmin(errs))
+        jitter = np.abs(np.diff(b, 2, axis=0)).mean(axis=0)
+        print(f"[Bench] filter {mode:<6} tag={tid} frames={len(idx)}  lag={lag * 1000.0 / fps:.0f}ms  "
+              f"jitter err_x={jitter[0]:.2f}px tz={jitter[1]:.2f}cm")
+    TAG_FILTER, _CLOCK = saved
+
+def bench_preprocess(path, n=200):
+    # Per-frame time and numpy allocation per preprocessing variant.
+    import tracemalloc
+
+    frames = [cv2.cvtColor(f, cv2.COLOR_BGR2GRAY) for f in _load_frames(path, n)]
+    if not frames:
+        print(f"[Bench] no frames in {path}")
+        return
+    h, w = frames[0].shape
+    rois = [(w//2 - 120, h//2 - 120, w//2 + 120, h//2 + 120)]
+
+    def legacy(gray):
+        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
+        g = clahe.apply(gray)
+        blur = cv2.GaussianBlur(g, (0,0), 1.0)
+        return cv2.addWeighted(g, 1.5, blur, -0.5, 0)
+
+    runs = [("legacy", legacy)]
+    for v in ("full", "auto", "roi", "raw"):
+        pre = Preprocessor(v)
+        runs.append((v, lambda g, pre=pre: pre.apply(g, rois)))
+
+    for name, fn in runs:
+        fn(frames[0])                       # warm-up / first allocation
+        ms = []
+        for g in frames:
+            t0 = time.perf_counter()
+            fn(g)
+            ms.append((time.perf_counter() - t0) * 1000.0)
+        tracemalloc.start()
+        for g in frames:
+            fn(g)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        p = _percentiles(ms)
+        print(f"[Bench] preproc {name:<7} mean={p['mean']:.2f}ms  p99={p['p99']:.2f}ms  "
+              f"peak_alloc={peak/1024:.0f}KiB")
+
+def bench_synth(fps=30.0, speeds=(2.5, 5.0, 10.0, 20.0), noise=0.0, track=False):
+    # Pose accuracy vs speed on the synthetic course: recall of the tags in view
+    # and raw translation error against ground truth (% of range), per flight speed.
+    global _LAST_SIZE
+    for speed in speeds:
+        src = synthetic_source(fps, speed, noise)
+        _LAST_SIZE = (0.0, 0.0)
+        _STORE.clear()
+        _TRACKS.clear()
+        ms, err, seen, hit = [], [], 0, 0
+        while True:
+            fr = src.read()
+            if fr is None: break
+            truth = src.truth["tags"]
+            t0 = time.perf_counter()
+            dets = detect_tags(fr.bgr, track=track, gray=fr.gray)
+            ms.append((time.perf_counter() - t0) * 1000.0)
+            seen += len(truth)
+            for d in dets:
+                if d["id"] not in truth: continue
+                t = truth[d["id"]][1] * TO_CM
+                err.append(100.0 * np.linalg.norm(d["t_raw"] - t) / np.linalg.norm(t))
+                hit += 1
+        p = _percentiles(ms)
+        e = _percentiles(err)
+        print(f"[Bench] synth speed={speed:<5} frames={len(ms)} recall={hit / max(seen, 1):.2f}  "
+              f"detect p50={p['p50']:.1f}ms p99={p['p99']:.1f}ms  "
+              f"t_err p50={e['p50']:.2f}% p95={e['p95']:.2f}%")
 
 # --------------------------- CLI ----------------------------
 
 if __name__ == "__main__":
+    # --tuning first, so the tuned settings become the defaults below and
+    # only options given explicitly override them
+    pre = argparse.ArgumentParser(add_help=False)
+    pre.add_argument("--tuning", type=str, default=TUNING_FILE)
+    tuning = pre.parse_known_args()[0].tuning
+    if tuning:
+        if not os.path.exists(tuning):
+            pre.error(f"--tuning {tuning}: no such file")
+        tuned = load_tuning(tuning)
+        print(f"[Tuning] {len(tuned)} settings from {tuning}: {', '.join(sorted(tuned))}")
+
     ap = argparse.ArgumentParser()
     ap.add_argument("--mode", choices=["webcam", "tello"], default="webcam",
                     help="Video source & control mode")
     ap.add_argument("--video", type=str, default=None,
-                    help="Optional video file path for replay/sim (webcam mode)")
+                    help="Optional video file path for replay/sim (webcam mode), or udp[:PORT] "
+                         "for a raw H.264 stream (tellovideo.py replay)")
+    ap.add_argument("--replay", type=str, default=None,
+                    help="Headless offline replay of a video file, frame directory or 'synth' "
+                         "(rendered gate course) on a simulated clock")
+    ap.add_argument("--replay-fps", type=float, default=30.0,
+                    help="Simulated frame rate for --replay")
+    ap.add_argument("--synth-speed", type=float, default=5.0,
+                    help="Flight speed of the synthetic course, tag sizes per second")
+    ap.add_argument("--synth-noise", type=float, default=0.0,
+                    help="Gaussian pixel noise sigma of synthetic frames")
+    ap.add_argument("--report", type=str, default=None,
+                    help="JSON report path for --replay (default replay_report.json)")
+    ap.add_argument("--log", type=str, default=None,
+                    help="Flight log directory: one columnar record per control step (see flightlog.py)")
+    ap.add_argument("--profile", action="store_true",
+                    help="Time each stage (p50/p95/p99); printed at exit, on SIGUSR1 and stored in --log")
+    ap.add_argument("--headless", action="store_true",
+                    help="No HUD window (nothing is drawn)")
+    ap.add_argument("--hud-fps", type=float, default=30.0,
+                    help="Cap on HUD redraws per second; extra frames are skipped")
+    ap.add_argument("--pipeline", action="store_true",
+                    help="Run grab/detect/control/HUD as separate threads with latest-frame-wins queues")
+    ap.add_argument("--det-workers", type=int, default=1,
+                    help="Number of detector threads in --pipeline mode")
+    ap.add_argument("--control-hz", type=float, default=CONTROL_HZ,
+                    help="Send RC at this fixed rate on the newest pose (0: once per processed frame)")
+    ap.add_argument("--track", action="store_true",
+                    help="Track known tags in padded ROIs; full-frame detection only to re-acquire")
+    ap.add_argument("--preproc", choices=["full", "auto", "roi", "raw"], default=PREPROC_VARIANT,
+                    help="Preprocessing variant before detection")
+    ap.add_argument("--bench-preproc", action="store_true",
+                    help="Benchmark preprocessing variants on --video and exit")
+    ap.add_argument("--filter", choices=["ema", "kalman"], default=TAG_FILTER,
+                    help="Tag translation filter")
+    ap.add_argument("--bench-filter", action="store_true",
+                    help="Benchmark EMA vs Kalman lag/jitter on --video and exit")
+    ap.add_argument("--bench-detect", action="store_true",
+                    help="Benchmark detect_tags on --video (full-res vs adaptive decimation) and exit")
+    ap.add_argument("--bench-synth", action="store_true",
+                    help="Benchmark detection recall / pose error vs speed on the synthetic course and exit")
+    ap.add_argument("--course", type=str, default=COURSE_MAP,
+                    help="Course map JSON (gatemap.py): aim ACQUIRE at the next gate's predicted bearing")
+    ap.add_argument("--tuning", type=str, default=TUNING_FILE,
+                    help="Apply a tuned settings file from tuner.py (simulator-tuned: check before flying)")
     args = ap.parse_args()
-    main_loop(args)
+    if (args.bench_detect or args.bench_preproc or args.bench_filter) and args.video is None:
+        ap.error("--bench-* options need --video")
+    PREPROC_VARIANT = args.preproc
+    if args.course:
+        load_course_map(args.course)
+    TAG_FILTER = args.filter
+    CONTROL_HZ = args.control_hz
+    if args.bench_synth:
+        bench_synth(args.replay_fps, noise=args.synth_noise, track=args.track)
+    elif args.bench_filter:
+        bench_filter(args.video)
+    elif args.bench_preproc:
+        bench_preprocess(args.video)
+    elif args.bench_detect:
+        bench_detect(args.video, args.track)
+    else:
+        main_loop(args)
@@ -0,0 +1,211 @@
+import math
+import socket
+import threading
+import time
+import argparse
+
+# Tello SDK state packets arrive on this UDP port, ~10 Hz:
+#   "pitch:0;roll:0;yaw:0;vgx:0;vgy:0;vgz:0;templ:60;temph:63;tof:10;h:0;bat:87;baro:12.3;time:0;agx:..;agy:..;agz:..;\r\n"
+TELLO_STATE_PORT = 8890
+
+def parse_state(packet):
+    out = {}
+    for item in packet.strip().split(";"):
+        if ":" not in item:
+            continue
+        k, v = item.split(":", 1)
+        try:
+            out[k] = int(v)
+        except ValueError:
+            try:
+                out[k] = float(v)
+            except ValueError:
+                out[k] = v
+    return out
+
+# ----------------------- Sources ----------------------------
+
+def tello_poller(tello):
+    # Poll a djitellopy Tello (its getters block on older versions)
+    def poll():
+        return {"bat": tello.get_battery(), "h": tello.get_height()}
+    return poll
+
+class StateListener:
+    """Reads Tello state packets from UDP; read() returns the newest parsed packet or None."""
+
+    def __init__(self, host="0.0.0.0", port=TELLO_STATE_PORT, timeout=0.5):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((host, port))
+        self.timeout = timeout
+        self.sock.settimeout(timeout)
+
+    def read(self):
+        # Wait for one packet, then drain the socket so the newest one wins.
+        try:
+            data, _ = self.sock.recvfrom(1024)
+        except socket.timeout:
+            return None
+        self.sock.setblocking(False)
+        try:
+            while True:
+                data, _ = self.sock.recvfrom(1024)
+        except (BlockingIOError, socket.error):
+            pass
+        finally:
+            self.sock.settimeout(self.timeout)
+        return parse_state(data.decode("ascii", "ignore"))
+
+    def close(self):
+        self.sock.close()
+
+# ---------------------- Telemetry ---------------------------
+
+class Telemetry:
+    """Background poller holding the latest value and timestamp of each field.
+
+    Control code calls get()/snapshot()/stale(), which never block on the drone.
+    `source` is a callable returning a dict of fields (or None when nothing new).
+    """
+
+    def __init__(self, source, rate_hz=5.0, stale_after=2.0, clock=time.monotonic):
+        self.source = source
+        self.period = 1.0 / rate_hz
+        self.stale_after = stale_after
+        self.clock = clock
+        self._vals = {}
+        self._ts = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._th = None
+        self.errors = 0
+
+    def start(self):
+        self._th = threading.Thread(target=self._run, daemon=True)
+        self._th.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._th:
+            self._th.join(timeout=2.0)
+
+    def _run(self):
+        while not self._stop.is_set():
+            t0 = self.clock()
+            try:
+                vals = self.source()
+            except Exception:
+                vals = None
+                self.errors += 1
+            if vals:
+                now = self.clock()
+                with self._lock:
+                    for k, v in vals.items():
+                        if v is None: continue
+                        self._vals[k] = v
+                        self._ts[k] = now
+            self._stop.wait(max(0.0, self.period - (self.clock() - t0)))
+
+    def get(self, name, default=None):
+        with self._lock:
+            return self._vals.get(name, default)
+
+    def age(self, name):
+        with self._lock:
+            ts = self._ts.get(name)
+        return float("inf") if ts is None else self.clock() - ts
+
+    def stale(self, name="bat"):
+        return self.age(name) > self.stale_after
+
+    def snapshot(self):
+        # {field: (value, age_s)}
+        now = self.clock()
+        with self._lock:
+            return {k: (v, now - self._ts[k]) for k, v in self._vals.items()}
+
+    def wait_ready(self, name="bat", timeout=5.0):
+        t_end = self.clock() + timeout
+        while self.clock() < t_end:
+            if self.get(name) is not None:
+                return True
+            time.sleep(0.05)
+        return False
+
+# ------------------- Fake Tello state -----------------------
+
+class FakeTelloState:
+    """Local stand-in for a Tello's state stream: sends packets to host:port.
+
+    Battery drains slowly and height follows a slow sine, so consumers see
+    changing values; pause()/resume() simulate a dropped link.
+    """
+
+    def __init__(self, host="127.0.0.1", port=TELLO_STATE_PORT, rate_hz=10.0, bat=90, drain_per_s=0.2):
+        self.addr = (host, port)
+        self.period = 1.0 / rate_hz
+        self.bat = float(bat)
+        self.drain = drain_per_s
+        self.h = 0
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._stop = threading.Event()
+        self._paused = threading.Event()
+        self._th = None
+
+    def packet(self, t):
+        return (f"pitch:0;roll:0;yaw:0;vgx:0;vgy:0;vgz:0;templ:60;temph:63;tof:{self.h + 10};"
+                f"h:{self.h};bat:{int(self.bat)};baro:0.00;time:{int(t)};agx:0.00;agy:0.00;agz:-1000.00;\r\n")
+
+    def start(self):
+        self._th = threading.Thread(target=self._run, daemon=True)
+        self._th.start()
+        return self
+
+    def _run(self):
+        t0 = time.monotonic()
+        while not self._stop.is_set():
+            t = time.monotonic() - t0
+            self.bat = max(0.0, self.bat - self.drain * self.period)
+            self.h = int(80 + 30 * math.sin(t / 3.0))
+            if not self._paused.is_set():
+                self.sock.sendto(self.packet(t).encode("ascii"), self.addr)
+            self._stop.wait(self.period)
+
+    def pause(self):
+        self._paused.set()
+
+    def resume(self):
+        self._paused.clear()
+
+    def stop(self):
+        self._stop.set()
+        if self._th:
+            self._th.join(timeout=2.0)
+        self.sock.close()
+
+# --------------------------- CLI ----------------------------
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Tello telemetry listener / fake state server")
+    ap.add_argument("--fake", action="store_true", help="Also run a local fake Tello state server")
+    ap.add_argument("--port", type=int, default=TELLO_STATE_PORT)
+    ap.add_argument("--rate", type=float, default=5.0, help="Telemetry poll rate (Hz)")
+    ap.add_argument("--seconds", type=float, default=5.0)
+    args = ap.parse_args()
+
+    fake = FakeTelloState(port=args.port).start() if args.fake else None
+    listener = StateListener(port=args.port)
+    tm = Telemetry(listener.read, rate_hz=args.rate).start()
+    t_end = time.monotonic() + args.seconds
+    while time.monotonic() < t_end:
+        t0 = time.perf_counter()
+        bat, h = tm.get("bat"), tm.get("h")
+        dt_us = (time.perf_counter() - t0) * 1e6
+        print(f"bat={bat} h={h} age={tm.age('bat'):.2f}s stale={tm.stale()} read={dt_us:.1f}us")
+        time.sleep(0.5)
+    tm.stop()
+    listener.close()
+    if fake:
+        fake.stop()
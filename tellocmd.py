@@ -0,0 +1,406 @@
+import time
+import queue
+import socket
+import asyncio
+import threading
+import argparse
+
+import numpy as np
+
+from pipeline import StageStats
+from telemetry import TELLO_STATE_PORT, FakeTelloState, parse_state
+
+# Tello SDK: text commands to 192.168.10.1:8889, answered "ok" / "error ..." / a
+# value on the sender's port, in order and untagged; "rc a b c d" is not answered.
+# Motion commands answer once the motion is done.
+TELLO_IP = "192.168.10.1"
+TELLO_CMD_PORT = 8889
+MOTIONS = ("takeoff", "land", "up", "down", "left", "right", "forward", "back", "cw", "ccw", "flip", "go")
+
+class TelloError(Exception):
+    pass
+
+class _Datagrams(asyncio.DatagramProtocol):
+    def __init__(self, on_packet):
+        self.on_packet = on_packet
+
+    def datagram_received(self, data, addr):
+        self.on_packet(data)
+
+# ----------------------- Client ---------------------------
+
+class TelloClient:
+    """asyncio client for the Tello SDK command channel.
+
+    send() runs one acknowledged command at a time (replies carry no id, so a
+    second one in flight could take the first one's answer) and records its
+    round trip per verb. RC is fire-and-forget: set_rc() only stores the
+    newest value, and a sender task puts out at most one "rc" per 1/rc_hz
+    tick, only when it changed or every `keepalive` s (the Tello lands after
+    15 s without commands). While a motion command is in flight rc is held
+    back, the drone would ignore it anyway. Battery / height come from the
+    state stream on state_port, so reading them never waits on the channel.
+    """
+
+    def __init__(self, host=TELLO_IP, port=TELLO_CMD_PORT, local_port=0, state_port=TELLO_STATE_PORT,
+                 rc_hz=20.0, keepalive=5.0, timeout=7.0, motion_timeout=20.0):
+        self.addr = (host, port)
+        self.local_port, self.state_port = local_port, state_port
+        self.period = 1.0 / rc_hz
+        self.keepalive = keepalive
+        self.timeout, self.motion_timeout = timeout, motion_timeout
+        self.state, self.state_t = {}, None
+        self.rtt = {}
+        self.rc_sets = self.rc_sent = self.timeouts = self.unsolicited = 0
+        self.motions = 0               # queued or in flight
+        self._mlock = threading.Lock()
+        self._rc, self._rc_last, self._rc_t = (0, 0, 0, 0), None, 0.0
+        self._pending = None
+        self._lock = None
+        self._transport = self._state_transport = self._rc_task = None
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        self._lock = asyncio.Lock()
+        self._transport, _ = await loop.create_datagram_endpoint(
+            lambda: _Datagrams(self._on_reply), local_addr=("0.0.0.0", self.local_port))
+        if self.state_port:
+            self._state_transport, _ = await loop.create_datagram_endpoint(
+                lambda: _Datagrams(self._on_state), local_addr=("0.0.0.0", self.state_port), reuse_port=True)
+        self._rc_task = asyncio.create_task(self._rc_loop())
+        return self
+
+    async def close(self):
+        if self._rc_task:
+            self._rc_task.cancel()
+        self._flush_rc(force=True)
+        for tr in (self._transport, self._state_transport):
+            if tr:
+                tr.close()
+
+    def _on_reply(self, data):
+        if self._pending is None or self._pending.done():
+            self.unsolicited += 1      # answer to a command that already timed out
+            return
+        self._pending.set_result(data.decode("utf-8", "ignore").strip())
+
+    def _on_state(self, data):
+        self.state = parse_state(data.decode("ascii", "ignore"))
+        self.state_t = time.monotonic()
+
+    async def send(self, cmd, timeout=None):
+        # -> reply text; TelloError on "error..." replies, asyncio.TimeoutError without one
+        verb = cmd.split()[0]
+        motion = verb in MOTIONS
+        timeout = timeout or (self.motion_timeout if motion else self.timeout)
+        async with self._lock:
+            self._pending = asyncio.get_running_loop().create_future()
+            t0 = time.perf_counter()
+            self._transport.sendto(cmd.encode("utf-8"), self.addr)
+            try:
+                reply = await asyncio.wait_for(self._pending, timeout)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                raise
+            finally:
+                self._pending = None
+            self.rtt.setdefault(verb, StageStats(verb)).add(time.perf_counter() - t0)
+        if reply.lower().startswith("error"):
+            raise TelloError(f"{cmd}: {reply}")
+        return reply
+
+    def hold(self, d):
+        # motions queued or in flight; rc stays back while > 0 (changed from any thread)
+        with self._mlock:
+            self.motions += d
+
+    async def motion(self, cmd, timeout=None):
+        self.hold(1)
+        try:
+            return await self.send(cmd, timeout)
+        finally:
+            self.hold(-1)
+
+    def set_rc(self, lr, fb, ud, yaw):
+        # any thread; only the newest value per tick goes out
+        self._rc = tuple(max(-100, min(100, int(v))) for v in (lr, fb, ud, yaw))
+        self.rc_sets += 1
+
+    def _flush_rc(self, force=False):
+        rc, now = self._rc, time.monotonic()
+        if force or rc != self._rc_last or now - self._rc_t >= self.keepalive:
+            self._transport.sendto(("rc %d %d %d %d" % rc).encode("ascii"), self.addr)
+            self._rc_last, self._rc_t = rc, now
+            self.rc_sent += 1
+
+    async def _rc_loop(self):
+        loop = asyncio.get_running_loop()
+        t_next = loop.time()
+        while True:
+            t_next += self.period
+            await asyncio.sleep(max(0.0, t_next - loop.time()))
+            if t_next < loop.time() - self.period:
+                t_next = loop.time()       # fell behind: skip ticks rather than burst
+            if not self.motions:
+                self._flush_rc()
+
+    def summary(self):
+        return {"rc_sets": self.rc_sets, "rc_sent": self.rc_sent, "timeouts": self.timeouts,
+                "unsolicited": self.unsolicited, "rtt": {k: s.summary() for k, s in self.rtt.items()}}
+
+# ---------------------- Thread front -----------------------
+
+class TelloLink:
+    """TelloClient on its own event-loop thread, with djitellopy's method names.
+
+    send_rc_control() never blocks; commands return concurrent.futures.Future
+    right away and run in call order (connect() waits for its "ok"). Motion
+    primitives (move_*, rotate_*, takeoff, land) hold rc back until they are
+    done; busy() says whether any is still queued or flying.
+    """
+
+    def __init__(self, **kw):
+        self.client = TelloClient(**kw)
+        self.loop = asyncio.new_event_loop()
+        self._th = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self._th.start()
+        self._run(self.client.start()).result()
+        self._futures = []
+
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def _track(self, fut):
+        self._futures = [f for f in self._futures if not f.done()] + [fut]
+        return fut
+
+    def send_command(self, cmd, timeout=None):
+        return self._track(self._run(self.client.send(cmd, timeout)))
+
+    def send_motion(self, cmd, timeout=None):
+        # counted as busy from this call on, before the loop thread picks it up
+        self.client.hold(1)
+        async def run():
+            try:
+                return await self.client.send(cmd, timeout)
+            finally:
+                self.client.hold(-1)
+        return self._track(self._run(run()))
+
+    def connect(self):
+        self.send_command("command").result()
+
+    def send_rc_control(self, lr, fb, ud, yaw):
+        self.client.set_rc(lr, fb, ud, yaw)
+
+    def busy(self):
+        return self.client.motions > 0
+
+    def takeoff(self):
+        return self.send_motion("takeoff")
+
+    def land(self):
+        return self.send_motion("land")
+
+    def move(self, direction, cm):
+        return self.send_motion(f"{direction} {int(cm)}")
+
+    def move_up(self, cm):
+        return self.move("up", cm)
+
+    def move_down(self, cm):
+        return self.move("down", cm)
+
+    def move_left(self, cm):
+        return self.move("left", cm)
+
+    def move_right(self, cm):
+        return self.move("right", cm)
+
+    def move_forward(self, cm):
+        return self.move("forward", cm)
+
+    def move_back(self, cm):
+        return self.move("back", cm)
+
+    def rotate_clockwise(self, deg):
+        return self.send_motion(f"cw {int(deg)}")
+
+    def rotate_counter_clockwise(self, deg):
+        return self.send_motion(f"ccw {int(deg)}")
+
+    def streamon(self):
+        return self.send_command("streamon")
+
+    def streamoff(self):
+        return self.send_command("streamoff")
+
+    def get_battery(self):
+        return self.client.state.get("bat")
+
+    def get_height(self):
+        return self.client.state.get("h")
+
+    def summary(self):
+        return self.client.summary()
+
+    def end(self, timeout=15.0):
+        # let queued commands (a final land / streamoff) finish, send the last rc, stop;
+        # a second call does nothing
+        if not self.loop.is_running():
+            return
+        t_end = time.monotonic() + timeout
+        for f in self._futures:
+            try:
+                f.result(max(0.0, t_end - time.monotonic()))
+            except Exception:
+                pass
+        self._run(self.client.close()).result(2.0)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._th.join(timeout=2.0)
+
+# ------------------- Fake Tello command port ---------------------
+
+class FakeTello:
+    """Local stand-in for a Tello's command port, plus its state stream.
+
+    Answers in order like the drone: "ok" after `latency` s, motions after
+    their flight time at `speed` cm/s / `turn_rate` deg/s, "battery?" /
+    "height?" with values; "rc" is logged (time, values) and not answered.
+    Replies are dropped with probability p_drop.
+    """
+
+    def __init__(self, host="127.0.0.1", port=TELLO_CMD_PORT, state_port=TELLO_STATE_PORT, latency=0.01,
+                 speed=100.0, turn_rate=90.0, p_drop=0.0, seed=0):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.sock.settimeout(0.2)
+        self.latency, self.speed, self.turn_rate, self.p_drop = latency, speed, turn_rate, p_drop
+        self.rng = np.random.default_rng(seed)
+        self.rc = []
+        self.commands = []
+        self.state = FakeTelloState(host, state_port) if state_port else None
+        self._todo = queue.Queue()
+        self._stop = threading.Event()
+        self._ths = []
+
+    def start(self):
+        self._ths = [threading.Thread(target=f, daemon=True) for f in (self._recv, self._answer)]
+        for th in self._ths:
+            th.start()
+        if self.state:
+            self.state.start()
+        return self
+
+    def _recv(self):
+        while not self._stop.is_set():
+            try:
+                data, addr = self.sock.recvfrom(1024)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            cmd = data.decode("utf-8", "ignore").strip()
+            if cmd.startswith("rc "):
+                self.rc.append((time.perf_counter(), tuple(int(v) for v in cmd.split()[1:5])))
+            else:
+                self._todo.put((cmd, addr))
+
+    def duration(self, cmd):
+        verb, *arg = cmd.split()
+        if verb in ("up", "down", "left", "right", "forward", "back"):
+            return int(arg[0]) / self.speed
+        if verb in ("cw", "ccw"):
+            return int(arg[0]) / self.turn_rate
+        return {"takeoff": 3.0, "land": 2.5}.get(verb, 0.0)
+
+    def reply(self, cmd):
+        verb = cmd.split()[0]
+        if verb == "battery?":
+            return str(int(self.state.bat) if self.state else 87)
+        if verb == "height?":
+            return f"{(self.state.h if self.state else 0) // 10}dm"
+        if verb in MOTIONS or verb in ("command", "streamon", "streamoff", "speed", "emergency"):
+            return "ok"
+        return "error Not joystick"
+
+    def _answer(self):
+        while not self._stop.is_set():
+            try:
+                cmd, addr = self._todo.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            self.commands.append((time.perf_counter(), cmd))
+            if self._stop.wait(self.latency + self.duration(cmd)):
+                break
+            if self.rng.random() >= self.p_drop:
+                self.sock.sendto(self.reply(cmd).encode("utf-8"), addr)
+
+    def stop(self):
+        self._stop.set()
+        for th in self._ths:
+            th.join(timeout=2.0)
+        self.sock.close()
+        if self.state:
+            self.state.stop()
+
+# ------------------------ Benchmark -------------------------
+
+def _blocking(cmd, addr, timeout=20.0):
+    # the synchronous way: send, then wait for the answer
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    s.settimeout(timeout)
+    t0 = time.perf_counter()
+    s.sendto(cmd.encode("utf-8"), addr)
+    s.recvfrom(1024)
+    s.close()
+    return time.perf_counter() - t0
+
+def bench(seconds=6.0, loop_hz=100.0, port=TELLO_CMD_PORT, state_port=TELLO_STATE_PORT):
+    # A 100 Hz control loop on a fake Tello: rc set every iteration, a
+    # "battery?" query every 0.5 s and up 45 + forward 120 queued at 1 s, none
+    # of it awaited. Reports loop stalls, rc coalescing and command RTT.
+    fake = FakeTello(port=port, state_port=state_port).start()
+    link = TelloLink(host="127.0.0.1", port=port, state_port=state_port)
+    link.connect()
+    period = 1.0 / loop_hz
+    steps, moves, t_q = [], None, 0.0
+    t0 = time.perf_counter()
+    t_next = t0
+    while (now := time.perf_counter()) - t0 < seconds:
+        s0 = time.perf_counter()
+        k = len(steps)
+        link.send_rc_control(int(40 * np.sin(k / 20.0)), 20, 0, k % 7)
+        if moves is None and now - t0 >= 1.0:
+            moves = (link.move_up(45), link.move_forward(120))
+        if now - t_q >= 0.5:
+            link.send_command("battery?")
+            t_q = now
+        steps.append(time.perf_counter() - s0)
+        t_next += period
+        time.sleep(max(0.0, t_next - time.perf_counter()))
+    done = [f.done() for f in moves]
+    s = link.summary()
+    link.end()
+    stall = _blocking("up 45", ("127.0.0.1", port))
+    fake.stop()
+
+    steps = 1000.0 * np.array(steps)
+    rc_t = np.array([t for t, _ in fake.rc])
+    print(f"[Cmd] {len(steps)} loop steps at {loop_hz:.0f} Hz: step p50={np.percentile(steps, 50):.3f}ms "
+          f"max={steps.max():.3f}ms  (a blocking up 45 holds the loop {stall:.2f}s)")
+    print(f"[Cmd] rc: {s['rc_sets']} set, {s['rc_sent']} sent ({s['rc_sets'] / max(1, s['rc_sent']):.1f}:1 coalesced), "
+          f"received at {len(rc_t) / (rc_t[-1] - rc_t[0]):.1f} Hz, longest gap {np.diff(rc_t).max():.2f}s "
+          f"(motions in flight)")
+    print(f"[Cmd] motions queued at 1s finished: {all(done)}  timeouts={s['timeouts']}")
+    for verb, st in s["rtt"].items():
+        print(f"[Cmd] rtt {verb:<9} n={st['n']:<3} p50={st['p50_ms']:7.1f}ms p95={st['p95_ms']:7.1f}ms")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="asyncio Tello command channel: benchmark against a fake Tello")
+    ap.add_argument("--seconds", type=float, default=6.0)
+    ap.add_argument("--hz", type=float, default=100.0, help="control loop rate")
+    ap.add_argument("--port", type=int, default=TELLO_CMD_PORT, help="fake Tello command port")
+    ap.add_argument("--state-port", type=int, default=TELLO_STATE_PORT)
+    args = ap.parse_args()
+    bench(args.seconds, args.hz, args.port, args.state_port)
@@ -0,0 +1,352 @@
+import time
+import socket
+import threading
+import argparse
+
+import numpy as np
+
+from frames import FrameSource
+from pipeline import StageStats
+
+# Optional deps
+try:
+    import av
+    _HAS_AV = True
+except ImportError:
+    _HAS_AV = False
+
+# After "streamon" the Tello sends raw H.264 (Annex B, no B-frames) to this UDP
+# port, each frame cut into 1460-byte datagrams: a shorter one closes the frame.
+TELLO_VIDEO_PORT = 11111
+TELLO_PACKET = 1460
+
+# ----------------------- H.264 framing ----------------------
+
+def nal_units(data):
+    # Annex B byte stream -> [NAL units, each with its start code]
+    starts = []
+    i = data.find(b"\x00\x00\x01")
+    while i >= 0:
+        starts.append(i - 1 if i > 0 and data[i - 1] == 0 else i)
+        i = data.find(b"\x00\x00\x01", i + 3)
+    return [data[a:b] for a, b in zip(starts, starts[1:] + [len(data)])]
+
+def _nal_type(nal):
+    # -> (nal_unit_type, first header byte after it)
+    k = nal.index(1) + 1
+    return nal[k] & 0x1F, nal[k + 1] if len(nal) > k + 1 else 0
+
+def access_units(data):
+    # Annex B byte stream -> [access units]: after a picture's slices, an
+    # AUD / SEI / SPS / PPS or a slice with first_mb_in_slice = 0 (top bit of
+    # its header set) starts the next unit
+    units, cur, pic = [], [], False
+    for nal in nal_units(data):
+        typ, head = _nal_type(nal)
+        if pic and (typ in (6, 7, 8, 9) or (typ in (1, 5) and head & 0x80)):
+            units.append(b"".join(cur))
+            cur, pic = [], False
+        cur.append(nal)
+        pic = pic or typ in (1, 5)
+    if cur:
+        units.append(b"".join(cur))
+    return units
+
+def has_picture(unit):
+    return any(_nal_type(n)[0] in (1, 5) for n in nal_units(unit))
+
+# ----------------------- Receiver ---------------------------
+
+class UdpVideoSource(FrameSource):
+    """Tello video straight off its UDP H.264 stream.
+
+    A receiver thread reassembles each frame from its datagrams and decodes it
+    (low-delay flags, slice threads only) as soon as the short closing
+    datagram is in, instead of waiting for the next frame to start the way a
+    stream parser does. Frames carry the arrival time of their first datagram
+    as Frame.ts (time.perf_counter()), so time.perf_counter() - fr.ts is the
+    frame's age. read() returns the newest decoded frame not read yet, older
+    ones are dropped; None after `timeout` s without one. index is the stream
+    position (decoded pictures so far) and decoded the decode-done time of the
+    last frame read.
+    """
+
+    def __init__(self, width, height, slots=8, host="0.0.0.0", port=TELLO_VIDEO_PORT, timeout=5.0,
+                 packet=TELLO_PACKET, record=None):
+        if not _HAS_AV:
+            raise RuntimeError("UdpVideoSource needs PyAV (pip install av)")
+        super().__init__(width, height, slots)
+        self.size = (width, height)
+        self.timeout = timeout
+        self.packet = packet
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+        self.sock.bind((host, port))
+        self.sock.settimeout(0.2)
+        self.codec = av.CodecContext.create("h264", "r")
+        self.codec.options = {"flags": "low_delay", "flags2": "fast"}
+        self.codec.thread_type = "SLICE"       # frame threads would hold frames back
+        self.record = open(record, "wb") if record else None   # raw stream, for UdpReplay
+        self.stats = {name: StageStats(name) for name in ("assemble", "decode", "wait")}
+        self.packets = self.frames = self.drops = self.errors = 0
+        self.index, self.decoded = -1, None
+        self._latest = None                     # (index, receive time, decoded time, bgr)
+        self._cv = threading.Condition()
+        self._stop = threading.Event()
+        self._th = threading.Thread(target=self._run, daemon=True)
+        self._th.start()
+
+    def _run(self):
+        buf, t_first = [], None
+        while not self._stop.is_set():
+            try:
+                data = self.sock.recv(65536)
+            except socket.timeout:
+                if buf:     # the closing datagram went missing
+                    self._decode(b"".join(buf), t_first)
+                    buf, t_first = [], None
+                continue
+            except OSError:
+                break
+            if t_first is None:
+                t_first = time.perf_counter()
+            self.packets += 1
+            if self.record is not None:
+                self.record.write(data)
+            buf.append(data)
+            if len(data) < self.packet:
+                self._decode(b"".join(buf), t_first)
+                buf, t_first = [], None
+
+    def _decode(self, unit, t_first):
+        t0 = time.perf_counter()
+        self.stats["assemble"].add(t0 - t_first)
+        try:
+            pics = self.codec.decode(av.Packet(unit))
+        except av.FFmpegError:
+            self.errors += 1    # lost datagrams; the decoder resyncs on a later frame
+            return
+        for pic in pics:
+            img = pic.to_ndarray(width=self.size[0], height=self.size[1], format="bgr24")
+            t1 = time.perf_counter()
+            self.stats["decode"].add(t1 - t0)
+            with self._cv:
+                if self._latest is not None and self._latest[0] > self.index:
+                    self.drops += 1
+                self._latest = (self.frames, t_first, t1, img)
+                self.frames += 1
+                self._cv.notify_all()
+
+    def read(self):
+        with self._cv:
+            fresh = lambda: self._stop.is_set() or (self._latest is not None and self._latest[0] > self.index)
+            if not self._cv.wait_for(fresh, self.timeout) or self._stop.is_set():
+                return None
+            self.index, ts, self.decoded, img = self._latest
+        self.stats["wait"].add(time.perf_counter() - self.decoded)
+        return self.ring.fill(img, ts=ts)
+
+    def summary(self):
+        return {"packets": self.packets, "frames": self.frames, "dropped": self.drops,
+                "errors": self.errors, "stages": {k: s.summary() for k, s in self.stats.items()}}
+
+    def close(self):
+        self._stop.set()
+        with self._cv:
+            self._cv.notify_all()
+        self._th.join(timeout=1.0)
+        self.sock.close()
+        if self.record is not None:
+            self.record.close()
+
+# ------------------ Local stand-in stream -------------------
+
+class UdpReplay:
+    """Local stand-in for a Tello's video: a captured Annex B H.264 file sent to
+    host:port one access unit per 1/fps s, cut into Tello-size datagrams.
+
+    sent[k] is when picture k's first datagram went out (time.perf_counter()),
+    the "glass" time of the replayed frame.
+    """
+
+    def __init__(self, path, host="127.0.0.1", port=TELLO_VIDEO_PORT, fps=30.0, packet=TELLO_PACKET, loop=False):
+        with open(path, "rb") as f:
+            self.units = access_units(f.read())
+        self.addr = (host, port)
+        self.period = 1.0 / fps
+        self.packet = packet
+        self.loop = loop
+        self.sent = []
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._stop = threading.Event()
+        self.done = threading.Event()
+        self._th = None
+
+    def start(self):
+        self._th = threading.Thread(target=self._run, daemon=True)
+        self._th.start()
+        return self
+
+    def _run(self):
+        t_next = time.perf_counter()
+        while not self._stop.is_set():
+            for unit in self.units:
+                pic = has_picture(unit)
+                if pic:
+                    if self._stop.wait(max(0.0, t_next - time.perf_counter())):
+                        break
+                    t_next += self.period
+                    self.sent.append(time.perf_counter())
+                for i in range(0, len(unit), self.packet):
+                    self.sock.sendto(unit[i:i + self.packet], self.addr)
+                if len(unit) % self.packet == 0:
+                    self.sock.sendto(b"", self.addr)     # a full last datagram: close the frame explicitly
+            if not self.loop:
+                break
+        self.done.set()
+
+    def stop(self):
+        self._stop.set()
+        if self._th:
+            self._th.join(timeout=2.0)
+        self.sock.close()
+
+def make_stream(video, out, fps=30.0, size=(960, 720), gop=30, limit=None):
+    # Encode a video file as a Tello-like raw H.264 stream (Baseline-style: no
+    # B-frames, SPS/PPS repeated at every IDR, one slice per frame) for UdpReplay
+    import cv2
+    cap = cv2.VideoCapture(video)
+    with av.open(out, "w", format="h264") as oc:
+        st = oc.add_stream("libx264", rate=int(round(fps)))
+        st.width, st.height, st.pix_fmt = size[0], size[1], "yuv420p"
+        st.options = {"preset": "ultrafast", "tune": "zerolatency", "bf": "0", "g": str(gop),
+                      "x264-params": "repeat-headers=1:sliced-threads=0"}
+        n = 0
+        while limit is None or n < limit:
+            ok, img = cap.read()
+            if not ok:
+                break
+            frame = av.VideoFrame.from_ndarray(cv2.resize(img, size), format="bgr24")
+            for p in st.encode(frame):
+                oc.mux(p)
+            n += 1
+        for p in st.encode():
+            oc.mux(p)
+    cap.release()
+    return n
+
+# ------------------------ Benchmark -------------------------
+
+def _container_reader(url, out, stop):
+    # djitellopy's get_frame_read(): av.open() on the UDP url, container.decode()
+    container = av.open(url, timeout=(5.0, None))
+    for _ in container.decode(video=0):
+        out.append(time.perf_counter())
+        if stop.is_set():
+            break
+    container.close()
+
+def _pct(a):
+    a = 1000.0 * np.asarray(a)
+    return f"p50={np.percentile(a, 50):6.1f}ms p95={np.percentile(a, 95):6.1f}ms p99={np.percentile(a, 99):6.1f}ms"
+
+def bench(path, fps=30.0, port=TELLO_VIDEO_PORT, seconds=20.0, warmup=5.0):
+    # Glass-to-command latency on a local replay of a captured stream (looped
+    # for `seconds`, the first `warmup` s left out): "glass" is when the replay
+    # sends a frame's first datagram, "command" when technical_fira has
+    # detected, picked a gate and stepped its FSM on it. The djitellopy-style
+    # container reader is timed on the same stream afterwards.
+    import technical_fira as tf
+    tf.reset_mission()
+
+    print(f"[Video] {path} replayed over UDP at {fps:.0f} fps for {seconds:.0f}s")
+    src = UdpVideoSource(tf.FRAME_W, tf.FRAME_H, tf.FRAME_SLOTS, port=port, timeout=1.0)
+    rep = UdpReplay(path, port=port, fps=fps, loop=True).start()
+    t_end = time.perf_counter() + seconds
+    rows = []
+    while time.perf_counter() < t_end:
+        fr = src.read()
+        if fr is None:
+            break
+        dets = tf.detect_tags(fr.bgr, gray=fr.gray)
+        tag, _ = tf.pick_gate(dets, tf._TARGET_TAG_ID)
+        tf.fsm_step(tag)
+        if tf._STATE in ("DONE", "STOP"):
+            tf.reset_mission()      # the clip loops, so does the mission
+        rows.append((src.index, fr.ts, src.decoded, time.perf_counter()))
+    rep.stop()
+    src.close()
+    s = src.summary()
+    sent = np.array(rep.sent)
+    k, recv, dec, cmd = np.array(rows).T
+    k = k.astype(int)
+    keep = sent[k] - sent[0] >= warmup
+    glass = sent[k]
+    print(f"[Video] {len(sent)} sent, {s['frames']} decoded, {len(k)} used, {s['dropped']} dropped, "
+          f"{s['errors']} decode errors")
+    print(f"[Video] glass->receive   {_pct((recv - glass)[keep])}")
+    for name in ("assemble", "decode", "wait"):
+        st = s["stages"][name]
+        print(f"[Video] {name:<15} p50={st['p50_ms']:6.1f}ms p95={st['p95_ms']:6.1f}ms p99={st['p99_ms']:6.1f}ms")
+    print(f"[Video] receive->command {_pct((cmd - recv)[keep])}")
+    print(f"[Video] glass->command   {_pct((cmd - glass)[keep])}")
+    print(f"[Video] glass->decoded   {_pct((dec - glass)[keep])}  (this receiver)")
+
+    # the container's parser hands frame k out once frame k+1 starts: frames
+    # still match the sent ones in order, the last one just never comes out
+    got, stop = [], threading.Event()
+    th = threading.Thread(target=_container_reader, args=(f"udp://@0.0.0.0:{port}", got, stop), daemon=True)
+    th.start()
+    time.sleep(0.5)
+    rep = UdpReplay(path, port=port, fps=fps, loop=True).start()
+    time.sleep(seconds)
+    rep.stop()
+    time.sleep(0.5)
+    stop.set()
+    sent = np.array(rep.sent)
+    n = min(len(got), len(sent))
+    lat = np.array(got[:n]) - sent[:n]
+    print(f"[Video] glass->decoded   {_pct(lat[sent[:n] - sent[0] >= warmup])}  "
+          f"(container reader, {len(got)}/{len(sent)} frames)")
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Tello UDP H.264 ingestion: record, replay, latency benchmark")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("record", help="save the raw stream arriving on the video port")
+    p.add_argument("out")
+    p.add_argument("--port", type=int, default=TELLO_VIDEO_PORT)
+    p.add_argument("--seconds", type=float, default=30.0)
+    p = sub.add_parser("encode", help="make a Tello-like raw H.264 stream from a video file")
+    p.add_argument("video")
+    p.add_argument("out")
+    p.add_argument("--fps", type=float, default=30.0)
+    p = sub.add_parser("replay", help="send a raw stream to a port like a Tello would")
+    p.add_argument("stream")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=TELLO_VIDEO_PORT)
+    p.add_argument("--fps", type=float, default=30.0)
+    p.add_argument("--loop", action="store_true")
+    p = sub.add_parser("bench", help="glass-to-command latency on a local replay")
+    p.add_argument("stream")
+    p.add_argument("--port", type=int, default=TELLO_VIDEO_PORT)
+    p.add_argument("--fps", type=float, default=30.0)
+    p.add_argument("--seconds", type=float, default=20.0)
+    args = ap.parse_args()
+
+    if args.cmd == "record":
+        src = UdpVideoSource(960, 720, port=args.port, record=args.out)
+        time.sleep(args.seconds)
+        src.close()
+        print(f"[Video] {src.packets} datagrams, {src.frames} frames -> {args.out}")
+    elif args.cmd == "encode":
+        print(f"[Video] {make_stream(args.video, args.out, args.fps)} frames -> {args.out}")
+    elif args.cmd == "replay":
+        rep = UdpReplay(args.stream, args.host, args.port, args.fps, loop=args.loop).start()
+        try:
+            rep.done.wait()
+        except KeyboardInterrupt:
+            pass
+        rep.stop()
+    else:
+        bench(args.stream, args.fps, args.port, args.seconds)
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+import dronesim
+import technical_fira as tf
+from gatepose import GateLayout, fuse
+
+GATE = tf.GATE_SEQUENCE[0]
+
+def gate_view(dist=1.5, seed=0):
+    # noise-free detections of GATE and its supports, straight in front of the gate tag
+    tags, _ = dronesim.random_course([GATE], tf.SUPPORT_TAGS, seed, lateral=0.0, height=0.0, turn=0.0)
+    gpos = tags[0][1]
+    sensor = dronesim.TagSensor(tags, tf.CAMERA, (tf.FRAME_W, tf.FRAME_H), px_noise=0.0,
+                                range_noise=0.0, p_drop=0.0, seed=seed)
+    return sensor.observe(gpos - (0.0, 0.0, dist), 0.0), gpos
+
+def test_from_supports_places_support_tags():
+    layout = GateLayout.from_supports({1: [2, 3]}, 0.2, [(-2.0, 0.0), (2.0, -2.0)])
+    gate, off = layout.lookup([1, 2, 3, 4, -1])
+    assert gate.tolist() == [1, 1, 1, -1, -1]
+    assert np.allclose(off[:3], [(0.0, 0.0, 0.0), (-0.4, 0.0, 0.0), (0.4, -0.4, 0.0)])
+
+def test_fuse_recovers_gate_pose_from_all_tags():
+    b, _ = gate_view()
+    layout = GateLayout.from_supports(tf.SUPPORT_TAGS, dronesim.TAG_SIZE, dronesim.SUPPORT_LAYOUT)
+    out, info = fuse(b, layout, tf.CAMERA, dronesim.TAG_SIZE)
+    assert info[GATE][0] == 1 + len(tf.SUPPORT_TAGS[GATE])
+    assert np.allclose(out["t"][out["id"] == GATE][0], b["t"][b["id"] == GATE][0], atol=1e-9)
+
+def test_fuse_without_layout_keeps_batch():
+    b, _ = gate_view()
+    out, info = fuse(b, GateLayout({}), tf.CAMERA, dronesim.TAG_SIZE)
+    assert info == {} and out is b
+
+# ALIGN -> PROCEED through fsm_step on a steady view 1.5 m out: a sharp fused
+# pose needs a streak over FUSE_STREAK, anything else one over 6
+
+@pytest.fixture
+def fira(monkeypatch):
+    monkeypatch.setattr(tf, "_CLOCK", tf.SimClock(30.0))
+    monkeypatch.setattr(tf, "TAG_SIZE_M", dronesim.TAG_SIZE)
+    monkeypatch.setattr(tf, "GATE_LAYOUT", dronesim.SUPPORT_LAYOUT)
+    tf.load_course_map(None)
+    yield tf
+    tf.reset_mission()
+
+def ticks_to_proceed(batch, limit=20):
+    tf.reset_mission()
+    tf._STATE = "ALIGN"
+    for k in range(1, limit + 1):
+        tf._CLOCK.tick()
+        tag, _ = tf.pick_gate(tf.dets_from_batch(batch), tf._TARGET_TAG_ID)
+        tf.fsm_step(tag)
+        if tf._STATE == "PROCEED":
+            return k
+    return None
+
+def test_sharp_fused_pose_finishes_align_after_fuse_streak(fira, monkeypatch):
+    monkeypatch.setattr(tf, "GATE_FUSION", True)
+    assert ticks_to_proceed(gate_view()[0]) == tf.FUSE_STREAK + 1
+
+@pytest.mark.parametrize("fusion, px_sigma", [(False, 1.0), (True, 4.0)])
+def test_single_or_uncertain_pose_needs_full_streak(fira, monkeypatch, fusion, px_sigma):
+    monkeypatch.setattr(tf, "GATE_FUSION", fusion)
+    monkeypatch.setattr(tf, "FUSE_PX_SIGMA", px_sigma)
+    assert ticks_to_proceed(gate_view()[0]) == 7
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from kalman import CVKalman
+
+def test_new_track_starts_at_measurement():
+    kf = CVKalman()
+    pos, vel = kf.update([4], [[10.0, -5.0, 100.0]], t=1.0)
+    assert np.allclose(pos, [[10.0, -5.0, 100.0]]) and np.allclose(vel, 0.0)
+
+def test_converges_to_constant_velocity():
+    kf = CVKalman(r=(0.01, 0.01, 0.01))
+    v = np.array([20.0, -10.0, -50.0])
+    for k in range(60):
+        t = 1.0 + k / 30.0
+        pos, vel = kf.update([1], [v * (t - 1.0)], t)
+    assert np.allclose(vel[0], v, atol=1.0)
+    p, pv, ok = kf.predict([1], t + 0.1)
+    assert ok[0]
+    assert np.allclose(p[0], pos[0] + 0.1 * v, atol=0.5)
+    # predict() leaves the state alone
+    assert kf.ts[1] == t
+
+def test_rows_are_independent_and_expire():
+    kf = CVKalman(ttl=0.5)
+    kf.update([1, 2], [[0, 0, 0], [50, 50, 50]], t=1.0)
+    kf.update([1], [[1, 0, 0]], t=1.1)
+    _, _, ok = kf.predict([1, 2, 3], 1.55)
+    assert ok.tolist() == [True, False, False]
+    # an expired track restarts at the measurement
+    pos, vel = kf.update([2], [[-7.0, 0.0, 0.0]], t=2.0)
+    assert np.allclose(pos, [[-7.0, 0.0, 0.0]]) and np.allclose(vel, 0.0)
+
+@pytest.mark.parametrize("mode", ["ema", "kalman"])
+def test_track_velocity_matches_tag_motion(monkeypatch, mode):
+    # ROI track velocity (px/frame) of a tag sliding 1 cm per frame at 1.5 m, under either filter
+    import technical_fira as tf
+    monkeypatch.setattr(tf, "TAG_FILTER", mode)
+    monkeypatch.setattr(tf, "_CLOCK", tf.SimClock(30.0))
+    tf.reset_mission()
+    for k in range(40):
+        tf._CLOCK.tick()
+        t = np.array([-40.0 + k, 0.0, 150.0])
+        c = tf._project(t)
+        sm, _ = tf.smooth_states(np.array([5]), t[None], np.zeros((1, 3)))
+        tf._update_tracks([{"id": 5, "t_cm": sm[0], "center": c, "corners": np.tile(c, (4, 1))}],
+                          True, np.array([5]))
+    true = tf._project(t + (1.0, 0.0, 0.0)) - c
+    assert np.allclose(tf._TRACKS[5]["vel"], true, atol=0.1)
+    tf.reset_mission()
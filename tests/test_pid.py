@@ -0,0 +1,46 @@
+import numpy as np
+
+from pid import MultiPID
+
+def clamp(x, lo, hi):
+    return max(lo, min(hi, x))
+
+def pid_step(err, prev_err, dt, kp, kd, limit):
+    # the scalar PD update technical_fira used before MultiPID
+    de = (err - prev_err) / max(dt, 1e-3)
+    u = kp*err + kd*de
+    return clamp(int(round(u)), -limit, limit), de
+
+GAINS = dict(kp=[0.018, 0.003, 0.003, 0.02], kd=[0.008, 0.0012, 0.0012, 0.006], limit=[70, 60, 60, 80])
+
+def test_matches_scalar_pid_step():
+    rng = np.random.default_rng(0)
+    pid = MultiPID(GAINS["kp"], kd=GAINS["kd"], limit=GAINS["limit"])
+    prev = [0.0] * 4
+    for _ in range(200):
+        err = rng.normal(0.0, 2000.0, 4)
+        dt = rng.uniform(0.0, 0.06)
+        u = np.round(pid.step(err, dt)).astype(int)
+        ref = [pid_step(e, p, dt, kp, kd, lim)[0]
+               for e, p, kp, kd, lim in zip(err, prev, GAINS["kp"], GAINS["kd"], GAINS["limit"])]
+        prev = list(err)
+        assert u.tolist() == ref
+
+def test_anti_windup_freezes_saturated_integral():
+    pid = MultiPID([1.0], ki=[10.0], limit=[5.0], i_limit=[100.0])
+    for _ in range(100):
+        pid.step([10.0], 0.1)
+    assert pid.u[0] == 5.0
+    assert pid.i_term[0] < 5.0
+    free = MultiPID([1.0], ki=[10.0], limit=[5.0], i_limit=[100.0], anti_windup=False)
+    for _ in range(100):
+        free.step([10.0], 0.1)
+    assert free.i_term[0] == 100.0
+
+def test_json_round_trip_keeps_state():
+    pid = MultiPID(GAINS["kp"], ki=0.01, kd=GAINS["kd"], limit=GAINS["limit"], d_tau=0.05)
+    for e in ([100, 50, -20, 30], [80, 40, -10, 20]):
+        pid.step(e, 0.033)
+    clone = MultiPID.from_json(pid.to_json())
+    err = [60, 30, -5, 10]
+    assert np.array_equal(pid.step(err, 0.033), clone.step(err, 0.033))
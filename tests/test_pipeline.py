@@ -0,0 +1,73 @@
+import threading
+
+from pipeline import LatestQueue
+
+def test_latest_wins_and_counts_drops():
+    q = LatestQueue(1, "q")
+    for i in range(5):
+        q.put(i)
+    assert q.get(timeout=0) == 4
+    assert (q.puts, q.drops) == (5, 4)
+    assert q.get(timeout=0) is None
+
+def test_get_discards_older_buffered_items():
+    q = LatestQueue(3, "q")
+    for i in range(3):
+        q.put(i)
+    assert q.get(timeout=0) == 2
+    assert q.drops == 2
+
+def test_keyed_queue_drops_out_of_order_results():
+    q = LatestQueue(1, "dets", key=lambda it: it)
+    q.put(5)
+    assert q.get(timeout=0) == 5
+    q.put(3)                       # a slower worker finishing an older frame
+    assert q.get(timeout=0) is None
+    q.put(7)
+    assert q.get(timeout=0) == 7
+    assert q.drops == 1
+
+def test_keyed_queue_keeps_newer_unconsumed_item():
+    q = LatestQueue(1, "dets", key=lambda it: it)
+    q.put(10)
+    q.put(9)                       # late result for an older frame
+    assert q.get(timeout=0) == 10
+    assert (q.puts, q.drops) == (2, 1)
+
+def test_close_wakes_blocked_get():
+    q = LatestQueue(1, "q")
+    out = []
+    th = threading.Thread(target=lambda: out.append(q.get(timeout=5.0)))
+    th.start()
+    q.close()
+    th.join(timeout=2.0)
+    assert out == [None] and q.closed
+
+def test_drop_count_exact_under_contention():
+    q = LatestQueue(1, "q")
+    n, producers = 2000, 4
+    got = []
+    stop = threading.Event()
+
+    def consume():
+        while not stop.is_set():
+            item = q.get(timeout=0.01)
+            if item is not None:
+                got.append(item)
+
+    def produce(k):
+        for i in range(n):
+            q.put((k, i))
+
+    c = threading.Thread(target=consume)
+    c.start()
+    ps = [threading.Thread(target=produce, args=(k,)) for k in range(producers)]
+    for p in ps:
+        p.start()
+    for p in ps:
+        p.join()
+    stop.set()
+    c.join()
+    leftover = q.get(timeout=0)
+    assert q.puts == n * producers
+    assert len(got) + q.drops + (leftover is not None) == q.puts
@@ -0,0 +1,29 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def replay(tmp_path, name):
+    out = tmp_path / f"{name}.json"
+    subprocess.run([sys.executable, "technical_fira.py", "--replay", "synth", "--report", str(out)],
+                   cwd=ROOT, check=True, capture_output=True, timeout=300)
+    with open(out) as f:
+        return json.load(f)
+
+def test_sim_clock_ticks_fixed_steps():
+    import technical_fira as tf
+    c = tf.SimClock(30.0)
+    for _ in range(30):
+        c.tick()
+    assert c() == pytest.approx(1.0)
+
+def test_synth_replay_is_deterministic(tmp_path):
+    a, b = replay(tmp_path, "a"), replay(tmp_path, "b")
+    assert a["rc"], "replay sent no commands"
+    assert a["rc"] == b["rc"]
+    assert a["final_state"] == b["final_state"]
+    assert a["gates"] == b["gates"]
@@ -0,0 +1,41 @@
+import numpy as np
+
+import search
+import technical_fira as tf
+
+def old_search_rc(t):
+    # The phase machine technical_fira flew before search.Plan: yaw sweep for
+    # 8 s, forward spiral for 6 s, then the box repeating.
+    if t < 8.0:
+        seg = int(t / tf.SWEEP_SEGMENT)
+        return (0, 0, 0, (-1 if seg % 2 == 0 else 1) * tf.YAW_SWEEP_RATE)
+    t -= 8.0
+    if t < 6.0:
+        seg = int(t / tf.SPIRAL_SEGMENT)
+        return (0, tf.SPIRAL_STEP_F, 0, (1 if seg % 2 == 0 else -1) * 25)
+    t -= 6.0
+    leg = int(t / tf.BOX_SEGMENT) % 4
+    return [(0, tf.BOX_STEP_F, 0, 0), (tf.BOX_STEP_LAT, 0, 0, 0),
+            (0, -tf.BOX_STEP_F, 0, 0), (-tf.BOX_STEP_LAT, 0, 0, 0)][leg]
+
+def test_default_plan_matches_old_sweep_spiral_box():
+    plan = tf.make_search_plan("sweep+spiral+box")
+    # sample mid-row, away from the leg boundaries both versions share
+    for t in (np.arange(4000) + 0.5) / 100.0:
+        assert plan.rc(t) == old_search_rc(t), t
+
+def test_plan_loops_and_hovers():
+    p = search.box(segment=1.0).compile(rate=10.0)
+    assert p.rc(0.5) == (0, 35, 0, 0)
+    assert p.rc(4.5) == search.HOVER
+    looped = search.yaw_sweep(segment=1.0, segments=2).compile(rate=10.0, loop=search.box(segment=1.0))
+    assert looped.rc(2.5) == (0, 35, 0, 0)
+    assert looped.rc(6.5) == (0, 35, 0, 0)
+    assert looped.rc(-1.0) == search.HOVER
+
+def test_budget_bounds_the_plan():
+    p = search.box().compile(loop=search.box()).bounded(2.0)
+    assert p.rc(1.0) != search.HOVER
+    assert p.rc(2.0) == search.HOVER
+    assert search.battery_budget(30.0, battery=20, reserve=15, drain=0.5) == 10.0
+    assert search.battery_budget(30.0) == 30.0
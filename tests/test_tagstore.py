@@ -0,0 +1,34 @@
+import numpy as np
+
+from tagstore import TagStore
+
+def test_put_gather_and_hits():
+    s = TagStore(ttl=1.0)
+    ids = np.array([3, 7])
+    s.put(ids, [[1, 2, 3], [4, 5, 6]], [[0, 0, 10], [0, 0, 20]], now=1.0)
+    s.put([3], [[2, 2, 2]], [[0, 0, 0]], now=1.1)
+    t, rpy, live = s.gather(np.array([3, 7, 9]))
+    assert live.tolist() == [True, True, False]
+    assert t[0].tolist() == [2, 2, 2] and t[2].tolist() == [0, 0, 0]
+    assert s.rows["hits"][[3, 7]].tolist() == [2, 1]
+
+def test_expire_clears_old_rows():
+    s = TagStore(ttl=0.5)
+    s.put([1], [[1, 1, 1]], [[0, 0, 0]], now=1.0)
+    s.put([2], [[1, 1, 1]], [[0, 0, 0]], now=1.4)
+    assert s.expire(1.6) == 1
+    assert s.get(1) is None and s.get(2) is not None
+    # a re-acquired tag starts counting hits again
+    s.put([1], [[0, 0, 0]], [[0, 0, 0]], now=1.7)
+    assert s.rows["hits"][1] == 1
+
+def test_mark_lookup_ignores_older_frames():
+    s = TagStore()
+    s.mark([5, 9, 5], seq=10)
+    assert s.lookup(5, 10) == 0            # a duplicated id keeps its first position
+    assert s.lookup(9, 10) == 1
+    s.mark([9], seq=8)                     # late result from an older frame
+    assert s.lookup(9, 10) == 1
+    assert s.lookup(9, 8) is None
+    assert s.lookup(4, 10) == -1
+    assert s.lookup(10_000, 10) == -1
@@ -0,0 +1,80 @@
+import socket
+import time
+
+import pytest
+
+import technical_fira as tf
+from telemetry import FakeTelloState, StateListener, Telemetry, parse_state
+
+def free_port():
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    s.bind(("127.0.0.1", 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+@pytest.fixture
+def link(request):
+    # FakeTelloState -> StateListener -> Telemetry on a free local port
+    bat = getattr(request, "param", 90)
+    port = free_port()
+    listener = StateListener("127.0.0.1", port, timeout=0.05)
+    fake = FakeTelloState(port=port, rate_hz=50.0, bat=bat).start()
+    telem = Telemetry(listener.read, rate_hz=50.0, stale_after=0.3).start()
+    assert telem.wait_ready(timeout=2.0)
+    yield fake, telem
+    telem.stop()
+    fake.stop()
+    listener.close()
+
+def test_parse_state():
+    s = parse_state("pitch:0;h:80;bat:87;baro:12.30;agz:-1000.00;\r\n")
+    assert s == {"pitch": 0, "h": 80, "bat": 87, "baro": 12.3, "agz": -1000.0}
+
+def test_values_arrive_and_stay_fresh(link):
+    fake, telem = link
+    assert 80 <= telem.get("bat") <= 90
+    assert telem.get("h") is not None
+    assert not telem.stale()
+    assert set(telem.snapshot()) >= {"bat", "h", "tof"}
+
+def test_goes_stale_when_link_drops(link):
+    fake, telem = link
+    fake.pause()
+    time.sleep(0.6)
+    assert telem.stale()
+    assert telem.get("bat") is not None          # last value kept
+    fake.resume()
+    time.sleep(0.3)
+    assert not telem.stale()
+
+def test_source_errors_are_counted():
+    def broken():
+        raise OSError("link down")
+    telem = Telemetry(broken, rate_hz=100.0, stale_after=0.1).start()
+    time.sleep(0.1)
+    telem.stop()
+    assert telem.errors > 0 and telem.stale()
+
+@pytest.fixture
+def fsm(monkeypatch, link):
+    fake, telem = link
+    monkeypatch.setattr(tf, "_USE_TELLO", True)
+    monkeypatch.setattr(tf, "_TELEM", telem)
+    tf.reset_mission()
+    monkeypatch.setattr(tf, "_STATE", "ACQUIRE")
+    return fake, telem
+
+def test_stale_telemetry_holds_a_hover(fsm):
+    fake, telem = fsm
+    fake.pause()
+    time.sleep(0.6)
+    rc, _, _ = tf.fsm_step(None)
+    assert rc == (0, 0, 0, 0)
+    assert tf._STATE == "ACQUIRE"
+
+@pytest.mark.parametrize("link", [10], indirect=True)
+def test_low_battery_stops(fsm):
+    rc, _, _ = tf.fsm_step(None)
+    assert rc == (0, 0, 0, 0)
+    assert tf._STATE == "STOP"
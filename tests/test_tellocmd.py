@@ -0,0 +1,123 @@
+import socket
+import time
+from concurrent.futures import TimeoutError as FutureTimeout
+
+import pytest
+
+from tellocmd import FakeTello, TelloError, TelloLink
+
+def free_port():
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    s.bind(("127.0.0.1", 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+@pytest.fixture
+def tello(request):
+    # FakeTello + TelloLink on free local ports; fake options via indirect params
+    opts = dict(latency=0.005, speed=200.0)
+    opts.update(getattr(request, "param", {}))
+    link_opts = {k: opts.pop(k) for k in ("rc_hz", "timeout", "keepalive") if k in opts}
+    port, state_port = free_port(), free_port()
+    fake = FakeTello(port=port, state_port=state_port, **opts).start()
+    link = TelloLink(host="127.0.0.1", port=port, state_port=state_port, **link_opts)
+    yield fake, link
+    link.end(timeout=5.0)
+    fake.stop()
+
+def wait_until(cond, timeout=2.0):
+    t_end = time.monotonic() + timeout
+    while time.monotonic() < t_end:
+        if cond():
+            return True
+        time.sleep(0.01)
+    return False
+
+def test_connect_and_rtt(tello):
+    fake, link = tello
+    link.connect()
+    assert link.send_command("battery?").result(2.0).isdigit()
+    s = link.summary()
+    assert s["rtt"]["command"]["n"] == 1 and s["rtt"]["battery?"]["n"] == 1
+    assert [c for _, c in fake.commands] == ["command", "battery?"]
+
+def test_state_stream_feeds_getters(tello):
+    fake, link = tello
+    assert wait_until(lambda: link.get_battery() is not None)
+    assert 0 < link.get_battery() <= 90
+    assert link.get_height() is not None
+
+@pytest.mark.parametrize("tello", [{"rc_hz": 20.0}], indirect=True)
+def test_rc_is_coalesced_to_the_send_rate(tello):
+    fake, link = tello
+    t0 = time.monotonic()
+    k = 0
+    while time.monotonic() - t0 < 0.5:
+        link.send_rc_control(k % 50, 10, 0, 0)         # 1 kHz from the control loop
+        k += 1
+        time.sleep(0.001)
+    link.send_rc_control(7, 8, 9, 10)
+    link.end(timeout=2.0)
+    s = link.summary()
+    assert s["rc_sets"] == k + 1
+    assert s["rc_sent"] <= 0.5 * 20 + 3                 # one per tick, plus the final flush
+    assert len(fake.rc) == s["rc_sent"]
+    assert fake.rc[-1][1] == (7, 8, 9, 10)              # latest value wins
+
+@pytest.mark.parametrize("tello", [{"rc_hz": 50.0, "keepalive": 10.0}], indirect=True)
+def test_unchanged_rc_is_not_resent(tello):
+    fake, link = tello
+    for _ in range(30):
+        link.send_rc_control(0, 20, 0, 0)
+        time.sleep(0.01)
+    assert wait_until(lambda: len(fake.rc) >= 1)
+    time.sleep(0.1)
+    assert len(fake.rc) == 1
+
+def test_rc_values_are_clamped(tello):
+    fake, link = tello
+    link.send_rc_control(150, -300, 12.7, 0)
+    assert wait_until(lambda: len(fake.rc) >= 1)
+    assert fake.rc[-1][1] == (100, -100, 12, 0)
+
+def test_motions_queue_in_order_and_hold_rc(tello):
+    fake, link = tello
+    link.connect()
+    t0 = time.perf_counter()
+    up, fwd = link.move_up(40), link.move_forward(60)     # 0.2 s + 0.3 s at 200 cm/s
+    assert time.perf_counter() - t0 < 0.05                # returned at once
+    assert link.busy()
+    n_rc = len(fake.rc)
+    link.send_rc_control(30, 0, 0, 0)                     # held back while flying
+    assert up.result(2.0) == "ok" and not fwd.done()
+    assert fwd.result(2.0) == "ok"
+    assert [c for _, c in fake.commands] == ["command", "up 40", "forward 60"]
+    t_done = fake.commands[-1][0] + 0.3
+    assert all(t >= t_done - 0.05 for t, _ in fake.rc[n_rc:])
+    assert wait_until(lambda: not link.busy())
+    assert wait_until(lambda: fake.rc and fake.rc[-1][1] == (30, 0, 0, 0))
+
+@pytest.mark.parametrize("tello", [{"p_drop": 1.0, "timeout": 0.2}], indirect=True)
+def test_unanswered_command_times_out(tello):
+    fake, link = tello
+    f = link.send_command("battery?")
+    with pytest.raises((TimeoutError, FutureTimeout)):
+        f.result(2.0)
+    assert link.summary()["timeouts"] == 1
+    # the channel stays usable: the next command is sent and times out on its own
+    with pytest.raises((TimeoutError, FutureTimeout)):
+        link.send_command("command").result(2.0)
+    assert [c for _, c in fake.commands] == ["battery?", "command"]
+
+@pytest.mark.parametrize("tello", [{"latency": 0.3, "timeout": 0.1}], indirect=True)
+def test_late_reply_is_not_taken_for_the_next_command(tello):
+    fake, link = tello
+    with pytest.raises((TimeoutError, FutureTimeout)):
+        link.send_command("battery?").result(2.0)
+    assert wait_until(lambda: link.summary()["unsolicited"] == 1)
+
+def test_error_reply_raises(tello):
+    fake, link = tello
+    with pytest.raises(TelloError):
+        link.send_command("bogus").result(2.0)
@@ -0,0 +1,194 @@
+import os
+import json
+import time
+import argparse
+import multiprocessing as mp
+
+import numpy as np
+
+import tagdet
+import dronesim
+
+# Search space: name -> (lo, hi, log scale)
+SPACE = {
+    "P_YAW": (0.005, 0.5, True),
+    "D_YAW": (0.0, 0.05, False),
+    "P_LAT": (0.0, 0.1, False),
+    "D_LAT": (0.0, 0.02, False),
+    "P_UP": (0.005, 0.5, True),
+    "D_UP": (0.0, 0.05, False),
+    "P_FWD": (0.01, 1.0, True),
+    "D_FWD": (0.0, 0.1, False),
+    "PX_TOL": (5, 80, False),
+    "APPROACH_DIST": (0, 250, False),
+    "PASS_CUTOFF": (5, 120, False),
+}
+INT_PARAMS = ("PX_TOL", "APPROACH_DIST", "PASS_CUTOFF")
+
+GATE_PENALTY = 15.0   # s of cost per gate not flown
+OVERSHOOT_W = 10.0    # s of cost per m of mean crossing offset from the gate center
+
+# ---------------------- Tuning file -------------------------
+
+def read_tuning(path, section):
+    # One controller's section of a tuning file ({} if the file or section is missing)
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f).get(section, {})
+
+def write_tuning(path, section, data):
+    # Replace one section, keeping the others; written atomically
+    doc = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            doc = json.load(f)
+    doc[section] = data
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(doc, f, indent=1)
+    os.replace(tmp, path)
+
+# ------------------------- Scoring --------------------------
+
+def mission_cost(r, deadline):
+    # Lower is better: mission time, the course left to fly (gates plus the
+    # uncovered part of the current leg), gates crossed outside their opening,
+    # and overshoot as the mean distance from the opening center at crossings.
+    off = [d for _, _, d in r["crossings"]]
+    over = float(np.mean(off)) if off else 0.0
+    missed = len(off) - r["flown"]
+    return (min(r["t"], deadline) + GATE_PENALTY * (r["n_gates"] - r["progress"] + missed)
+            + OVERSHOOT_W * over)
+
+def _cost_task(task):
+    seed, params, fps, world = task
+    r = dronesim.run_mission(seed, params, fps, False, world)
+    return mission_cost(r, dronesim.load_fira().GLOBAL_DEADLINE), r["flown"], r["t"]
+
+def decode(u, fixed=None):
+    # unit-cube point -> technical_fira settings
+    params = dict(fixed or {})
+    for x, (name, (lo, hi, log)) in zip(np.clip(u, 0.0, 1.0), SPACE.items()):
+        v = lo * (hi / lo) ** x if log else lo + x * (hi - lo)
+        params[name] = int(round(v)) if name in INT_PARAMS else round(float(v), 5)
+    # VERY_NEAR (PASS_CUTOFF) must not pre-empt the aligned pass (APPROACH_DIST)
+    params["PASS_CUTOFF"] = min(params["PASS_CUTOFF"], params["APPROACH_DIST"] - 1)
+    return params
+
+def encode(params):
+    u = []
+    for name, (lo, hi, log) in SPACE.items():
+        v = float(params[name])
+        u.append(np.log(v / lo) / np.log(hi / lo) if log else (v - lo) / (hi - lo))
+    return np.clip(u, 0.0, 1.0)
+
+class Evaluator:
+    """Scores parameter sets on a process pool: mean mission cost over seeds.
+
+    All candidates of one call see the same seeds (common random numbers),
+    so their differences are not course luck.
+    """
+
+    def __init__(self, workers=None, fps=30.0, world=None):
+        self.workers = workers or tagdet.default_threads()
+        self.fps, self.world = fps, world
+        self.pool = mp.Pool(self.workers) if self.workers > 1 else None
+        self.missions = 0
+
+    def __call__(self, param_sets, seeds):
+        tasks = [(s, p, self.fps, self.world) for p in param_sets for s in seeds]
+        if self.pool is None:
+            out = list(map(_cost_task, tasks))
+        else:
+            out = self.pool.map(_cost_task, tasks, chunksize=max(1, len(tasks) // (4 * self.workers)))
+        self.missions += len(tasks)
+        a = np.array(out).reshape(len(param_sets), len(seeds), 3)
+        return a[..., 0].mean(axis=1), a[..., 1].mean(axis=1), a[..., 2].mean(axis=1)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+
+# -------------------------- Search --------------------------
+
+def cem(evaluate, fixed=None, start=None, generations=12, population=24, elite=0.3, seeds=6,
+        smoothing=0.7, min_std=0.05, seed=0, log=print):
+    # Cross-entropy method in the unit cube: sample a Gaussian population
+    # around the middle of SPACE, refit mean / std to the elite fraction,
+    # repeat. `start` (the current settings) joins the first generation. Each
+    # generation draws fresh mission seeds; the incumbent is carried along and
+    # re-scored so a lucky draw does not stick. -> (best params, best cost, history)
+    rng = np.random.default_rng(seed)
+    mu = np.full(len(SPACE), 0.5)
+    std = np.full(len(SPACE), 0.3)
+    n_elite = max(2, int(population * elite))
+    best, hist = start, []
+    for g in range(generations):
+        pts = np.clip(mu + std * rng.standard_normal((population, len(SPACE))), 0.0, 1.0)
+        cands = [decode(u, fixed) for u in pts]
+        if best is not None:
+            cands[0] = best
+        gen_seeds = [int(s) for s in rng.integers(1 << 31, size=seeds)]
+        cost, flown, t = evaluate(cands, gen_seeds)
+        order = np.argsort(cost)
+        best = cands[order[0]]
+        elites = np.array([encode(cands[i]) for i in order[:n_elite]])
+        mu = smoothing * elites.mean(axis=0) + (1.0 - smoothing) * mu
+        std = np.maximum(smoothing * elites.std(axis=0) + (1.0 - smoothing) * std, min_std)
+        hist.append({"gen": g, "best": float(cost[order[0]]), "median": float(np.median(cost)),
+                     "flown": float(flown[order[0]]), "t": float(t[order[0]])})
+        log(f"[Tune] gen {g:2d}  best={cost[order[0]]:6.1f}  median={np.median(cost):6.1f}  "
+            f"gates={flown[order[0]]:.1f}  t={t[order[0]]:.1f}s  std={std.mean():.3f}")
+    return best, float(cost[order[0]]), hist
+
+def tune(out=None, generations=12, population=24, seeds=6, validate=64, workers=None,
+         fixed=None, fps=30.0, world=None, seed=0):
+    # Tune technical_fira against randomized simulated missions and store the
+    # winner (if it beats the current settings on held-out seeds) in `out`.
+    tf = dronesim.load_fira()
+    fixed = dict(fixed or {})
+    base = dict(fixed, **{k: dronesim.SIM_SETTINGS.get(k, getattr(tf, k)) for k in SPACE})
+    ev = Evaluator(workers, fps, world)
+    t0 = time.perf_counter()
+    try:
+        best, _, hist = cem(ev, fixed, base, generations, population, seeds=seeds, seed=seed)
+        held = list(range(10 ** 6, 10 ** 6 + validate))
+        cost, flown, t = ev([base, best], held)
+    finally:
+        ev.close()
+    wall = time.perf_counter() - t0
+    print(f"[Tune] {ev.missions} missions in {wall:.0f}s ({ev.missions / wall:.1f}/s)")
+    print(f"[Tune] held-out {validate} missions: current cost={cost[0]:.1f} gates={flown[0]:.2f}  "
+          f"tuned cost={cost[1]:.1f} gates={flown[1]:.2f} t={t[1]:.1f}s")
+    if out and cost[1] < cost[0]:
+        write_tuning(out, "technical_fira", {
+            "params": best, "cost": float(cost[1]), "baseline_cost": float(cost[0]),
+            "gates_flown": float(flown[1]), "validate": validate, "world": world or {},
+            "history": hist, "tuned_at": time.strftime("%Y-%m-%d %H:%M:%S")})
+        print(f"[Tune] -> {out}")
+    return best, cost
+
+# --------------------------- CLI ----------------------------
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Tune technical_fira gains / thresholds on simulated missions")
+    ap.add_argument("--out", default="fira_tuning.json", help="tuning file (technical_fira section is replaced)")
+    ap.add_argument("--generations", type=int, default=12)
+    ap.add_argument("--population", type=int, default=24)
+    ap.add_argument("--seeds", type=int, default=6, help="missions per candidate per generation")
+    ap.add_argument("--validate", type=int, default=64, help="held-out missions for the final comparison")
+    ap.add_argument("--workers", type=int, default=None, help="processes (default: all cores)")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--latency", type=float, default=0.1, help="simulated video latency (s)")
+    ap.add_argument("--param", action="append", default=[], metavar="NAME=VALUE",
+                    help="fixed technical_fira setting, value as JSON (repeatable); stored with the result")
+    args = ap.parse_args()
+
+    fixed = {}
+    for kv in args.param:
+        k, v = kv.split("=", 1)
+        fixed[k] = json.loads(v)
+    tune(args.out, args.generations, args.population, args.seeds, args.validate, args.workers,
+         fixed, world={"latency": args.latency}, seed=args.seed)